@@ -0,0 +1,291 @@
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, connections
+from django.test import Client
+from rest_framework_simplejwt.tokens import AccessToken
+from posts.models import ArchivedPost, Post
+from users.models import User
+from .seed import BENCHMARK_PASSWORD
+
+# Benchmark harness
+#
+# A "run" fires a number of requests at the API from several threads at once.
+# Each request is picked from the run's scenarios (weighted), and for every
+# scenario we record latency percentiles, throughput, errors, response sizes
+# and, when the requests are served in-process, the number of SQL queries per
+# request. Each run also reports the process CPU time it used per request.
+#
+# Note: SQLite serializes writers, so concurrent write scenarios (like, dislike,
+# signup) report "database is locked" errors there; benchmark writes on PostgreSQL.
+
+
+# ---- Scenarios: each returns (method, path, body, authenticated user id or None) ----
+
+SPARSE_FEED_FIELDS = 'id,user,description,image_renditions,created_at,likes_count,dislikes_count'
+
+
+def feed(ctx, rng):
+    return 'GET', '/api/posts/?page_size=20', None, None
+
+
+# A slim page: a few fields and the public author fields (posts/sparse.py)
+def feed_sparse(ctx, rng):
+    return 'GET', f'/api/posts/?page_size=20&fields={SPARSE_FEED_FIELDS}&expand=user', None, None
+
+
+# The trending page: an index scan on (hot_score, id) (posts/trending.py)
+def feed_trending(ctx, rng):
+    return 'GET', '/api/posts/?page_size=20&sort=trending', None, None
+
+
+def feed_authenticated(ctx, rng):
+    return 'GET', '/api/posts/?page_size=20', None, rng.choice(ctx.user_ids)
+
+
+def feed_by_user(ctx, rng):
+    return 'GET', f'/api/posts/?page_size=20&user_id={rng.choice(ctx.user_ids)}', None, None
+
+
+def detail(ctx, rng):
+    return 'GET', f'/api/posts/{rng.choice(ctx.post_ids)}/', None, None
+
+
+# A post from the archive (posts/archive.py); a live one if nothing was archived
+def detail_archived(ctx, rng):
+    return 'GET', f'/api/posts/{rng.choice(ctx.archived_post_ids or ctx.post_ids)}/', None, None
+
+
+def like(ctx, rng):
+    return 'POST', f'/api/posts/{ctx.hot_post(rng)}/like/', None, rng.choice(ctx.user_ids)
+
+
+def dislike(ctx, rng):
+    return 'POST', f'/api/posts/{ctx.hot_post(rng)}/dislike/', None, rng.choice(ctx.user_ids)
+
+
+def signup(ctx, rng):
+    number = ctx.next_number()
+    return 'POST', '/api/signup/', {
+        'email': f'signup{number}-{ctx.run_id}@example.com',
+        'first_name': 'New',
+        'last_name': str(number),
+        'password': BENCHMARK_PASSWORD,
+    }, None
+
+
+def login(ctx, rng):
+    return 'POST', '/api/login/', {'email': rng.choice(ctx.emails), 'password': BENCHMARK_PASSWORD}, None
+
+
+def profile(ctx, rng):
+    return 'GET', '/api/profile/', None, rng.choice(ctx.user_ids)
+
+
+SCENARIOS = {
+    'feed': feed,
+    'feed_sparse': feed_sparse,
+    'feed_trending': feed_trending,
+    'feed_authenticated': feed_authenticated,
+    'feed_by_user': feed_by_user,
+    'detail': detail,
+    'detail_archived': detail_archived,
+    'like': like,
+    'dislike': dislike,
+    'signup': signup,
+    'login': login,
+    'profile': profile,
+}
+
+# Named weighted mixes for --mix (each scenario is still reported on its own)
+MIXES = {
+    # Login bursts next to feed reads: login throughput and 503s vs. feed latency
+    'login_under_load': {'feed': 4, 'feed_authenticated': 4, 'login': 2},
+    'signup_under_load': {'feed': 4, 'feed_authenticated': 4, 'signup': 2},
+}
+
+
+# Shared, read-only data the scenarios pick from
+class Context:
+    def __init__(self, user_limit=200, post_limit=100000):
+        users = list(User.objects.order_by('id').values_list('id', 'email')[:user_limit])
+        self.user_ids = [user_id for user_id, _ in users]
+        self.emails = [email for _, email in users]
+        # The newest posts (all of them, unless there are millions)
+        self.post_ids = list(Post.objects.order_by('-id').values_list('id', flat=True)[:post_limit])
+        self.archived_post_ids = list(ArchivedPost.objects.values_list('id', flat=True)[:post_limit])
+        # The most reacted posts, so like/dislike hit the contended rows
+        self.hot_post_ids = list(Post.objects.order_by('-likes_count', '-id').values_list('id', flat=True)[:20])
+        self.tokens = {}
+        self.run_id = int(time.time())
+        self._counter = 0
+        self._lock = threading.Lock()
+        if not self.user_ids or not self.post_ids:
+            raise ValueError('The database has no users/posts to benchmark against; seed it first.')
+
+    def hot_post(self, rng):
+        return rng.choice(self.hot_post_ids)
+
+    def next_number(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    # JWT access token for a user (created once, reused)
+    def token(self, user_id):
+        if user_id not in self.tokens:
+            self.tokens[user_id] = str(AccessToken.for_user(User(pk=user_id)))
+        return self.tokens[user_id]
+
+
+# ---- Transports ----
+
+# Calls the Django app in-process through the test client, counting SQL queries
+# With compress=True, responses are asked for gzipped (sizes are then the compressed ones)
+class InProcessTransport:
+    counts_queries = True
+
+    def __init__(self, compress=False):
+        self.local = threading.local()
+        self.compress = compress
+
+    def send(self, method, path, body, token):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(raise_request_exception=False)
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        if self.compress:
+            headers['HTTP_ACCEPT_ENCODING'] = 'gzip'
+
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            if method == 'GET':
+                response = client.get(path, **headers)
+            else:
+                response = client.post(path, data=json.dumps(body or {}), content_type='application/json', **headers)
+        return response.status_code, queries[0], len(response.content)
+
+
+# Calls a running server over HTTP (e.g. gunicorn or uvicorn); queries are not counted
+class HttpTransport:
+    counts_queries = False
+
+    def __init__(self, base_url, compress=False):
+        self.base_url = base_url.rstrip('/')
+        self.compress = compress
+
+    def send(self, method, path, body, token):
+        headers = {'Content-Type': 'application/json'}
+        if self.compress:
+            headers['Accept-Encoding'] = 'gzip'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = json.dumps(body or {}).encode('utf-8') if method != 'GET' else None
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, None, len(response.read())
+        except urllib.error.HTTPError as error:
+            return error.code, None, len(error.read())
+
+
+# ---- Runner ----
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples, elapsed, counts_queries):
+    latencies = [sample[0] for sample in samples]
+    errors = sum(1 for sample in samples if sample[1] >= 400)
+    result = {
+        'requests': len(samples),
+        'errors': errors,
+        'status_codes': dict(Counter(str(sample[1]) for sample in samples)),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3),
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'max': round(max(latencies), 3),
+        },
+        'bytes_per_response': {
+            'mean': round(statistics.fmean(sample[3] for sample in samples)),
+            'max': max(sample[3] for sample in samples),
+        },
+    }
+    if counts_queries:
+        queries = [sample[2] for sample in samples]
+        result['queries_per_request'] = {'mean': round(statistics.fmean(queries), 2), 'max': max(queries)}
+    return result
+
+
+# Fire `requests` requests (spread over the run's weighted scenarios) from `concurrency` threads
+def run(ctx, transport, scenarios, requests=200, concurrency=8, seed=0):
+    names = list(scenarios)
+    weights = [scenarios[name] for name in names]
+    master = random.Random(seed)
+    # Decide the whole request plan up front so runs are reproducible
+    plan = []
+    for _ in range(requests):
+        name = master.choices(names, weights=weights)[0]
+        plan.append((name, random.Random(master.random())))
+
+    samples = {name: [] for name in names}
+    lock = threading.Lock()
+
+    def execute(item):
+        name, rng = item
+        method, path, body, user_id = SCENARIOS[name](ctx, rng)
+        token = ctx.token(user_id) if user_id else None
+        start = time.perf_counter()
+        status_code, queries, size = transport.send(method, path, body, token)
+        latency = (time.perf_counter() - start) * 1000
+        with lock:
+            samples[name].append((latency, status_code, queries, size))
+
+    started = time.perf_counter()
+    # CPU of the whole process: in-process that includes the server side
+    cpu_started = time.process_time()
+    if concurrency <= 1:
+        # Inline in the calling thread (lets tests run inside a transaction)
+        for item in plan:
+            execute(item)
+    else:
+        def worker(item):
+            try:
+                execute(item)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, plan))
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    return {
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(requests / elapsed, 2) if elapsed else None,
+        'cpu_ms_per_request': round(cpu * 1000 / requests, 3) if requests else None,
+        'scenarios': {
+            name: summarize(samples[name], elapsed, transport.counts_queries)
+            for name in names if samples[name]
+        },
+    }
@@ -0,0 +1,140 @@
+import json
+import platform
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from benchmarks import harness
+from benchmarks.seed import seed_dataset
+
+# Management command: python manage.py benchmark
+#
+# Seeds a synthetic dataset into a throwaway test database, then runs each
+# scenario (feed, detail, like, dislike, signup, login, profile, ...) at the
+# given concurrency and writes the results as JSON, e.g.:
+#
+#     python manage.py benchmark --posts 20000 --concurrency 16 --output before.json
+#     python manage.py benchmark --scenarios feed,detail --requests 1000
+#     python manage.py benchmark --mix feed=8,like=1,login=1
+#     python manage.py benchmark --mix login_under_load --concurrency 32
+#     python manage.py benchmark --scenarios feed,feed_sparse --compress --slow-json
+#     python manage.py seed_benchmark_data && python manage.py benchmark --base-url http://localhost:8000 --keep-db
+#
+# The recent feed with a long history (PostgreSQL): 10M posts over four years,
+# without and then with everything older than a year in the archive:
+#
+#     python manage.py benchmark --posts 10000000 --spread-days 1460 --scenarios feed,feed_by_user,detail --output live.json
+#     python manage.py benchmark --posts 10000000 --spread-days 1460 --archive-after-days 365 \
+#         --scenarios feed,feed_by_user,detail,detail_archived --output archived.json
+#
+# Compare two result files to check whether a change helped.
+class Command(BaseCommand):
+    help = 'Run the API benchmark scenarios and report latency percentiles, throughput and queries per request as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Users to seed.')
+        parser.add_argument('--posts', type=int, default=1000, help='Posts to seed.')
+        parser.add_argument('--reactions-per-user', type=int, default=20, help='Reactions each seeded user makes.')
+        parser.add_argument('--skew', type=float, default=1.2, help='Zipf exponent of the reaction distribution (0 = uniform).')
+        parser.add_argument('--spread-days', type=float, default=0, help='Spread the post dates over this many past days.')
+        parser.add_argument('--archive-after-days', type=int, default=None, help='Then archive the posts older than this (posts/archive.py).')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per run.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads.')
+        parser.add_argument('--scenarios', default=','.join(harness.SCENARIOS), help='Comma separated scenarios, each run on its own.')
+        parser.add_argument('--mix', default='', help=f"One mixed run with weighted scenarios, e.g. feed=8,like=1,login=1, or a named mix ({', '.join(harness.MIXES)}).")
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (dataset and request plan).')
+        parser.add_argument('--compress', action='store_true', help='Ask for gzipped responses (sizes are then the compressed ones).')
+        parser.add_argument('--slow-json', action='store_true', help="Render JSON with DRF's own renderer instead of orjson (in-process only).")
+        parser.add_argument('--base-url', default='', help='Benchmark a running server over HTTP instead of in-process.')
+        parser.add_argument('--keep-db', action='store_true', help='Use the configured database as is (no test database, no seeding).')
+        parser.add_argument('--output', default='', help='Write the JSON report to this file (default: stdout).')
+
+    def handle(self, *args, **options):
+        runs = self.get_runs(options)
+
+        if options['base_url'] and not options['keep_db']:
+            # A separate server process can't see our throwaway test database
+            raise CommandError('--base-url needs --keep-db (seed the server database with `manage.py seed_benchmark_data` first).')
+
+        setup_test_environment()
+        old_name = None
+        if not options['keep_db']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            dataset = None
+            if not options['keep_db']:
+                self.stderr.write('Seeding dataset...')
+                dataset = seed_dataset(
+                    users=options['users'],
+                    posts=options['posts'],
+                    reactions_per_user=options['reactions_per_user'],
+                    skew=options['skew'],
+                    spread_days=options['spread_days'],
+                    archive_after_days=options['archive_after_days'],
+                    seed=options['seed'],
+                    stdout=self.stderr,
+                )
+            with override_settings(FAST_JSON_RENDERER=not options['slow_json']):
+                report = self.run_benchmarks(runs, options, dataset)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def get_runs(self, options):
+        if options['mix'] in harness.MIXES:
+            runs = {options['mix']: harness.MIXES[options['mix']]}
+        elif options['mix']:
+            weights = {}
+            for part in options['mix'].split(','):
+                name, _, weight = part.partition('=')
+                weights[name.strip()] = float(weight or 1)
+            runs = {'mix': weights}
+        else:
+            runs = {name.strip(): {name.strip(): 1} for name in options['scenarios'].split(',') if name.strip()}
+        unknown = {name for weights in runs.values() for name in weights} - set(harness.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(harness.SCENARIOS)}.")
+        return runs
+
+    def run_benchmarks(self, runs, options, dataset):
+        ctx = harness.Context()
+        if options['base_url']:
+            transport = harness.HttpTransport(options['base_url'], compress=options['compress'])
+        else:
+            transport = harness.InProcessTransport(compress=options['compress'])
+
+        results = {}
+        for name, weights in runs.items():
+            self.stderr.write(f'Running {name}...')
+            # Every run starts cold so runs don't warm the cache for each other
+            cache.clear()
+            results[name] = harness.run(ctx, transport, weights, requests=options['requests'], concurrency=options['concurrency'], seed=options['seed'])
+
+        return {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['BACKEND'],
+                'transport': options['base_url'] or 'in-process',
+                'python': platform.python_version(),
+                'dataset': dataset,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'seed': options['seed'],
+                'compress': options['compress'],
+                'fast_json': settings.FAST_JSON_RENDERER,
+            },
+            'runs': results,
+        }
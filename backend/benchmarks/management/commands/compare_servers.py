@@ -0,0 +1,110 @@
+import json
+import os
+import shlex
+import socket
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks import harness
+
+# Management command: python manage.py compare_servers
+#
+# Starts the app under a WSGI server and under an ASGI server with the SAME
+# number of worker processes, runs the read scenarios against each at rising
+# client concurrency, and reports both side by side as JSON. Under WSGI every
+# in-flight request holds a worker; under ASGI the async read views
+# (social_network/urls_asgi.py) only hold a coroutine while they wait.
+#
+# Uses the configured database as is, so seed it first:
+#
+#     python manage.py seed_benchmark_data --posts 20000
+#     python manage.py compare_servers --workers 2 --concurrency 1,16,64 --output servers.json
+#
+# Needs gunicorn and uvicorn installed (or pass your own --wsgi-command / --asgi-command).
+class Command(BaseCommand):
+    help = 'Benchmark the read endpoints under WSGI and ASGI servers with the same worker count.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes for each server.')
+        parser.add_argument('--concurrency', default='1,8,32,64', help='Comma separated client concurrency levels.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per concurrency level.')
+        parser.add_argument('--mix', default='feed=3,feed_authenticated=3,detail=3,profile=1', help='Weighted scenarios of each run.')
+        parser.add_argument('--wsgi-command', default='gunicorn social_network.wsgi:application --workers {workers} --bind 127.0.0.1:{port}')
+        parser.add_argument('--asgi-command', default='uvicorn social_network.asgi:application --workers {workers} --host 127.0.0.1 --port {port}')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the request plan.')
+        parser.add_argument('--output', default='', help='Write the JSON report to this file (default: stdout).')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        weights = {}
+        for part in options['mix'].split(','):
+            name, _, weight = part.partition('=')
+            weights[name.strip()] = float(weight or 1)
+        unknown = set(weights) - set(harness.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}.")
+
+        ctx = harness.Context()
+        results = {}
+        for kind in ('wsgi', 'asgi'):
+            port = self.free_port()
+            command = options[f'{kind}_command'].format(workers=options['workers'], port=port)
+            env = dict(os.environ)
+            # The WSGI server must not pick up the async URLs
+            env.pop('ROOT_URLCONF', None)
+            self.stderr.write(f'Starting {kind}: {command}')
+            try:
+                server = subprocess.Popen(shlex.split(command), cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except FileNotFoundError:
+                raise CommandError(f'Cannot start the {kind} server: {shlex.split(command)[0]} is not installed.')
+            try:
+                base_url = f'http://127.0.0.1:{port}'
+                self.wait_until_up(base_url, server)
+                transport = harness.HttpTransport(base_url)
+                results[kind] = {}
+                for level in levels:
+                    self.stderr.write(f'  {kind} at concurrency {level}...')
+                    results[kind][str(level)] = harness.run(ctx, transport, weights, requests=options['requests'], concurrency=level, seed=options['seed'])
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'workers': options['workers'],
+                'requests': options['requests'],
+                'mix': weights,
+                'wsgi_command': options['wsgi_command'],
+                'asgi_command': options['asgi_command'],
+            },
+            'runs': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def wait_until_up(self, base_url, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'The server exited with code {server.returncode}.')
+            try:
+                urllib.request.urlopen(f'{base_url}/api/posts/?page_size=1', timeout=2).read()
+                return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        raise CommandError(f'The server did not answer within {timeout} seconds.')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from benchmarks.seed import seed_dataset
+
+# Management command: python manage.py seed_benchmark_data
+# Fills the configured database with the synthetic benchmark dataset, for
+# benchmarking a running server with `benchmark --base-url ... --keep-db`.
+class Command(BaseCommand):
+    help = 'Seed the database with synthetic users, posts and reactions for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Users to seed.')
+        parser.add_argument('--posts', type=int, default=1000, help='Posts to seed.')
+        parser.add_argument('--reactions-per-user', type=int, default=20, help='Reactions each seeded user makes.')
+        parser.add_argument('--skew', type=float, default=1.2, help='Zipf exponent of the reaction distribution (0 = uniform).')
+        parser.add_argument('--spread-days', type=float, default=0, help='Spread the post dates over this many past days.')
+        parser.add_argument('--archive-after-days', type=int, default=None, help='Then archive the posts older than this (posts/archive.py).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+
+    def handle(self, *args, **options):
+        counts = seed_dataset(
+            users=options['users'],
+            posts=options['posts'],
+            reactions_per_user=options['reactions_per_user'],
+            skew=options['skew'],
+            spread_days=options['spread_days'],
+            archive_after_days=options['archive_after_days'],
+            seed=options['seed'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts['users']} user(s), {counts['posts']} post(s) and {counts['reactions']} reaction(s)."
+        ))
@@ -0,0 +1,71 @@
+import itertools
+import random
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.utils import timezone
+from posts.models import ArchivedPost, Post, Reaction
+from posts.transfer import insert_rows
+from users.models import User
+
+# Synthetic dataset for benchmarks
+# Every seeded user has the same password so the login scenario can use any of them.
+BENCHMARK_PASSWORD = 'Bench123!'
+BATCH_SIZE = 2000
+
+
+# spread_days: post dates spread evenly over that many past days (0: all now).
+# archive_after_days: then move the posts older than that to the archive
+# (posts/archive.py), e.g. to measure the recent feed with a large history.
+def seed_dataset(users=100, posts=1000, reactions_per_user=20, skew=1.2, seed=0, stdout=None, spread_days=0, archive_after_days=None):
+    rng = random.Random(seed)
+
+    # Users: hash the password ONCE and reuse it (hashing is the slow part of create_user)
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create(
+        [
+            User(username=f'bench{i}@example.com', email=f'bench{i}@example.com', password=password, first_name='Bench', last_name=str(i))
+            for i in range(users)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.filter(email__startswith='bench').values_list('id', flat=True))
+
+    # Posts, spread over the users (and over time). Inserted a batch at a time
+    # with their dates as given (bulk_create() would date them all now).
+    now = timezone.now()
+    for start in range(0, posts, BATCH_SIZE):
+        insert_rows(Post, [
+            Post(
+                user_id=rng.choice(user_ids),
+                description=f'Benchmark post {i} ' + ' '.join(rng.choices(WORDS, k=12)),
+                created_at=now - timedelta(days=spread_days * (posts - 1 - i) / posts),
+            )
+            for i in range(start, min(start + BATCH_SIZE, posts))
+        ])
+    post_ids = list(Post.objects.values_list('id', flat=True))
+
+    # Reactions with a Zipf-like skew: a few posts get most of them (viral posts)
+    # (cumulative weights computed once: millions of posts are fine)
+    cum_weights = list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, len(post_ids) + 1)))
+    reactions = []
+    for user_id in user_ids:
+        for post_id in set(rng.choices(post_ids, cum_weights=cum_weights, k=reactions_per_user)):
+            # Roughly 4 likes for every dislike
+            value = Reaction.LIKE if rng.random() < 0.8 else Reaction.DISLIKE
+            reactions.append(Reaction(user_id=user_id, post_id=post_id, value=value))
+    Reaction.objects.bulk_create(reactions, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+    # Bring the denormalized counters and trending scores in line with the inserted rows
+    call_command('reconcile_reaction_counts', stdout=stdout)
+    call_command('decay_trending_scores', rebuild=True, stdout=stdout)
+    if archive_after_days is not None:
+        call_command('roll_post_archive', days=archive_after_days, stdout=stdout)
+
+    return {'users': len(user_ids), 'posts': len(post_ids), 'reactions': len(reactions), 'archived': ArchivedPost.objects.count()}
+
+
+WORDS = (
+    'travel', 'food', 'coffee', 'music', 'weekend', 'friends', 'sunset', 'city', 'hiking', 'beach',
+    'work', 'launch', 'team', 'hiring', 'design', 'code', 'python', 'react', 'database', 'cat',
+)
@@ -0,0 +1,28 @@
+from django.core.cache import cache
+from django.test import TestCase
+from . import harness
+from .seed import seed_dataset
+
+
+class BenchmarkHarnessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Half of the posts are in the archive
+        seed_dataset(users=5, posts=30, reactions_per_user=5, spread_days=60, archive_after_days=30)
+
+    def test_every_scenario_runs_without_errors(self):
+        ctx = harness.Context()
+        transport = harness.InProcessTransport()
+        for name in harness.SCENARIOS:
+            result = harness.run(ctx, transport, {name: 1}, requests=3, concurrency=1)
+            stats = result['scenarios'][name]
+            self.assertEqual(stats['requests'], 3)
+            self.assertEqual(stats['errors'], 0, f'{name}: {stats["status_codes"]}')
+            self.assertGreaterEqual(stats['latency_ms']['p99'], stats['latency_ms']['p50'])
+            self.assertIn('mean', stats['queries_per_request'])
+
+    def test_mixed_run_reports_each_scenario(self):
+        ctx = harness.Context()
+        result = harness.run(ctx, harness.InProcessTransport(), {'feed': 3, 'detail': 1}, requests=20, concurrency=1)
+        self.assertEqual(sum(stats['requests'] for stats in result['scenarios'].values()), 20)
+        self.assertEqual(set(result['scenarios']), {'feed', 'detail'})
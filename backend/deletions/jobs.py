@@ -0,0 +1,359 @@
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from posts import archive
+from posts.models import ArchivedPost, Post, Reaction, TimelineEntry
+from posts.signals import reaction_changed
+from social_network.background import run_in_background
+from social_network.images import rendition_names
+from social_network.storage import is_blob_name
+from uploads.models import ChunkedUpload
+from uploads.views import delete_chunks
+from users import stats as user_stats
+from users.models import Follow, User
+from .models import DeletionFile, DeletionJob
+
+# Background deletion of accounts and posts
+#
+# Deleting a user through the ORM makes Django's collector load every post,
+# reaction and follow of that user into memory and delete them in one huge
+# transaction, and the image files stay on disk. A deletion job instead goes
+# through the dependent tables in phases, DELETION_BATCH_SIZE rows per
+# statement and per transaction, and removes the media files at the end:
+#
+#   account: reactions -> archived -> follows -> timeline -> posts -> uploads -> target -> files
+#   post:    reactions -> timeline -> target -> files
+#
+# Every batch re-selects what is left, so a phase can be repeated safely and an
+# interrupted job simply continues from its phase (`manage.py run_deletion_jobs`).
+# Media file names are recorded (DeletionFile) in the same transaction that
+# deletes their rows, and only removed from storage after that commits (shared
+# blobs lose a reference, social_network/storage.py).
+
+PHASES = {
+    DeletionJob.USER: (
+        DeletionJob.REACTIONS, DeletionJob.ARCHIVED, DeletionJob.FOLLOWS, DeletionJob.TIMELINE, DeletionJob.POSTS,
+        DeletionJob.UPLOADS, DeletionJob.TARGET, DeletionJob.FILES, DeletionJob.DONE,
+    ),
+    DeletionJob.POST: (
+        DeletionJob.REACTIONS, DeletionJob.TIMELINE, DeletionJob.TARGET, DeletionJob.FILES, DeletionJob.DONE,
+    ),
+}
+
+
+# Deactivate the account right away (no more logins, tokens stop working) and delete it in the background
+def delete_account(user):
+    with transaction.atomic():
+        user.is_active = False
+        # save() so the cached user and profile are dropped (users/receivers.py)
+        user.save(update_fields=['is_active'])
+        job = DeletionJob.objects.create(kind=DeletionJob.USER, target_id=user.pk)
+    run_in_background(run_job, job.pk)
+    return job
+
+
+# Delete a post. A small one (most of them) is removed right away, in one
+# transaction, and only its files are left for the background; one with many
+# reactions or timeline entries is removed in batches in the background.
+def delete_post(post):
+    # Every follower's timeline got a copy of the post (posts/timeline.py)
+    rows = post.likes_count + post.dislikes_count + post.user.followers_count
+    if rows > settings.DELETION_BATCH_SIZE:
+        job = DeletionJob.objects.create(kind=DeletionJob.POST, target_id=post.pk)
+    else:
+        with transaction.atomic():
+            job = DeletionJob.objects.create(kind=DeletionJob.POST, target_id=post.pk, phase=DeletionJob.FILES)
+            # Its few reactions and timeline entries go with it (the DELETE cascades)
+            _delete_posts(job, [post.pk])
+    run_in_background(run_job, job.pk)
+    return job
+
+
+# Delete an archived post (posts/archive.py): a single row, removed right away,
+# and its files in the background
+def delete_archived_post(post):
+    with transaction.atomic():
+        job = DeletionJob.objects.create(kind=DeletionJob.POST, target_id=post.pk, phase=DeletionJob.FILES)
+        _delete_archived(job, ArchivedPost.objects.filter(pk=post.pk))
+    run_in_background(run_job, job.pk)
+    return job
+
+
+# Run (or resume) a job up to the given phase. Returns the job.
+def run_job(job_id, stop_at=DeletionJob.DONE):
+    job = DeletionJob.objects.get(pk=job_id)
+    phases = PHASES[job.kind]
+    while phases.index(job.phase) < phases.index(stop_at):
+        step = STEPS[job.kind][job.phase]
+        try:
+            # One batch per call, until nothing is left
+            while step(job):
+                pass
+        except Exception as error:
+            DeletionJob.objects.filter(pk=job.pk).update(error=repr(error), updated_at=timezone.now())
+            raise
+        job.phase = phases[phases.index(job.phase) + 1]
+        job.error = ''
+        if job.phase == DeletionJob.DONE:
+            job.finished_at = timezone.now()
+        job.save(update_fields=['phase', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def _add_deleted(job, count):
+    # updated_at doubles as a heartbeat: run_deletion_jobs leaves jobs that are moving alone
+    DeletionJob.objects.filter(pk=job.pk).update(deleted_rows=F('deleted_rows') + count, updated_at=timezone.now())
+
+
+def _record_files(job, names):
+    DeletionFile.objects.bulk_create([DeletionFile(job=job, name=name) for name in names if name])
+
+
+# Delete one batch of rows that have no delete receivers and nothing depending
+# on them: the ORM turns this into a single DELETE ... WHERE id IN (...)
+def _delete_batch(job, queryset):
+    ids = list(queryset.order_by().values_list('pk', flat=True)[:settings.DELETION_BATCH_SIZE])
+    if ids:
+        with transaction.atomic():
+            deleted, _ = queryset.model.objects.filter(pk__in=ids).delete()
+            _add_deleted(job, deleted)
+    return len(ids)
+
+
+# Delete posts whose reactions and timeline entries are gone, recording their files.
+# Through the ORM so the post_delete receivers run (cache, change log, live events).
+def _delete_posts(job, post_ids):
+    with transaction.atomic():
+        rows = list(Post.objects.filter(pk__in=post_ids).values_list('image', 'image_renditions'))
+        if not rows:
+            return 0
+        names = []
+        for image, renditions in rows:
+            if image:
+                names.append(image)
+                names.extend(rendition_names(renditions))
+        _record_files(job, names)
+        deleted, _ = Post.objects.filter(pk__in=post_ids).delete()
+        _add_deleted(job, deleted)
+    return len(rows)
+
+
+# Delete a batch of archived posts, recording their files and taking them off
+# their authors' profile statistics (for live posts a post_delete receiver does that)
+def _delete_archived(job, queryset):
+    with transaction.atomic():
+        rows = list(queryset.values_list('pk', 'user_id', 'image', 'image_renditions', 'likes_count', 'dislikes_count')[:settings.DELETION_BATCH_SIZE])
+        if not rows:
+            return 0
+        names = []
+        for _, _, image, renditions, _, _ in rows:
+            if image:
+                names.append(image)
+                names.extend(rendition_names(renditions))
+        _record_files(job, names)
+        deleted, _ = ArchivedPost.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        _add_deleted(job, deleted)
+        totals = defaultdict(Counter)
+        for _, author_id, _, _, likes_count, dislikes_count in rows:
+            totals[author_id].update(posts=-1, likes=-likes_count, dislikes=-dislikes_count)
+        for author_id, deltas in totals.items():
+            user_stats.add(author_id, **deltas)
+    return len(rows)
+
+
+# ---- Account phases ----
+
+# The user's reactions on other posts: remove them and take them off the counters
+def _delete_user_reactions(job):
+    with transaction.atomic():
+        # Locked, and skipped if another run holds them, so every row is counted once
+        rows = list(
+            Reaction.objects.select_for_update(skip_locked=True)
+            .filter(user_id=job.target_id)
+            .order_by()
+            .values_list('pk', 'post_id', 'value', 'created_at')[:settings.DELETION_BATCH_SIZE]
+        )
+        if not rows:
+            return 0
+        deleted, _ = Reaction.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        # One reaction per user and post, so each post loses exactly one like or dislike
+        liked = [post_id for _, post_id, value, _ in rows if value == Reaction.LIKE]
+        disliked = [post_id for _, post_id, value, _ in rows if value == Reaction.DISLIKE]
+        terms = {post_id: [(-value, created_at)] for _, post_id, value, created_at in rows}
+        Post.objects.filter(pk__in=liked).update(likes_count=F('likes_count') - 1)
+        Post.objects.filter(pk__in=disliked).update(dislikes_count=F('dislikes_count') - 1)
+
+        # Same notifications as a reaction toggle (cache, change log, live events, trending score)
+        user = User(pk=job.target_id)
+        counts = Post.objects.filter(pk__in=liked + disliked).values_list('pk', 'user_id', 'likes_count', 'dislikes_count')
+        received, liked_ids = defaultdict(Counter), set(liked)
+        for post_id, author_id, likes_count, dislikes_count in counts:
+            result = {'likes_count': likes_count, 'dislikes_count': dislikes_count, 'is_liked': False, 'is_disliked': False}
+            reaction_changed.send(sender=Reaction, post_id=post_id, author_id=author_id, user=user, result=result, terms=terms[post_id])
+            received[author_id]['likes' if post_id in liked_ids else 'dislikes'] -= 1
+        # One stats update per author (users/stats.py)
+        for author_id, deltas in received.items():
+            user_stats.add(author_id, **deltas)
+        _add_deleted(job, deleted)
+    return len(rows)
+
+
+# The user's reactions folded into other people's archived posts (posts/archive.py):
+# take them out of liked_by / disliked_by, off the counters and off the authors' stats
+def _delete_user_archived_reactions(job):
+    user_id = job.target_id
+    with transaction.atomic():
+        rows = list(
+            archive.reacted_by(user_id).select_for_update(skip_locked=True)
+            .exclude(user_id=user_id)
+            .order_by()
+            .values_list('pk', 'user_id', 'liked_by', 'disliked_by', 'likes_count', 'dislikes_count')[:settings.DELETION_BATCH_SIZE]
+        )
+        if not rows:
+            return 0
+        posts, received = [], defaultdict(Counter)
+        for post_id, author_id, liked_by, disliked_by, likes_count, dislikes_count in rows:
+            liked, disliked = user_id in liked_by, user_id in disliked_by
+            posts.append(ArchivedPost(
+                pk=post_id,
+                liked_by=[other for other in liked_by if other != user_id],
+                disliked_by=[other for other in disliked_by if other != user_id],
+                likes_count=max(likes_count - liked, 0),
+                dislikes_count=max(dislikes_count - disliked, 0),
+            ))
+            received[author_id].update(likes=-liked, dislikes=-disliked)
+        ArchivedPost.objects.bulk_update(posts, ['liked_by', 'disliked_by', 'likes_count', 'dislikes_count'])
+        # One stats update per author (users/stats.py)
+        for author_id, deltas in received.items():
+            user_stats.add(author_id, **deltas)
+        _add_deleted(job, len(rows))
+    return len(rows)
+
+
+# Follows in both directions, keeping the followers_count of the people the user followed
+def _delete_follows(job):
+    with transaction.atomic():
+        rows = list(
+            Follow.objects.select_for_update(skip_locked=True)
+            .filter(Q(follower_id=job.target_id) | Q(followed_id=job.target_id))
+            .order_by()
+            .values_list('pk', 'follower_id', 'followed_id')[:settings.DELETION_BATCH_SIZE]
+        )
+        if not rows:
+            return 0
+        followed = [followed_id for _, follower_id, followed_id in rows if follower_id == job.target_id]
+        User.objects.filter(pk__in=followed, followers_count__gt=0).update(followers_count=F('followers_count') - 1)
+        # A raw DELETE, without the unfollow receivers: the timeline and posts
+        # phases remove the timeline entries these follows produced
+        queryset = Follow.objects.filter(pk__in=[pk for pk, _, _ in rows])
+        deleted = queryset._raw_delete(queryset.db)
+        _add_deleted(job, deleted)
+    return len(rows)
+
+
+# The user's own home timeline
+def _delete_timeline(job):
+    return _delete_batch(job, TimelineEntry.objects.filter(owner_id=job.target_id))
+
+
+# The user's posts, a batch at a time: first the reactions and timeline entries
+# pointing at them (in batches of their own: a popular post has many), then the
+# posts. Then the archived ones.
+def _delete_user_posts(job):
+    post_ids = list(Post.objects.filter(user_id=job.target_id).order_by('pk').values_list('pk', flat=True)[:settings.DELETION_BATCH_SIZE])
+    if not post_ids:
+        return _delete_archived(job, ArchivedPost.objects.filter(user_id=job.target_id))
+    while _delete_batch(job, Reaction.objects.filter(post_id__in=post_ids)):
+        pass
+    while _delete_batch(job, TimelineEntry.objects.filter(post_id__in=post_ids)):
+        pass
+    return _delete_posts(job, post_ids)
+
+
+def _delete_uploads(job):
+    uploads = list(ChunkedUpload.objects.filter(owner_id=job.target_id)[:settings.DELETION_BATCH_SIZE])
+    for upload in uploads:
+        delete_chunks(upload)
+    if uploads:
+        with transaction.atomic():
+            deleted, _ = ChunkedUpload.objects.filter(pk__in=[upload.pk for upload in uploads]).delete()
+            _add_deleted(job, deleted)
+    return len(uploads)
+
+
+# The user row itself (nothing points at it any more)
+def _delete_user(job):
+    with transaction.atomic():
+        row = User.objects.filter(pk=job.target_id).values_list('profile_picture', 'profile_picture_renditions').first()
+        if row is None:
+            return 0
+        picture, renditions = row
+        if picture:
+            _record_files(job, [picture, *rendition_names(renditions)])
+        deleted, _ = User.objects.filter(pk=job.target_id).delete()
+        _add_deleted(job, deleted)
+    return 1
+
+
+# ---- Post phases ----
+
+def _delete_post_reactions(job):
+    return _delete_batch(job, Reaction.objects.filter(post_id=job.target_id))
+
+
+def _delete_post_timeline(job):
+    return _delete_batch(job, TimelineEntry.objects.filter(post_id=job.target_id))
+
+
+def _delete_post(job):
+    return _delete_posts(job, [job.target_id])
+
+
+# ---- Both ----
+
+# Remove the recorded media files from storage (missing files are fine).
+# Releasing a blob is a refs - 1 (uploads/blobs.py) that must happen once per
+# recorded name: the rows are locked, and the references released and the rows
+# deleted in one transaction, so a crash or a second run of the job cannot
+# release them twice. Plain files are unlinked after the commit (a crash in
+# between leaves them to sweep_orphaned_media).
+def _delete_files(job):
+    with transaction.atomic():
+        files = list(job.files.select_for_update(skip_locked=True).order_by('pk')[:settings.DELETION_BATCH_SIZE])
+        if not files:
+            return 0
+        plain = []
+        for file in files:
+            if is_blob_name(file.name):
+                default_storage.delete(file.name)
+            else:
+                plain.append(file.name)
+        DeletionFile.objects.filter(pk__in=[file.pk for file in files]).delete()
+        # Heartbeat (see _add_deleted)
+        DeletionJob.objects.filter(pk=job.pk).update(updated_at=timezone.now())
+    for name in plain:
+        default_storage.delete(name)
+    return len(files)
+
+
+STEPS = {
+    DeletionJob.USER: {
+        DeletionJob.REACTIONS: _delete_user_reactions,
+        DeletionJob.ARCHIVED: _delete_user_archived_reactions,
+        DeletionJob.FOLLOWS: _delete_follows,
+        DeletionJob.TIMELINE: _delete_timeline,
+        DeletionJob.POSTS: _delete_user_posts,
+        DeletionJob.UPLOADS: _delete_uploads,
+        DeletionJob.TARGET: _delete_user,
+        DeletionJob.FILES: _delete_files,
+    },
+    DeletionJob.POST: {
+        DeletionJob.REACTIONS: _delete_post_reactions,
+        DeletionJob.TIMELINE: _delete_post_timeline,
+        DeletionJob.TARGET: _delete_post,
+        DeletionJob.FILES: _delete_files,
+    },
+}
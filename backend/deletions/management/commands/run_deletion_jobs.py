@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from deletions.jobs import run_job
+from deletions.models import DeletionJob
+
+# Management command: python manage.py run_deletion_jobs
+# Finishes deletion jobs that stopped part way (server restart, error). Jobs
+# that made progress within --stale-minutes are left to the process running them.
+class Command(BaseCommand):
+    help = 'Resume unfinished account and post deletion jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-minutes', type=int, default=10, help='Only resume jobs without progress for this long.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['stale_minutes'])
+        stalled = DeletionJob.objects.exclude(phase=DeletionJob.DONE).filter(updated_at__lt=cutoff).order_by('id')
+        finished = failed = 0
+        for job_id in stalled.values_list('id', flat=True):
+            try:
+                run_job(job_id)
+                finished += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Deletion job {job_id} failed: {error!r}')
+        self.stdout.write(self.style.SUCCESS(f'Finished {finished} deletion job(s), {failed} failed.'))
@@ -0,0 +1,61 @@
+import os
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from posts.models import Post
+from social_network.storage import BLOB_PREFIX, is_blob_name
+from uploads.blobs import referenced_names
+from uploads.models import Blob
+from users.models import User
+
+# Management command: python manage.py sweep_orphaned_media [--dry-run]
+# Deletes files under the post image and profile picture folders (renditions
+# included) that no row refers to any more, e.g. left behind by deletions made
+# before the deletion jobs existed, and blob files without a Blob row (their
+# save was rolled back; unreferenced blobs are left to collect_blobs). Files
+# younger than --min-age-hours are kept: a picture is stored shortly before the
+# row that refers to it is saved.
+class Command(BaseCommand):
+    help = 'Delete post images and profile pictures that no post or user refers to.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-hours', type=int, default=24, help='Keep files modified more recently than this.')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the orphaned files.')
+
+    def handle(self, *args, **options):
+        referenced = set(referenced_names())
+        referenced.update(Blob.objects.values_list('name', flat=True).iterator(chunk_size=2000))
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+        folders = {
+            Post._meta.get_field('image').upload_to.rstrip('/'),
+            User._meta.get_field('profile_picture').upload_to.rstrip('/'),
+            BLOB_PREFIX.rstrip('/'),
+        }
+
+        orphaned = 0
+        for folder in sorted(folders):
+            for name in self.walk(folder):
+                if name in referenced or default_storage.get_modified_time(name) > cutoff:
+                    continue
+                orphaned += 1
+                if options['dry_run']:
+                    self.stdout.write(name)
+                elif is_blob_name(name):
+                    # delete() would only drop a reference
+                    default_storage.delete_blob(name)
+                else:
+                    default_storage.delete(name)
+
+        action = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{action} {orphaned} orphaned file(s).'))
+
+    # Every file below a storage folder
+    def walk(self, folder):
+        if not default_storage.exists(folder):
+            return
+        directories, files = default_storage.listdir(folder)
+        for filename in files:
+            yield os.path.join(folder, filename).replace(os.sep, '/')
+        for directory in directories:
+            yield from self.walk(os.path.join(folder, directory).replace(os.sep, '/'))
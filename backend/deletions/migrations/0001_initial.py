@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user', 'Account'), ('post', 'Post')], max_length=10)),
+                ('target_id', models.BigIntegerField()),
+                ('phase', models.CharField(choices=[('reactions', 'Reactions'), ('follows', 'Follows'), ('timeline', 'Timeline entries'), ('posts', 'Posts'), ('uploads', 'Uploads'), ('target', 'Account or post row'), ('files', 'Media files'), ('done', 'Done')], default='reactions', max_length=10)),
+                ('deleted_rows', models.PositiveBigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['phase', 'id'], name='deletionjob_phase_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeletionFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='deletions.deletionjob')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deletions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deletionjob',
+            name='phase',
+            field=models.CharField(choices=[('reactions', 'Reactions'), ('archived', 'Reactions on archived posts'), ('follows', 'Follows'), ('timeline', 'Timeline entries'), ('posts', 'Posts'), ('uploads', 'Uploads'), ('target', 'Account or post row'), ('files', 'Media files'), ('done', 'Done')], default='reactions', max_length=10),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import models
+
+# Deletion Job: removes an account or a post (and everything hanging off it)
+# in small batches, in the background (see deletions/jobs.py).
+# `phase` is the step the job is at; every step can be repeated safely, so an
+# interrupted job just continues from its phase (`manage.py run_deletion_jobs`).
+# target_id is a plain id, not a foreign key: the target is gone at the end.
+class DeletionJob(models.Model):
+    USER = 'user'
+    POST = 'post'
+    KIND_CHOICES = (
+        (USER, 'Account'),
+        (POST, 'Post'),
+    )
+
+    # Phases, in order (an account goes through all of them, a post skips some)
+    REACTIONS = 'reactions'
+    ARCHIVED = 'archived'
+    FOLLOWS = 'follows'
+    TIMELINE = 'timeline'
+    POSTS = 'posts'
+    UPLOADS = 'uploads'
+    TARGET = 'target'
+    FILES = 'files'
+    DONE = 'done'
+    PHASE_CHOICES = (
+        (REACTIONS, 'Reactions'),
+        (ARCHIVED, 'Reactions on archived posts'),
+        (FOLLOWS, 'Follows'),
+        (TIMELINE, 'Timeline entries'),
+        (POSTS, 'Posts'),
+        (UPLOADS, 'Uploads'),
+        (TARGET, 'Account or post row'),
+        (FILES, 'Media files'),
+        (DONE, 'Done'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    target_id = models.BigIntegerField()
+    phase = models.CharField(max_length=10, choices=PHASE_CHOICES, default=REACTIONS)
+    # Rows deleted so far (all tables together)
+    deleted_rows = models.PositiveBigIntegerField(default=0)
+    # Last error, if a run failed (the next run retries from the same phase)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Unfinished jobs, for run_deletion_jobs
+            models.Index(fields=['phase', 'id'], name='deletionjob_phase_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.target_id}: {self.phase}"
+
+
+# A media file to remove once the rows pointing at it are deleted. Recorded in
+# the same transaction that deletes those rows, so no file is ever forgotten.
+class DeletionFile(models.Model):
+    job = models.ForeignKey(DeletionJob, on_delete=models.CASCADE, related_name='files')
+    # Name in the default storage
+    name = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,213 @@
+import itertools
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from posts.models import ArchivedPost, ChangeLog, Post, Reaction, TimelineEntry
+from uploads.models import Blob
+from users.models import Follow, User, UserStats
+from .jobs import _delete_files, run_job
+from .models import DeletionJob
+
+
+# Tests for the background deletion of accounts and posts (deletions/jobs.py)
+@override_settings(BACKGROUND_TASKS_EAGER=True, EVENTS_COALESCE_WINDOW=0, DELETION_BATCH_SIZE=2)
+class DeletionJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.stored = itertools.count()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.friend = User.objects.create_user(username='friend@example.com', email='friend@example.com', password='Secret123!')
+        self.picture = self.store('profile_pics/me.png')
+        self.user.profile_picture = self.picture
+        self.user.save()
+
+    # Distinct content each time (identical files share one blob)
+    def store(self, name):
+        return default_storage.save(name, ContentFile(f'image {next(self.stored)}'.encode()))
+
+    # Deleted files are only unreferenced: remove them now
+    def collect_blobs(self):
+        call_command('collect_blobs', grace_hours=0, stdout=StringIO())
+
+    def make_post(self, author):
+        image = self.store('post_images/photo.png')
+        renditions = {'blurhash': 'x', 'thumbnail': {'jpeg': self.store('post_images/renditions/photo_thumbnail.jpeg')}}
+        return Post.objects.create(user=author, image=image, image_renditions=renditions, description='Post')
+
+    def files(self, post):
+        return [post.image.name, post.image_renditions['thumbnail']['jpeg']]
+
+    def test_account_is_deleted_in_batches_with_its_files(self):
+        posts = [self.make_post(self.user) for _ in range(3)]
+        friend_post = self.make_post(self.friend)
+        for post in posts:
+            Reaction.objects.toggle(self.friend, post.pk, Reaction.LIKE)
+        Reaction.objects.toggle(self.user, friend_post.pk, Reaction.LIKE)
+        Follow.objects.create(follower=self.user, followed=self.friend)
+        Follow.objects.create(follower=self.friend, followed=self.user)
+        User.objects.filter(pk=self.friend.pk).update(followers_count=1)
+        TimelineEntry.objects.create(owner=self.friend, post=posts[0], author=self.user, created_at=posts[0].created_at)
+
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete('/api/profile/')
+        self.assertEqual(response.status_code, 202)
+
+        self.assertEqual(DeletionJob.objects.get(pk=response.data['job']).phase, DeletionJob.DONE)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Post.objects.filter(user_id=self.user.pk).exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.collect_blobs()
+        for name in [self.picture] + [name for post in posts for name in self.files(post)]:
+            self.assertFalse(default_storage.exists(name), name)
+
+        # The friend keeps their post, minus the like, and loses a follower
+        friend_post.refresh_from_db()
+        self.assertEqual(friend_post.likes_count, 0)
+        self.assertEqual(User.objects.get(pk=self.friend.pk).followers_count, 0)
+        self.assertTrue(all(default_storage.exists(name) for name in self.files(friend_post)))
+        self.assertEqual(ChangeLog.objects.filter(kind=ChangeLog.DELETED).count(), 3)
+        self.assertTrue(ChangeLog.objects.filter(kind=ChangeLog.REACTIONS, post_id=friend_post.pk).exists())
+
+    def test_account_deletion_takes_reactions_off_archived_posts(self):
+        other = User.objects.create_user(username='other@example.com', email='other@example.com', password='Secret123!')
+        archived = [
+            ArchivedPost.objects.create(id=1000 + i, user=self.friend, created_at=timezone.now(), **fields)
+            for i, fields in enumerate([
+                {'likes_count': 2, 'liked_by': [self.user.pk, other.pk]},
+                {'dislikes_count': 1, 'disliked_by': [self.user.pk]},
+                {'likes_count': 1, 'liked_by': [self.user.pk]},
+                {'likes_count': 1, 'liked_by': [other.pk]},
+            ])
+        ]
+        UserStats.objects.filter(user=self.friend).update(likes_received=4, dislikes_received=1)
+
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete('/api/profile/').status_code, 202)
+
+        rows = ArchivedPost.objects.in_bulk([post.pk for post in archived])
+        self.assertEqual(
+            [(rows[post.pk].liked_by, rows[post.pk].disliked_by, rows[post.pk].likes_count, rows[post.pk].dislikes_count) for post in archived],
+            [([other.pk], [], 1, 0), ([], [], 0, 0), ([], [], 0, 0), ([other.pk], [], 1, 0)],
+        )
+        stats = UserStats.objects.get(user=self.friend)
+        self.assertEqual((stats.likes_received, stats.dislikes_received), (2, 0))
+
+    def test_account_is_deactivated_right_away(self):
+        self.client.force_authenticate(self.user)
+        # Nothing runs in the background yet
+        self.client.delete('/api/profile/')
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+        response = APIClient().post('/api/login/', {'email': 'user@example.com', 'password': 'Secret123!'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_post_deletion(self):
+        small = self.make_post(self.user)
+        Reaction.objects.toggle(self.friend, small.pk, Reaction.LIKE)
+        self.client.force_authenticate(self.friend)
+        self.assertEqual(self.client.delete(f'/api/posts/{small.pk}/').status_code, 403)
+
+        # Few reactions: gone in the request, in one transaction within the query
+        # budget, the files follow after the commit
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.delete(f'/api/posts/{small.pk}/')
+            self.assertEqual(response.status_code, 204)
+            self.assertLessEqual(len(queries), settings.REQUEST_BUDGETS['default']['queries'])
+            self.assertFalse(Post.objects.filter(pk=small.pk).exists())
+            self.assertFalse(Reaction.objects.exists())
+        self.collect_blobs()
+        self.assertFalse(any(default_storage.exists(name) for name in self.files(small)))
+
+        # More reactions than one batch: deleted in the background
+        popular = self.make_post(self.user)
+        for user in (self.friend, self.user, User.objects.create_user(username='x@example.com', email='x@example.com', password='Secret123!')):
+            Reaction.objects.toggle(user, popular.pk, Reaction.DISLIKE)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/posts/{popular.pk}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Post.objects.filter(pk=popular.pk).exists())
+        self.assertFalse(Reaction.objects.exists())
+
+        # Copied into more follower timelines than one batch: deleted in the background too
+        followed = self.make_post(self.user)
+        User.objects.filter(pk=self.user.pk).update(followers_count=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/posts/{followed.pk}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Post.objects.filter(pk=followed.pk).exists())
+
+    def test_interrupted_jobs_are_resumed(self):
+        post = self.make_post(self.user)
+        job = DeletionJob.objects.create(kind=DeletionJob.USER, target_id=self.user.pk)
+        # Stopped after the rows, with the files still recorded
+        run_job(job.pk, stop_at=DeletionJob.FILES)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertTrue(default_storage.exists(post.image.name))
+
+        call_command('run_deletion_jobs', stale_minutes=0, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.phase, DeletionJob.DONE)
+        self.assertIsNotNone(job.finished_at)
+        self.collect_blobs()
+        self.assertFalse(any(default_storage.exists(name) for name in self.files(post)))
+
+    def test_shared_files_are_released_once(self):
+        shared = default_storage.save('post_images/shared.png', ContentFile(b'shared'))
+        self.assertEqual(default_storage.save('post_images/again.png', ContentFile(b'shared')), shared)
+        Post.objects.create(user=self.friend, image=shared, description='Kept')
+        post = Post.objects.create(user=self.user, image=shared, description='Deleted')
+        job = DeletionJob.objects.create(kind=DeletionJob.POST, target_id=post.pk)
+        run_job(job.pk, stop_at=DeletionJob.FILES)
+        DeletionJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        # Each batch is a heartbeat
+        self.assertEqual(_delete_files(job), 1)
+        job.refresh_from_db()
+        self.assertGreater(job.updated_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(Blob.objects.get(name=shared).refs, 1)
+        # Run again (e.g. by run_deletion_jobs): nothing is left to release
+        DeletionJob.objects.filter(pk=job.pk).update(phase=DeletionJob.FILES)
+        run_job(job.pk)
+        self.assertEqual(Blob.objects.get(name=shared).refs, 1)
+
+    def test_sweep_orphaned_media(self):
+        post = self.make_post(self.friend)
+        # Plain files, and a blob whose row is gone (its save was rolled back)
+        orphans = [FileSystemStorage().save(name, ContentFile(b'old')) for name in ('post_images/orphan.png', 'profile_pics/old.png')]
+        orphans.append(self.store('post_images/renditions/orphan_medium.webp'))
+        Blob.objects.filter(name=orphans[-1]).delete()
+
+        output = StringIO()
+        call_command('sweep_orphaned_media', min_age_hours=0, dry_run=True, stdout=output)
+        self.assertEqual(sorted(output.getvalue().split()[:3]), sorted(orphans))
+        self.assertTrue(all(default_storage.exists(name) for name in orphans))
+
+        call_command('sweep_orphaned_media', min_age_hours=0, stdout=StringIO())
+        self.assertFalse(any(default_storage.exists(name) for name in orphans))
+        self.assertTrue(all(default_storage.exists(name) for name in self.files(post) + [self.picture]))
+        # Recent files are left alone
+        recent = FileSystemStorage().save('post_images/just_uploaded.png', ContentFile(b'new'))
+        call_command('sweep_orphaned_media', stdout=StringIO())
+        self.assertTrue(default_storage.exists(recent))
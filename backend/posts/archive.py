@@ -0,0 +1,143 @@
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from django.db import connection, transaction
+from django.db.models import Min, Q
+from .models import ArchivedPost, Post, Reaction, TimelineEntry
+from . import cache
+
+# Cold archive of old posts
+#
+# Reads concentrate on recent posts, but the posts, reactions and timeline
+# tables (and their indexes, and the vacuum work on them) grow with every post
+# ever written. `manage.py roll_post_archive` (run it daily) moves the posts
+# older than POST_ARCHIVE_AFTER_DAYS out of them, in batches:
+#
+#   posts + their reactions  ->  one ArchivedPost row per post, the reactions
+#                                folded into liked_by / disliked_by
+#   their timeline entries   ->  removed (timelines show recent posts)
+#
+# so the live tables only hold the recent window the feeds read. Archived
+# posts are read-only: GET /api/posts/<id>/ still serves them (with the
+# viewer's reaction), their author can delete them, and they keep counting in
+# the profile statistics. They leave the feeds, search and the change log.
+#
+# On PostgreSQL the archive is partitioned by month of created_at: each
+# partition is created (ahead of time too) by the command, and a month that is
+# no longer needed can be detached or dropped on its own, without touching the
+# rest of the table.
+
+
+# Is the archive a partitioned table (see migration 0010)?
+def is_partitioned():
+    return connection.vendor == 'postgresql'
+
+
+def _month_start(moment):
+    return moment.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(start):
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month):
+    return f'{ArchivedPost._meta.db_table}_p{month:%Y_%m}'
+
+
+# Create the monthly partitions covering first..last (datetimes), if missing.
+# Returns the names of the partitions created.
+def ensure_partitions(first, last):
+    if not is_partitioned():
+        return []
+    existing = set(connection.introspection.table_names())
+    created = []
+    month = _month_start(first)
+    with connection.cursor() as cursor:
+        while month <= last:
+            name = partition_name(month)
+            if name not in existing:
+                # Literal bounds: DDL takes no parameters
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} PARTITION OF {ArchivedPost._meta.db_table} '
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+                )
+                created.append(name)
+            month = _next_month(month)
+    return created
+
+
+# The oldest live post older than the cutoff, or None
+def oldest_before(cutoff):
+    return Post.objects.filter(created_at__lt=cutoff).aggregate(oldest=Min('created_at'))['oldest']
+
+
+# Move one batch of posts older than the cutoff, oldest first, into the archive
+# (their partitions must exist). Returns the number of posts moved.
+def archive_batch(cutoff, batch_size):
+    with transaction.atomic():
+        # Locked: a reaction toggled meanwhile waits, then finds the post gone
+        rows = list(
+            Post.objects.select_for_update()
+            .filter(created_at__lt=cutoff)
+            .order_by('created_at', 'id')
+            .values_list('id', 'user_id', 'image', 'image_renditions', 'description', 'created_at', 'likes_count', 'dislikes_count')[:batch_size]
+        )
+        if not rows:
+            return 0
+        post_ids = [row[0] for row in rows]
+        reactions = defaultdict(lambda: {Reaction.LIKE: [], Reaction.DISLIKE: []})
+        for post_id, user_id, value in Reaction.objects.filter(post_id__in=post_ids).order_by('id').values_list('post_id', 'user_id', 'value'):
+            reactions[post_id][value].append(user_id)
+
+        ArchivedPost.objects.bulk_create([
+            ArchivedPost(
+                id=post_id, user_id=user_id, image=image, image_renditions=image_renditions, description=description,
+                created_at=created_at, likes_count=likes_count, dislikes_count=dislikes_count,
+                liked_by=reactions[post_id][Reaction.LIKE], disliked_by=reactions[post_id][Reaction.DISLIKE],
+            )
+            for post_id, user_id, image, image_renditions, description, created_at, likes_count, dislikes_count in rows
+        ])
+        # Raw DELETEs: a moved post is not a deleted one, so none of the post_delete
+        # receivers (profile statistics, change log, live events) must run
+        for queryset in (
+            Reaction.objects.filter(post_id__in=post_ids),
+            TimelineEntry.objects.filter(post_id__in=post_ids),
+            Post.objects.filter(pk__in=post_ids),
+        ):
+            queryset._raw_delete(queryset.db)
+
+        moved = [(row[0], row[1]) for row in rows]
+        transaction.on_commit(lambda: cache.invalidate_posts(moved))
+    return len(rows)
+
+
+# Move every post older than the cutoff. Returns the number of posts moved.
+def archive_before(cutoff, batch_size):
+    moved = 0
+    while True:
+        count = archive_batch(cutoff, batch_size)
+        if not count:
+            return moved
+        moved += count
+
+
+# The archived posts the user liked or disliked (deleting an account takes its
+# reactions out of them, deletions/jobs.py). On PostgreSQL a jsonb containment
+# test, backed by GIN indexes (migration 0012)
+def reacted_by(user_id):
+    if connection.features.supports_json_field_contains:
+        return ArchivedPost.objects.filter(Q(liked_by__contains=[user_id]) | Q(disliked_by__contains=[user_id]))
+    # SQLite: look through the arrays with json_each()
+    table = ArchivedPost._meta.db_table
+    return ArchivedPost.objects.extra(
+        where=[
+            f'EXISTS (SELECT 1 FROM json_each({table}.liked_by) WHERE value = %s) '
+            f'OR EXISTS (SELECT 1 FROM json_each({table}.disliked_by) WHERE value = %s)'
+        ],
+        params=[user_id, user_id],
+    )
+
+
+# The archived post, for GET /api/posts/<id>/, or None
+def get_post(post_id):
+    return ArchivedPost.objects.select_related('user', 'user__stats').filter(pk=post_id).first()
@@ -0,0 +1,132 @@
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.request import Request
+from social_network import etags, replicas
+from social_network.async_api import error_response, gather_queries, get_user_or_error, render
+from .models import Post
+from .pagination import FeedPagination
+from .serializers import PostSerializer
+from .views import PostDetailView, PostListCreateView, feed_user_id
+from . import cache, sparse
+
+# Async versions of the read endpoints of posts/views.py (served by social_network/urls_asgi.py)
+#
+# Same URLs, same JSON and the same shared cache as the DRF views. While a
+# request waits on the cache or the database it holds no worker thread, and on
+# a cache miss the page (posts + authors + counters, one JOIN) and the viewer's
+# reactions on that page are fetched concurrently. Writes (POST/DELETE) are
+# passed on to the DRF views.
+
+_sync_post_list = PostListCreateView.as_view()
+_sync_post_detail = PostDetailView.as_view()
+
+
+# ?fields= / ?expand= (posts/sparse.py), or the 400 response for unknown names
+def _sparse_fields(request):
+    try:
+        return sparse.parse(request), None
+    except ValidationError as error:
+        return (None, None), render(error.detail, status=400)
+
+
+def _viewer_reactions_query(viewer, post_ids, fields=None):
+    if not viewer.is_authenticated or (fields is not None and not cache.has_viewer_fields(fields)):
+        return lambda: {}
+    return lambda: cache.viewer_reactions(viewer, post_ids)
+
+
+# GET /api/posts/ (same parameters as PostListCreateView)
+@csrf_exempt
+async def post_list(request):
+    if request.method != 'GET':
+        return await sync_to_async(_sync_post_list)(request)
+    viewer, error = await get_user_or_error(request)
+    if error:
+        return error
+    (fields, expand), error = _sparse_fields(request)
+    if error:
+        return error
+    try:
+        user_id = feed_user_id(request.GET)
+    except ValidationError as error:
+        return render(error.detail, status=400)
+    await sync_to_async(replicas.read_from_replica)(request, viewer)
+
+    key = await sync_to_async(cache.feed_cache_key)(request, user_id)
+    data = None if replicas.bypass_cache() else await sync_to_async(cache.get_cached)(key)
+    if data is not None:
+        results = await sync_to_async(cache.overlay_live_reactions)(data['results'], viewer)
+        return _feed_response(request, {**data, 'results': results})
+
+    # Cache miss: build the page like the DRF view (rendered for an anonymous viewer)
+    drf_request = Request(request)
+    paginator = FeedPagination()
+    try:
+        position = paginator.start(drf_request, Post)
+    except NotFound as error:
+        return error_response(error.detail, 404)
+    except ValidationError as error:
+        return render(error.detail, status=400)
+    queryset = Post.objects.with_feed_data()
+    if user_id is not None:
+        queryset = queryset.filter(user__id=user_id)
+    page = paginator.page_queryset(sparse.restrict(queryset, fields, expand), position)
+
+    # The page and the viewer's reactions on it, at the same time
+    rows, reactions = await gather_queries(
+        lambda: list(page),
+        _viewer_reactions_query(viewer, page.values('id'), fields),
+    )
+    paginator.set_page(rows)
+    context = {'request': drf_request, 'fields': fields, 'expand': expand}
+    data = {
+        'next': paginator.get_next_link(),
+        'results': PostSerializer(paginator.page, many=True, context=context).data,
+    }
+    await sync_to_async(cache.set_cached)(key, data)
+    return _feed_response(request, {**data, 'results': cache.apply_viewer_reactions(data['results'], reactions)})
+
+
+# The feed page, or a 304 if the client has it (ETag: hash of the final page)
+def _feed_response(request, data):
+    etag = etags.content_etag(data)
+    if etags.etag_matches(request, etag):
+        return render(None, status=304, headers={'ETag': etag})
+    return render(data, headers={'ETag': etag})
+
+
+# GET /api/posts/<pk>/ (same as PostDetailView)
+@csrf_exempt
+async def post_detail(request, pk):
+    if request.method != 'GET':
+        return await sync_to_async(_sync_post_detail)(request, pk=pk)
+    viewer, error = await get_user_or_error(request)
+    if error:
+        return error
+    (fields, expand), error = _sparse_fields(request)
+    if error:
+        return error
+    await sync_to_async(replicas.read_from_replica)(request, viewer)
+
+    # The full post is cached; ?fields= / ?expand= are applied to it
+    key = cache.detail_cache_key(pk)
+    data = None if replicas.bypass_cache() else await sync_to_async(cache.get_cached)(key)
+    if data is None:
+        post, reactions = await gather_queries(
+            lambda: Post.objects.with_feed_data().filter(pk=pk).first(),
+            _viewer_reactions_query(viewer, [pk], fields),
+        )
+        if post is None:
+            # Maybe an archived post (posts/archive.py): rare, left to the DRF view
+            return await sync_to_async(_sync_post_detail)(request, pk=pk)
+        data = PostSerializer(post, context={'request': Request(request)}).data
+        await sync_to_async(cache.set_cached)(key, data)
+    else:
+        reactions = await sync_to_async(_viewer_reactions_query(viewer, [pk], fields))()
+
+    data = cache.apply_viewer_reactions([sparse.trim(data, fields, expand)], reactions)[0]
+    etag = etags.content_etag(data)
+    if etags.etag_matches(request, etag):
+        return render(None, status=304, headers={'ETag': etag})
+    return render(data, headers={'ETag': etag})
@@ -0,0 +1,173 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from social_network import replicas
+from .models import Post, Reaction
+
+# Read-through cache for the public feed and post detail responses.
+#
+# The cached payloads are rendered for an anonymous viewer, so one copy can be
+# shared by everybody; the viewer-specific is_liked / is_disliked flags are
+# overlaid per request with a single query (see overlay_viewer_reactions).
+#
+# Invalidation is event driven (posts/signals.py): creating or deleting a post
+# or an author profile change bumps a version number that is part of every feed
+# key, so stale pages are simply never read again and expire on their own.
+# Reactions are far more frequent, so they leave the feed pages alone: the live
+# counters are overlaid on cached pages in the same query as the viewer's flags
+# (see overlay_live_reactions), and only the post's detail entry is dropped.
+# Feed ETags are a hash of the final page (the views compute them after the
+# overlay), so a reaction only changes those of the pages showing the post.
+# FEED_CACHE_TIMEOUT is only a safety net (and bounds how long a cached
+# ?sort=trending page keeps its order).
+
+# Version of the unfiltered feed, and of each author's ?user_id= feed
+GLOBAL_FEED = 'all'
+
+
+def _version_key(scope):
+    return f'posts:feed-version:{scope}'
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from a time-based value so a lost (evicted) version never
+        # points back at pages cached under an older number
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key missing: any new time-based value is newer than what was cached
+        cache.set(key, time.time_ns(), None)
+
+
+def get_feed_version(scope):
+    return _get_version(_version_key(scope))
+
+
+def _bump_feed_version(scope):
+    _bump_version(_version_key(scope))
+
+
+def _hash(value):
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+# Key for one feed page: per version, per ?user_id= filter (parsed, an int or
+# None) and per cursor/page size. The full URL is hashed because the cached
+# "next" link is absolute.
+def feed_cache_key(request, user_id=None):
+    scope = GLOBAL_FEED if user_id is None else str(user_id)
+    version = get_feed_version(scope)
+    return f'posts:feed:{scope}:{version}:{_hash(request.build_absolute_uri())}'
+
+
+def detail_cache_key(post_id):
+    return f'posts:detail:{post_id}'
+
+
+def get_cached(key):
+    return cache.get(key)
+
+
+def set_cached(key, data):
+    timeout = settings.FEED_CACHE_TIMEOUT
+    if replicas.using_replica():
+        # Read from a replica: possibly behind, so kept no longer than it may lag
+        timeout = min(timeout, settings.REPLICA_PIN_SECONDS)
+    cache.set(key, data, timeout)
+
+
+# Drop every cached response that may contain this post
+def invalidate_post(post_id, author_id):
+    _bump_feed_version(GLOBAL_FEED)
+    _bump_feed_version(str(author_id))
+    cache.delete(detail_cache_key(post_id))
+
+
+# The same for many posts at once, as (post id, author id) pairs
+def invalidate_posts(posts):
+    _bump_feed_version(GLOBAL_FEED)
+    for author_id in {author_id for _, author_id in posts}:
+        _bump_feed_version(str(author_id))
+    cache.delete_many([detail_cache_key(post_id) for post_id, _ in posts])
+
+
+# A reaction only changes the post's counters: the feed pages get them from the
+# overlay, the detail entry is dropped
+def invalidate_reactions(post_id):
+    cache.delete(detail_cache_key(post_id))
+
+
+# An author's name/picture is nested in every post they wrote
+def invalidate_author(author_id):
+    _bump_feed_version(GLOBAL_FEED)
+    _bump_feed_version(str(author_id))
+
+
+# Fill in is_liked / is_disliked for the current viewer on serialized posts.
+# Returns new dicts, the cached ones are left untouched.
+def overlay_viewer_reactions(posts, user):
+    if not user.is_authenticated or not posts or not has_viewer_fields(posts[0]):
+        return [dict(post) for post in posts]
+    # One query for the whole page
+    return apply_viewer_reactions(posts, viewer_reactions(user, [post['id'] for post in posts]))
+
+
+# The same for feed pages, whose cached counters may be behind: the current
+# likes_count / dislikes_count and the viewer's reaction, in one query
+def overlay_live_reactions(posts, user):
+    if not posts or not (has_count_fields(posts[0]) or (user.is_authenticated and has_viewer_fields(posts[0]))):
+        return [dict(post) for post in posts]
+    queryset = Post.objects.filter(pk__in=[post['id'] for post in posts])
+    reactions = {}
+    if user.is_authenticated:
+        viewer_value = Reaction.objects.filter(user=user, post=OuterRef('pk')).values('value')[:1]
+        rows = queryset.annotate(viewer_value=Subquery(viewer_value)).values_list('pk', 'likes_count', 'dislikes_count', 'viewer_value')
+        counts = {pk: (likes, dislikes) for pk, likes, dislikes, _ in rows}
+        reactions = {pk: value for pk, _, _, value in rows if value is not None}
+    else:
+        counts = {pk: (likes, dislikes) for pk, likes, dislikes in queryset.values_list('pk', 'likes_count', 'dislikes_count')}
+    posts = apply_viewer_reactions(posts, reactions)
+    for post in posts:
+        # A post deleted since keeps its cached values (the next version drops it)
+        if post['id'] in counts:
+            likes, dislikes = counts[post['id']]
+            if 'likes_count' in post:
+                post['likes_count'] = likes
+            if 'dislikes_count' in post:
+                post['dislikes_count'] = dislikes
+    return posts
+
+
+# {post id: reaction value} of the viewer for the given posts (or a queryset of post ids)
+def viewer_reactions(user, post_ids):
+    return dict(Reaction.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', 'value'))
+
+
+# Only the flags the posts have (a sparse ?fields= response may have neither)
+def apply_viewer_reactions(posts, reactions):
+    posts = [dict(post) for post in posts]
+    for post in posts:
+        value = reactions.get(post['id'])
+        if 'is_liked' in post:
+            post['is_liked'] = value == Reaction.LIKE
+        if 'is_disliked' in post:
+            post['is_disliked'] = value == Reaction.DISLIKE
+    return posts
+
+
+def has_viewer_fields(post):
+    return 'is_liked' in post or 'is_disliked' in post
+
+
+def has_count_fields(post):
+    return 'likes_count' in post or 'dislikes_count' in post
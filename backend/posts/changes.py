@@ -0,0 +1,80 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from .models import ChangeLog, Post
+
+# Delta sync: "what changed since token N?"
+#
+# Post and reaction writes append a ChangeLog row inside their own transaction
+# (posts/receivers.py). A client loads the feed once, then polls
+# GET /api/posts/changes/?since=<token> and applies:
+#   posts     - created or edited posts (full objects, rendered for the viewer)
+#   deleted   - ids of deleted posts
+#   reactions - current likes_count / dislikes_count of posts that were reacted to
+# Applying a response twice is harmless: everything is a current value, not a delta.
+#
+# Ids are handed out when a row is inserted, not when it commits, so a slow
+# transaction can commit a lower id after a higher one was already read. The
+# returned token therefore only moves past rows older than CHANGES_SETTLE_SECONDS;
+# newer rows are returned but will be seen again by the next poll.
+
+
+# Token to start syncing from. Read it BEFORE loading the feed, so that nothing
+# written in between is missed.
+def current_token():
+    return ChangeLog.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+# True if changes after `since` may have been pruned: the client has to reload
+def is_expired(since):
+    oldest = ChangeLog.objects.order_by('id').values_list('id', flat=True).first()
+    return oldest is not None and since < oldest - 1
+
+
+# Collect the changes after `since` (at most CHANGES_PAGE_SIZE log rows).
+# Returns (rows grouped by kind, new token, has_more).
+def get_changes(since, author_id=None):
+    rows = ChangeLog.objects.filter(id__gt=since).order_by('id')
+    if author_id is not None:
+        rows = rows.filter(author_id=author_id)
+    limit = settings.CHANGES_PAGE_SIZE
+    rows = list(rows.values_list('id', 'post_id', 'kind', 'created_at')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    settled_before = timezone.now() - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+    token = since
+    for row_id, _, _, created_at in rows:
+        if created_at > settled_before:
+            break
+        token = row_id
+    # Unsettled rows at the end of the page: wait for the next poll
+    has_more = has_more and token == rows[-1][0]
+
+    # One entry per post. Nothing overrides a deletion, and a full post object
+    # already carries the current counters.
+    latest = {}
+    for _, post_id, kind, _ in rows:
+        previous = latest.get(post_id)
+        if previous == ChangeLog.DELETED:
+            continue
+        if kind == ChangeLog.REACTIONS and previous in (ChangeLog.CREATED, ChangeLog.UPDATED):
+            continue
+        latest[post_id] = kind
+    changed = {
+        'posts': [post_id for post_id, kind in latest.items() if kind in (ChangeLog.CREATED, ChangeLog.UPDATED)],
+        'deleted': [post_id for post_id, kind in latest.items() if kind == ChangeLog.DELETED],
+        'reactions': [post_id for post_id, kind in latest.items() if kind == ChangeLog.REACTIONS],
+    }
+    return changed, token, has_more
+
+
+# Current counters of the posts whose reactions changed (one query)
+def reaction_counts(post_ids):
+    return [
+        {'id': post_id, 'likes_count': likes_count, 'dislikes_count': dislikes_count}
+        for post_id, likes_count, dislikes_count in (
+            Post.objects.filter(pk__in=post_ids).order_by('id').values_list('id', 'likes_count', 'dislikes_count')
+        )
+    ]
@@ -0,0 +1,73 @@
+import threading
+from django.conf import settings
+from django.db import connections
+from social_network.pubsub import publish
+from .models import Post
+
+# Real-time post events, streamed to clients by posts/streams.py
+#
+#     {"type": "post.created",   "id": 12, "user_id": 3}
+#     {"type": "post.deleted",   "id": 12, "user_id": 3}
+#     {"type": "post.reactions", "id": 12, "likes_count": 40, "dislikes_count": 2}
+#
+# Events only carry ids and public counters; clients fetch the post itself
+# (GET /api/posts/<id>/, cached) when they need it.
+
+
+def post_created(post_id, user_id):
+    publish({'type': 'post.created', 'id': post_id, 'user_id': user_id})
+
+
+def post_deleted(post_id, user_id):
+    publish({'type': 'post.deleted', 'id': post_id, 'user_id': user_id})
+
+
+# Collects the posts whose reactions changed and publishes at most one
+# post.reactions event per post per window. A viral post getting hundreds of
+# taps a second then costs one event (and one small query) per window, and the
+# counts are read when the window closes, so the event always has the latest value.
+class ReactionCoalescer:
+    # window defaults to settings.EVENTS_COALESCE_WINDOW (seconds; 0 publishes immediately)
+    def __init__(self, window=None, publish_event=None):
+        self.window = window
+        self.publish_event = publish_event
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, post_id):
+        window = settings.EVENTS_COALESCE_WINDOW if self.window is None else self.window
+        with self.lock:
+            self.pending.add(post_id)
+            if window > 0 and self.timer is None:
+                self.timer = threading.Timer(window, self._flush_from_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        if window <= 0:
+            self.flush()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread opened its own DB connection
+            connections.close_all()
+
+    def flush(self):
+        with self.lock:
+            post_ids, self.pending = self.pending, set()
+            self.timer = None
+        if not post_ids:
+            return
+        # Deleted posts simply drop out (their post.deleted event covers them)
+        counts = Post.objects.filter(pk__in=post_ids).values_list('id', 'likes_count', 'dislikes_count')
+        publish_event = self.publish_event or publish
+        for post_id, likes_count, dislikes_count in counts:
+            publish_event({'type': 'post.reactions', 'id': post_id, 'likes_count': likes_count, 'dislikes_count': dislikes_count})
+
+
+reaction_coalescer = ReactionCoalescer()
+
+
+def reactions_changed(post_id):
+    reaction_coalescer.add(post_id)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from posts import trending
+from posts.models import Post
+
+# Management command: python manage.py decay_trending_scores [--rebuild]
+# Run it hourly (cron): moves the trending epoch to now and scales every stored
+# Post.hot_score down to it, in post id ranges (see posts/trending.py).
+# --rebuild recomputes every score from the reactions instead, in primary-key
+# ranges: after bulk imports, or after changing TRENDING_HALF_LIFE_HOURS /
+# TRENDING_POST_WEIGHT.
+class Command(BaseCommand):
+    help = 'Re-decay the stored trending scores of posts (or rebuild them with --rebuild).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every score from the reactions.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of posts rescaled per transaction, or post ids per batch with --rebuild.')
+
+    def handle(self, *args, **options):
+        if not options['rebuild']:
+            updated = trending.rebase(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Decayed trending scores: {updated} post(s) rescaled.'))
+            return
+
+        batch_size = options['batch_size']
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+        rebuilt = 0
+        for start in range(1, last_id + 1, batch_size):
+            rebuilt += trending.rebuild(start, start + batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt trending scores: {rebuilt} post(s).'))
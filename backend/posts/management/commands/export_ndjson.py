@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from posts import transfer
+from social_network import ndjson
+
+# Management command: python manage.py export_ndjson [--output FILE] [--types user,post,reaction]
+# Writes users, posts (archived ones included) and reactions as NDJSON (see
+# posts/transfer.py), to stdout by default. The rows are streamed, so the export
+# runs in constant memory.
+# User records include the password hashes: keep the files safe.
+class Command(BaseCommand):
+    help = 'Export users, posts and reactions as NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='File to write (default: stdout).')
+        parser.add_argument('--types', default=','.join(transfer.TYPES), help='Comma-separated record types to export.')
+
+    def handle(self, *args, **options):
+        kinds = [kind.strip() for kind in options['types'].split(',') if kind.strip()]
+        unknown = set(kinds) - set(transfer.TYPES)
+        if unknown:
+            raise CommandError(f"Unknown type(s): {', '.join(sorted(unknown))}.")
+        # Always in file order: users, posts, reactions
+        records = (record for kind in transfer.TYPES if kind in kinds for record in transfer.export_records(kind))
+
+        if not options['output']:
+            for chunk in ndjson.stream(records):
+                self.stdout.write(chunk.decode(), ending='')
+            return
+        count = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in ndjson.stream(records):
+                output.write(chunk)
+                count += chunk.count(b'\n')
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} record(s) to {options['output']}."))
@@ -0,0 +1,40 @@
+import sys
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from posts import transfer
+from social_network import ndjson
+
+# Management command: python manage.py import_ndjson FILE [--batch-size N] [--no-recount]
+# Inserts the users, posts and reactions of an NDJSON file (see posts/transfer.py;
+# '-' reads stdin) in batches, keeping their ids and timestamps. Rows that
+# already exist are skipped. Passwords must be hashes (stored as they are);
+# users without one get an unusable password.
+# Afterwards the reaction counters, profile statistics and trending scores are
+# recomputed, unless --no-recount is given (e.g. for several files in a row:
+# recount after the last one with the commands below), and the cached feed,
+# post and profile responses showing the imported rows are invalidated.
+class Command(BaseCommand):
+    help = 'Import users, posts and reactions from an NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file, or '-' for stdin.")
+        parser.add_argument('--batch-size', type=int, default=transfer.BATCH_SIZE, help='Rows per INSERT and transaction.')
+        parser.add_argument('--no-recount', action='store_true', help='Skip recomputing the derived counters and scores.')
+
+    def handle(self, *args, **options):
+        source = sys.stdin.buffer if options['path'] == '-' else open(options['path'], 'rb')
+        try:
+            counts, touched = transfer.import_records(ndjson.read(source), batch_size=options['batch_size'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        if not options['no_recount']:
+            call_command('reconcile_reaction_counts', stdout=self.stdout)
+            call_command('rebuild_user_stats', stdout=self.stdout)
+            call_command('decay_trending_scores', rebuild=True, stdout=self.stdout)
+        transfer.invalidate_caches(touched)
+        summary = ', '.join(f'{counts[kind]} {kind}(s)' for kind in transfer.TYPES)
+        self.stdout.write(self.style.SUCCESS(f'Imported {summary} (rows that already existed were skipped).'))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from posts.models import ChangeLog
+
+# Management command: python manage.py prune_changelog
+# Deletes change log rows older than CHANGES_RETENTION_DAYS, in batches so no
+# single DELETE holds locks for long. Clients with an older token get a 410 from
+# /api/posts/changes/ and reload the feed. Meant to run daily (cron).
+class Command(BaseCommand):
+    help = 'Delete old rows from the post change log.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHANGES_RETENTION_DAYS, help='Keep this many days of changes.')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted = 0
+        while True:
+            batch = list(ChangeLog.objects.filter(created_at__lt=cutoff).order_by('id').values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            deleted += ChangeLog.objects.filter(id__in=batch).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'Pruned the change log: {deleted} row(s) deleted.'))
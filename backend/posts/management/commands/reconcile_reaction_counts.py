@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max
+from posts.models import Post, Reaction, reaction_count_subquery
+
+# Management command: python manage.py reconcile_reaction_counts
+# Recomputes Post.likes_count / Post.dislikes_count from the Reaction table
+# and fixes every row that drifted. Works in primary-key ranges so each UPDATE
+# touches a bounded number of rows.
+class Command(BaseCommand):
+    help = 'Repair the denormalized likes_count/dislikes_count columns on Post.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of post ids per UPDATE.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+        fixed = 0
+
+        for start in range(1, last_id + 1, batch_size):
+            batch = Post.objects.filter(id__gte=start, id__lt=start + batch_size)
+            # Rows whose stored counters differ from the real counts
+            drifted = batch.annotate(
+                actual_likes=reaction_count_subquery(Reaction.LIKE),
+                actual_dislikes=reaction_count_subquery(Reaction.DISLIKE),
+            ).exclude(likes_count=F('actual_likes'), dislikes_count=F('actual_dislikes'))
+
+            # One set-based UPDATE per batch
+            with transaction.atomic():
+                fixed += Post.objects.filter(id__in=drifted.values('id')).update(
+                    likes_count=reaction_count_subquery(Reaction.LIKE),
+                    dislikes_count=reaction_count_subquery(Reaction.DISLIKE),
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled reaction counts: {fixed} post(s) fixed.'))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from posts import archive
+
+# Management command: python manage.py roll_post_archive
+# Run it daily (cron): moves the posts older than POST_ARCHIVE_AFTER_DAYS, with
+# their reactions, from the live tables to the archive, in batches of one
+# transaction each (see posts/archive.py). On PostgreSQL it first creates the
+# monthly archive partitions those posts go to, and the ones for the next
+# --months-ahead months, so the partitions always exist before they are needed.
+class Command(BaseCommand):
+    help = 'Move old posts to the archive, creating its monthly partitions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.POST_ARCHIVE_AFTER_DAYS, help='Archive posts older than this.')
+        parser.add_argument('--batch-size', type=int, default=settings.POST_ARCHIVE_BATCH_SIZE, help='Posts moved per transaction.')
+        parser.add_argument('--months-ahead', type=int, default=1, help='Also create the partitions of this many months after the cutoff.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        oldest = archive.oldest_before(cutoff)
+        created = archive.ensure_partitions(oldest or cutoff, cutoff + timedelta(days=31 * options['months_ahead']))
+        for name in created:
+            self.stdout.write(f'Created partition {name}')
+
+        moved = archive.archive_before(cutoff, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} post(s) created before {cutoff:%Y-%m-%d %H:%M}.'))
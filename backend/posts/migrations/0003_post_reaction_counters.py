@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:37
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+# Fill the new counters from the existing join tables
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    # The database being migrated (not necessarily 'default')
+    db = schema_editor.connection.alias
+
+    def count(through):
+        counts = through.objects.using(db).filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('*')).values('total')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    Post.objects.using(db).update(likes_count=count(Post.likes.through), dislikes_count=count(Post.dislikes.through))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_post_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
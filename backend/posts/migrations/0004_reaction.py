@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+# Move the rows of the old likes/dislikes M2M tables into the Reaction table
+def copy_reactions(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Reaction = apps.get_model('posts', 'Reaction')
+    # The database being migrated (not necessarily 'default')
+    db = schema_editor.connection.alias
+    batch_size = 5000
+    for through, value in ((Post.likes.through, 1), (Post.dislikes.through, -1)):
+        rows = through.objects.using(db).values_list('user_id', 'post_id').iterator(chunk_size=batch_size)
+        batch = []
+        for user_id, post_id in rows:
+            batch.append(Reaction(user_id=user_id, post_id=post_id, value=value))
+            if len(batch) >= batch_size:
+                # ignore_conflicts: a (user, post) pair present in both tables keeps the like
+                Reaction.objects.using(db).bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Reaction.objects.using(db).bulk_create(batch, ignore_conflicts=True)
+
+    # The counters from 0003 still count the dislikes dropped above: recount them
+    # from the reactions that were kept
+    def count(value):
+        counts = Reaction.objects.using(db).filter(post=OuterRef('pk'), value=value).order_by().values('post').annotate(total=Count('*')).values('total')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    Post.objects.using(db).update(likes_count=count(1), dislikes_count=count(-1))
+
+
+# Reverse: the RemoveFields recreate the M2M tables empty, refill them from the reactions
+def copy_reactions_back(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Reaction = apps.get_model('posts', 'Reaction')
+    db = schema_editor.connection.alias
+    batch_size = 5000
+    for through, value in ((Post.likes.through, 1), (Post.dislikes.through, -1)):
+        rows = Reaction.objects.using(db).filter(value=value).values_list('user_id', 'post_id').iterator(chunk_size=batch_size)
+        batch = []
+        for user_id, post_id in rows:
+            batch.append(through(user_id=user_id, post_id=post_id))
+            if len(batch) >= batch_size:
+                through.objects.using(db).bulk_create(batch)
+                batch = []
+        through.objects.using(db).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_post_reaction_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.SmallIntegerField(choices=[(1, 'Like'), (-1, 'Dislike')])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reactions', to='posts.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'post'), name='unique_reaction_per_user_post')],
+            },
+        ),
+        migrations.RunPython(copy_reactions, copy_reactions_back),
+        migrations.RemoveField(
+            model_name='post',
+            name='dislikes',
+        ),
+        migrations.RemoveField(
+            model_name='post',
+            name='likes',
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:45
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# PostgreSQL: a trigger keeps search_vector in sync with description on every
+# INSERT/UPDATE (including bulk inserts), and a GIN index makes @@ queries fast.
+POSTGRES_FORWARD = [
+    """
+    CREATE TRIGGER posts_post_search_vector_update
+    BEFORE INSERT OR UPDATE OF description ON posts_post
+    FOR EACH ROW EXECUTE FUNCTION
+    tsvector_update_trigger(search_vector, 'pg_catalog.english', description)
+    """,
+    "UPDATE posts_post SET search_vector = to_tsvector('pg_catalog.english', coalesce(description, ''))",
+    "CREATE INDEX post_search_vector_gin ON posts_post USING gin (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS post_search_vector_gin",
+    "DROP TRIGGER IF EXISTS posts_post_search_vector_update ON posts_post",
+]
+
+# SQLite: an external-content FTS5 table over posts_post.description, kept in
+# sync by triggers (https://www.sqlite.org/fts5.html#external_content_tables)
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF description ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO posts_post_fts(rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+]
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5(description, content='posts_post', content_rowid='id')",
+    *SQLITE_TRIGGERS,
+    "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS posts_post_fts_update",
+    "DROP TRIGGER IF EXISTS posts_post_fts_delete",
+    "DROP TRIGGER IF EXISTS posts_post_fts_insert",
+    "DROP TABLE IF EXISTS posts_post_fts",
+]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        statements = {'postgresql': postgres, 'sqlite': sqlite}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
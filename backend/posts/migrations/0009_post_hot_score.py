@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:40
+
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+
+post_search = import_module('posts.migrations.0007_post_search')
+
+
+# The single TrendingState row, starting the epoch now. Existing posts keep a
+# score of 0 until `manage.py decay_trending_scores --rebuild` computes theirs.
+def create_trending_state(apps, schema_editor):
+    TrendingState = apps.get_model('posts', 'TrendingState')
+    TrendingState.objects.using(schema_editor.connection.alias).get_or_create(pk=1, defaults={'epoch': time.time()})
+
+
+# SQLite rebuilds posts_post to add a NOT NULL column, which drops the
+# full-text search triggers of 0007: create them again
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in post_search.SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_changelog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_trending_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(create_trending_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# PostgreSQL: a table partitioned by created_at. A partitioned table's keys must
+# include the partition column, hence the (id, created_at) primary key; the
+# monthly partitions are created by `manage.py roll_post_archive` (posts/archive.py).
+# Other databases: the plain table of the model.
+def create_archive_table(apps, schema_editor):
+    ArchivedPost = apps.get_model('posts', 'ArchivedPost')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(ArchivedPost)
+        return
+    users_table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    schema_editor.execute(f"""
+        CREATE TABLE posts_archivedpost (
+            id bigint NOT NULL,
+            user_id bigint NOT NULL REFERENCES {schema_editor.quote_name(users_table)} (id) DEFERRABLE INITIALLY DEFERRED,
+            image varchar(100) NULL,
+            image_renditions jsonb NOT NULL,
+            description text NOT NULL,
+            created_at timestamp with time zone NOT NULL,
+            likes_count integer NOT NULL CHECK (likes_count >= 0),
+            dislikes_count integer NOT NULL CHECK (dislikes_count >= 0),
+            liked_by jsonb NOT NULL,
+            disliked_by jsonb NOT NULL,
+            archived_at timestamp with time zone NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    schema_editor.execute('CREATE INDEX posts_archivedpost_user_id_idx ON posts_archivedpost (user_id)')
+
+
+def drop_archive_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # The partitions go with it
+        schema_editor.execute('DROP TABLE posts_archivedpost')
+    else:
+        schema_editor.delete_model(apps.get_model('posts', 'ArchivedPost'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_hot_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.CreateModel(
+                name='ArchivedPost',
+                fields=[
+                    ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                    ('image', models.ImageField(blank=True, null=True, upload_to='post_images/')),
+                    ('image_renditions', models.JSONField(blank=True, default=dict)),
+                    ('description', models.TextField(blank=True)),
+                    ('created_at', models.DateTimeField()),
+                    ('likes_count', models.PositiveIntegerField(default=0)),
+                    ('dislikes_count', models.PositiveIntegerField(default=0)),
+                    ('liked_by', models.JSONField(default=list)),
+                    ('disliked_by', models.JSONField(default=list)),
+                    ('archived_at', models.DateTimeField(auto_now_add=True)),
+                    ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_posts', to=settings.AUTH_USER_MODEL)),
+                ],
+            ),
+        ]),
+        migrations.RunPython(create_archive_table, drop_archive_table),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:05
+
+from django.db import migrations
+
+
+# PostgreSQL: GIN indexes for the "archived posts this user reacted to" lookup
+# (posts/archive.py reacted_by(), used when an account is deleted). On the
+# partitioned table they are created on every partition, present and future.
+def create_reaction_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in ('liked_by', 'disliked_by'):
+        schema_editor.execute(f'CREATE INDEX posts_archivedpost_{column}_idx ON posts_archivedpost USING gin ({column} jsonb_path_ops)')
+
+
+def drop_reaction_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in ('liked_by', 'disliked_by'):
+        schema_editor.execute(f'DROP INDEX posts_archivedpost_{column}_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_trendingstate_rebase'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_reaction_indexes, drop_reaction_indexes),
+    ]
@@ -1,5 +1,47 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
+from users import stats as user_stats
+from .signals import reaction_changed
+
+
+# Correlated subquery counting the reactions with the given value for the current post
+# Only used to (re)compute the stored likes_count/dislikes_count columns in bulk
+def reaction_count_subquery(value):
+    counts = (
+        Reaction.objects.filter(post=OuterRef('pk'), value=value)
+        .order_by()
+        .values('post')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+# Custom QuerySet with the loading logic shared by the feed and detail views
+class PostQuerySet(models.QuerySet):
+    # Fetch everything PostSerializer needs in ONE query:
+    # the author and their stats (JOINs) and the viewer's own reaction (the counts are plain columns)
+    def with_feed_data(self, viewer=None):
+        queryset = self.select_related('user', 'user__stats')
+        if viewer is not None and viewer.is_authenticated:
+            reactions = Reaction.objects.filter(post=OuterRef('pk'), user=viewer.pk)
+            return queryset.annotate(
+                is_liked=Exists(reactions.filter(value=Reaction.LIKE)),
+                is_disliked=Exists(reactions.filter(value=Reaction.DISLIKE)),
+            )
+        # Anonymous viewers never have a reaction
+        return queryset.annotate(is_liked=Value(False), is_disliked=Value(False))
+
+
+# Default manager: never load the (large) search vector unless asked for
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
 
 # Post Model representing a user's upload
 class Post(models.Model):
@@ -7,15 +49,224 @@ class Post(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
     # Optional Image for the post
     image = models.ImageField(upload_to='post_images/', null=True, blank=True)
+    # Resized copies + blurhash of the image, filled in the background (social_network/images.py)
+    image_renditions = models.JSONField(default=dict, blank=True)
     # Text content
     description = models.TextField(blank=True)
     # Automatically set timestamp when created
     created_at = models.DateTimeField(auto_now_add=True)
-    
-    # ManyToMany Field for Likes: A post can be liked by MANY users, and a user can like MANY posts
-    likes = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='liked_posts', blank=True)
-    # ManyToMany Field for Dislikes
-    dislikes = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='disliked_posts', blank=True)
+
+    # Denormalized reaction counters, kept in sync by Reaction.objects.toggle()
+    # so reading them is a column fetch instead of counting the reaction table.
+    # `manage.py reconcile_reaction_counts` repairs any drift.
+    likes_count = models.PositiveIntegerField(default=0)
+    dislikes_count = models.PositiveIntegerField(default=0)
+    # Time-decayed popularity for ?sort=trending, stored against the epoch in
+    # TrendingState and updated per reaction (see posts/trending.py)
+    hot_score = models.FloatField(default=0)
+
+    # Full-text search document for the description (PostgreSQL).
+    # Maintained by a database trigger on every insert/update, and searched through
+    # a GIN index; both are created in migration 0007. On SQLite an FTS5 table
+    # is used instead (see posts/search.py).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = PostManager()
+
+    class Meta:
+        indexes = [
+            # Composite indexes for keyset pagination of the feed (see posts/pagination.py)
+            models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
+            # Same, but for the ?user_id= filtered feed
+            models.Index(fields=['user', '-created_at', '-id'], name='post_user_feed_idx'),
+            # Keyset pagination of the trending feed
+            models.Index(fields=['-hot_score', '-id'], name='post_trending_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.created_at}"
+
+
+# Manager holding the like/dislike toggle logic used by the reaction views
+class ReactionManager(models.Manager):
+    # Toggle the user's reaction on a post and return the new state:
+    #   same reaction again -> it is removed
+    #   opposite reaction   -> it is switched
+    #   no reaction         -> it is added
+    # Raises Post.DoesNotExist for unknown posts.
+    def toggle(self, user, post_id, value):
+        with transaction.atomic():
+            # 1. Lock the post row and read its author, counters and the user's current
+            #    reaction in one query. The lock serializes concurrent taps on the same
+            #    post, and the counter UPDATE below would take it anyway.
+            current_reaction = self.filter(post=OuterRef('pk'), user=user.pk)
+            author_id, likes_count, dislikes_count, current, current_at = (
+                Post.objects.select_for_update()
+                .filter(pk=post_id)
+                .annotate(current=Subquery(current_reaction.values('value')), current_at=Subquery(current_reaction.values('created_at')))
+                .values_list('user_id', 'likes_count', 'dislikes_count', 'current', 'current_at')
+                .get()
+            )
+
+            # 2. One statement for the reaction row itself: DELETE or INSERT ... ON CONFLICT UPDATE
+            #    (created_at is when the current value was given: the trending score decays from it)
+            now = timezone.now()
+            if current == value:
+                self.filter(post_id=post_id, user=user.pk).delete()
+                new_value = None
+            else:
+                self.bulk_create(
+                    [Reaction(user_id=user.pk, post_id=post_id, value=value)],
+                    update_conflicts=True,
+                    unique_fields=('user', 'post'),
+                    update_fields=('value', 'created_at'),
+                )
+                new_value = value
+
+            # 3. Apply the difference to the stored counters with F() expressions
+            likes_delta = (new_value == Reaction.LIKE) - (current == Reaction.LIKE)
+            dislikes_delta = (new_value == Reaction.DISLIKE) - (current == Reaction.DISLIKE)
+            Post.objects.filter(pk=post_id).update(
+                likes_count=F('likes_count') + likes_delta,
+                dislikes_count=F('dislikes_count') + dislikes_delta,
+            )
+            # And to the author's profile statistics
+            user_stats.add(author_id, likes=likes_delta, dislikes=dislikes_delta)
+
+            result = {
+                'likes_count': likes_count + likes_delta,
+                'dislikes_count': dislikes_count + dislikes_delta,
+                'is_liked': new_value == Reaction.LIKE,
+                'is_disliked': new_value == Reaction.DISLIKE,
+            }
+            # The reactions that stopped and started counting, for the trending score
+            terms = []
+            if current is not None:
+                terms.append((-current, current_at))
+            if new_value is not None:
+                terms.append((new_value, now))
+            # Let other parts of the app react (cache invalidation, ...)
+            reaction_changed.send(sender=Reaction, post_id=post_id, author_id=author_id, user=user, result=result, terms=terms)
+
+        return result
+
+
+# Reaction Model: one row per (user, post), replacing the old likes/dislikes M2M tables
+class Reaction(models.Model):
+    LIKE = 1
+    DISLIKE = -1
+    VALUE_CHOICES = (
+        (LIKE, 'Like'),
+        (DISLIKE, 'Dislike'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reactions')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='reactions')
+    # +1 for a like, -1 for a dislike
+    value = models.SmallIntegerField(choices=VALUE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ReactionManager()
+
+    class Meta:
+        constraints = [
+            # A user can have at most ONE reaction per post (cannot like and dislike at the same time)
+            models.UniqueConstraint(fields=['user', 'post'], name='unique_reaction_per_user_post'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.post_id}: {self.get_value_display()}"
+
+
+# Timeline Entry: one row per (timeline owner, post) in a user's precomputed home timeline
+# Filled by fan-out-on-write (posts/timeline.py). created_at and author are copied
+# from the post so a timeline page is a single range scan on (owner, created_at, post).
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    # Copied from the post (lets an unfollow remove the author's posts in one statement)
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_page_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id}: {self.post_id}"
+
+
+# Change Log: one row per change to a post, in commit-ish order. The auto-increment
+# id is the change token clients sync from (GET /api/posts/changes/?since=<id>,
+# see posts/changes.py). post/author are plain ids, not foreign keys, so the
+# rows of deleted posts survive. Old rows are removed by `manage.py prune_changelog`.
+class ChangeLog(models.Model):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    REACTIONS = 'reactions'
+    KIND_CHOICES = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+        (REACTIONS, 'Reaction counts changed'),
+    )
+
+    post_id = models.BigIntegerField()
+    author_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Changes of one author's posts (?user_id=), by token
+            models.Index(fields=['author_id', 'id'], name='changelog_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.post_id}"
+
+
+# Trending State: a single row holding the epoch Post.hot_score is measured
+# against (Unix time). Moved forward by `manage.py decay_trending_scores`.
+class TrendingState(models.Model):
+    SINGLETON = 1
+
+    epoch = models.FloatField()
+    # While a rebase runs (posts/trending.py): the epoch it moves to, and the
+    # posts below this id whose scores are already measured against it
+    rebase_epoch = models.FloatField(null=True, blank=True)
+    rebased_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Trending epoch {self.epoch}"
+
+
+# Archived Post: a post moved out of the live tables once it is older than
+# POST_ARCHIVE_AFTER_DAYS (`manage.py roll_post_archive`, posts/archive.py).
+# One compact, read-only row per post: its reactions are folded into the lists
+# of user ids below. Still served by GET /api/posts/<id>/.
+# On PostgreSQL the table is partitioned by created_at, one partition per month,
+# and its primary key is (id, created_at) (see migration 0010).
+class ArchivedPost(models.Model):
+    # The id the post had while it was live
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_posts')
+    image = models.ImageField(upload_to='post_images/', null=True, blank=True)
+    image_renditions = models.JSONField(default=dict, blank=True)
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    likes_count = models.PositiveIntegerField(default=0)
+    dislikes_count = models.PositiveIntegerField(default=0)
+    # Ids of the users who liked / disliked the post
+    liked_by = models.JSONField(default=list)
+    disliked_by = models.JSONField(default=list)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived #{self.pk}"
@@ -0,0 +1,203 @@
+import base64
+import json
+from django.db.models import Q
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from rest_framework.exceptions import NotFound, ValidationError as InvalidParameter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from . import trending
+
+# Keyset ("cursor") pagination
+# Instead of OFFSET (which gets slower the deeper you scroll), every page continues
+# strictly after the last row of the previous page: WHERE (created_at, id) < (cursor).
+# With a matching composite index, page 1000 costs the same as page 1.
+class KeysetPagination(BasePagination):
+    # Fields the rows are sorted by. The LAST field must be unique (the tie-breaker).
+    ordering = ('-created_at', '-id')
+    # Default page size, overridable with ?page_size=
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request)
+
+    # Paginate several querysets that share the ordering fields as if they were one
+    # list: each source is filtered and limited on its own, then the rows are merged.
+    def paginate_querysets(self, querysets, request):
+        position = self.start(request, querysets[0].model)
+        rows = []
+        for queryset in querysets:
+            rows.extend(self.page_queryset(queryset, position))
+        if len(querysets) > 1:
+            rows = self.merge(rows)
+        return self.set_page(rows)
+
+    # The three steps of paginate_querysets, for callers that run the query
+    # themselves (e.g. the async views):
+    # 1. read the page size and the cursor position from the request
+    def start(self, request, model):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        return self.decode_cursor(request, model)
+
+    # 2. the (lazy) queryset of the rows after the position, plus one extra row
+    #    to know whether there is a next page
+    def page_queryset(self, queryset, position):
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.build_filter(position))
+        return queryset[:self.page_size + 1]
+
+    # 3. keep the page from the fetched rows
+    def set_page(self, rows):
+        rows = list(rows)
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    # Sort rows from several sources by the ordering fields and drop duplicates
+    def merge(self, rows):
+        unique = {}
+        for row in rows:
+            unique.setdefault(tuple(getattr(row, field.lstrip('-')) for field in self.ordering), row)
+        rows = list(unique.values())
+        # Stable sorts, least significant field first
+        for field in reversed(self.ordering):
+            rows.sort(key=lambda row: getattr(row, field.lstrip('-')), reverse=field.startswith('-'))
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        position = [self.get_field_value(self.page[-1], field) for field in self.ordering]
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.cursor_from_position(position)))
+
+    # Read the sort value of a row (datetimes are stored as ISO strings in the cursor)
+    def get_field_value(self, obj, field):
+        value = getattr(obj, field.lstrip('-'))
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    # Build: (a < x) OR (a = x AND b < y) OR ... for the ordering fields
+    def build_filter(self, position):
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = '__lt' if field.startswith('-') else '__gt'
+            equal = {self.ordering[i].lstrip('-'): position[i] for i in range(index)}
+            condition |= Q(**equal, **{name + lookup: position[index]})
+        return condition
+
+    # The cursor is opaque to clients: base64 of a JSON list of sort values
+    def encode_cursor(self, position):
+        raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            position = self.position_from_cursor(cursor)
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            return [self.to_python(model, field, value) for field, value in zip(self.ordering, position)]
+        except (TypeError, ValueError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    # Hooks for cursors that carry more than the sort values (raise ValueError for a bad one)
+    def cursor_from_position(self, position):
+        return position
+
+    def position_from_cursor(self, cursor):
+        return cursor
+
+    # Convert a JSON cursor value back using the model field (e.g. ISO string -> datetime)
+    def to_python(self, model, field, value):
+        try:
+            model_field = model._meta.get_field(field.lstrip('-'))
+        except FieldDoesNotExist:
+            # Annotated value (e.g. a computed score); JSON already restored its type
+            return value
+        if value is None:
+            raise ValueError
+        return model_field.to_python(value)
+
+
+# Pagination used by the post feed: newest first, (created_at, id) as the key,
+# or with ?sort=trending hottest first, (hot_score, id) as the key (posts/trending.py)
+class FeedPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+    sort_query_param = 'sort'
+    orderings = {
+        'recent': ('-created_at', '-id'),
+        'trending': ('-hot_score', '-id'),
+    }
+
+    def start(self, request, model):
+        sort = request.query_params.get(self.sort_query_param) or 'recent'
+        if sort not in self.orderings:
+            raise InvalidParameter({self.sort_query_param: f"Unknown sort, use one of: {', '.join(self.orderings)}."})
+        self.sort = sort
+        self.ordering = self.orderings[sort]
+        if sort == 'trending':
+            self.epoch = trending.get_epoch()
+        return super().start(request, model)
+
+    # Trending cursors also carry the epoch their score is measured against: after
+    # a rebase (decay_trending_scores) the score is converted to the new one
+    def cursor_from_position(self, position):
+        if self.sort == 'trending':
+            return [*position, self.epoch]
+        return position
+
+    def position_from_cursor(self, cursor):
+        if self.sort != 'trending':
+            return cursor
+        if not isinstance(cursor, list) or len(cursor) != 3:
+            raise ValueError
+        score, post_id, epoch = cursor
+        return [trending.rescale(float(score), float(epoch), self.epoch), post_id]
+
+
+# Pagination used by home timelines: entries are keyed on the copied (created_at, post id)
+class TimelinePagination(KeysetPagination):
+    ordering = ('-created_at', '-post_id')
+
+
+# Pagination used by search results: best match first, (rank, id) as the key
+class SearchPagination(KeysetPagination):
+    ordering = ('-rank', '-id')
@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from social_network.background import run_in_background
+from users import stats as user_stats
+from users.models import Follow
+from . import cache, events, timeline, trending
+from .models import ChangeLog, Post
+from .signals import reaction_changed
+
+
+# Invalidate the feed/detail cache once the change is committed
+# (invalidating earlier could let a concurrent read re-cache the old data)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_cache(sender, instance, **kwargs):
+    post_id, author_id = instance.pk, instance.user_id
+    transaction.on_commit(lambda: cache.invalidate_post(post_id, author_id))
+
+
+# Reactions keep the cached feed pages (their counters are overlaid, see posts/cache.py)
+@receiver(reaction_changed)
+def invalidate_reaction_cache(sender, post_id, **kwargs):
+    transaction.on_commit(lambda: cache.invalidate_reactions(post_id))
+
+
+# Append to the change log for delta sync (posts/changes.py), in the same
+# transaction as the write itself
+@receiver(post_save, sender=Post)
+def log_post_saved(sender, instance, created, **kwargs):
+    kind = ChangeLog.CREATED if created else ChangeLog.UPDATED
+    ChangeLog.objects.create(post_id=instance.pk, author_id=instance.user_id, kind=kind)
+
+
+@receiver(post_delete, sender=Post)
+def log_post_deleted(sender, instance, **kwargs):
+    ChangeLog.objects.create(post_id=instance.pk, author_id=instance.user_id, kind=ChangeLog.DELETED)
+
+
+@receiver(reaction_changed)
+def log_reaction_change(sender, post_id, author_id, **kwargs):
+    ChangeLog.objects.create(post_id=post_id, author_id=author_id, kind=ChangeLog.REACTIONS)
+
+
+# The author's post count and received reactions (users/stats.py), in the same transaction
+@receiver(post_save, sender=Post)
+def count_post_created(sender, instance, created, **kwargs):
+    if created:
+        user_stats.add(instance.user_id, posts=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_post_deleted(sender, instance, **kwargs):
+    user_stats.add(instance.user_id, posts=-1, likes=-instance.likes_count, dislikes=-instance.dislikes_count)
+
+
+# Keep the trending score up to date, in the same transaction (posts/trending.py)
+@receiver(post_save, sender=Post)
+def seed_trending_score(sender, instance, created, **kwargs):
+    if created:
+        trending.seed_post(instance)
+
+
+@receiver(reaction_changed)
+def update_trending_score(sender, post_id, terms=(), **kwargs):
+    now = timezone.now()
+    trending.add_to_score(post_id, trending.decayed(terms, now), now)
+
+
+# Push post events to connected clients (posts/streams.py) once committed
+@receiver(post_save, sender=Post)
+def publish_post_created(sender, instance, created, **kwargs):
+    if created:
+        post_id, user_id = instance.pk, instance.user_id
+        transaction.on_commit(lambda: events.post_created(post_id, user_id))
+
+
+@receiver(post_delete, sender=Post)
+def publish_post_deleted(sender, instance, **kwargs):
+    post_id, user_id = instance.pk, instance.user_id
+    transaction.on_commit(lambda: events.post_deleted(post_id, user_id))
+
+
+@receiver(reaction_changed)
+def publish_reaction_change(sender, post_id, **kwargs):
+    transaction.on_commit(lambda: events.reactions_changed(post_id))
+
+
+# User columns shown in the author object of every post (UserProfileSerializer)
+AUTHOR_FIELDS = frozenset((
+    'username', 'email', 'first_name', 'last_name', 'date_of_birth', 'profile_picture', 'profile_picture_renditions',
+))
+
+
+# Profile changes (name, picture) show up in the author object of every post.
+# Saves of other columns only (a password rehashed at login, is_active, ...)
+# leave the cached feeds alone.
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_author_cache(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not AUTHOR_FIELDS.intersection(update_fields)):
+        return
+    author_id = instance.pk
+    transaction.on_commit(lambda: cache.invalidate_author(author_id))
+
+
+# Keep home timelines in step with the follow graph (in the background)
+@receiver(post_save, sender=Follow)
+def backfill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created:
+        run_in_background(timeline.backfill_follow, instance.follower_id, instance.followed_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline_on_unfollow(sender, instance, **kwargs):
+    run_in_background(timeline.remove_follow, instance.follower_id, instance.followed_id)
@@ -0,0 +1,48 @@
+import re
+from django.db import connection
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast
+from django.db.models.expressions import RawSQL
+from .models import Post
+
+# Full-text search over Post.description
+#
+# PostgreSQL: the stored search_vector column (GIN index, kept current by a trigger)
+# matched with websearch_to_tsquery and ranked with ts_rank.
+# SQLite (development/tests): the posts_post_fts FTS5 table, ranked with bm25.
+# Both return a Post queryset annotated with `rank` (higher is better).
+#
+# `rank` is the search pagination key (posts/pagination.py), carried in the cursor
+# as a JSON float and compared with = / < on the next page, so it must be a
+# double precision value: ts_rank returns a float4, which the Python float read
+# back from it does not equal once promoted, and ties at the page boundary
+# would be skipped or repeated.
+
+SEARCH_CONFIG = 'english'
+
+
+def search_posts(query):
+    if not re.search(r'\w', query):
+        return Post.objects.none().annotate(rank=Value(0.0))
+
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        return Post.objects.filter(search_vector=search_query).annotate(
+            rank=Cast(SearchRank(F('search_vector'), search_query), FloatField()),
+        )
+
+    match = _fts5_query(query)
+    matching_ids = RawSQL('SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s', (match,))
+    # bm25() is "lower is better", so negate it to sort like ts_rank
+    rank = RawSQL(
+        'SELECT -bm25(posts_post_fts) FROM posts_post_fts WHERE posts_post_fts MATCH %s AND posts_post_fts.rowid = posts_post.id',
+        (match,),
+        output_field=FloatField(),
+    )
+    return Post.objects.filter(id__in=matching_ids).annotate(rank=rank)
+
+
+# Turn user input into a safe FTS5 query: every word quoted, all words required
+def _fts5_query(query):
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
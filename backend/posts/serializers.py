@@ -1,41 +1,81 @@
 from rest_framework import serializers
-from .models import Post
+from .models import ArchivedPost, Post, Reaction
 from users.serializers import UserProfileSerializer
+from social_network.images import rendition_urls
+from social_network.metrics import TimedSerializerMixin
+from . import sparse
+
+# The author nested by ?expand=user: public fields only
+class AuthorSerializer(UserProfileSerializer):
+    class Meta(UserProfileSerializer.Meta):
+        fields = sparse.AUTHOR_FIELDS
 
 # Serializer to convert Post models to JSON
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # Nested Serializer: Instead of just returning the User ID, return the full User Profile (name, pic, etc.)
     user = UserProfileSerializer(read_only=True)
     
     # Custom Fields: These don't exist in the database directly, we calculate them on the fly
-    likes_count = serializers.SerializerMethodField()
-    dislikes_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField() # Did the current user like this?
     is_disliked = serializers.SerializerMethodField() # Did the current user dislike this?
+    image_renditions = serializers.SerializerMethodField() # Resized copies + blurhash (null until processed)
 
     class Meta:
         model = Post
-        fields = ('id', 'user', 'image', 'description', 'created_at', 'likes_count', 'dislikes_count', 'is_liked', 'is_disliked')
-        read_only_fields = ('user', 'created_at', 'likes', 'dislikes')
+        fields = ('id', 'user', 'image', 'image_renditions', 'description', 'created_at', 'likes_count', 'dislikes_count', 'is_liked', 'is_disliked')
+        read_only_fields = ('user', 'created_at', 'likes_count', 'dislikes_count')
+
+    # Sparse fieldsets (posts/sparse.py): the views put the parsed ?fields= and
+    # ?expand= in the context as 'fields' and 'expand'
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        expand = self.context.get('expand') or ()
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        if 'user' in self.fields:
+            if 'user' in expand:
+                self.fields['user'] = AuthorSerializer(read_only=True)
+            elif fields is not None:
+                self.fields['user'] = serializers.PrimaryKeyRelatedField(read_only=True)
 
-    # Calculate total likes
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+    # URLs of the generated renditions
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj.image_renditions, obj.image.storage, self.context.get('request'))
 
-    # Calculate total dislikes
-    def get_dislikes_count(self, obj):
-        return obj.dislikes.count()
+    # The views load posts with Post.objects.with_feed_data(), which annotates these
+    # values in the same query. The per-object queries below are only a fallback
+    # for posts that were loaded without the annotations.
 
     # Check if the Requesting User has liked this post
     def get_is_liked(self, obj):
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.likes.filter(id=request.user.id).exists()
+            return obj.reactions.filter(user=request.user, value=Reaction.LIKE).exists()
         return False
 
     # Check if the Requesting User has disliked this post
     def get_is_disliked(self, obj):
+        if hasattr(obj, 'is_disliked'):
+            return obj.is_disliked
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.dislikes.filter(id=request.user.id).exists()
+            return obj.reactions.filter(user=request.user, value=Reaction.DISLIKE).exists()
         return False
+
+# An archived post (posts/archive.py), in the same shape as a live one
+class ArchivedPostSerializer(PostSerializer):
+    class Meta(PostSerializer.Meta):
+        model = ArchivedPost
+
+    # The reactions are stored in the row itself
+    def get_is_liked(self, obj):
+        request = self.context.get('request')
+        return bool(request and request.user.is_authenticated and request.user.pk in obj.liked_by)
+
+    def get_is_disliked(self, obj):
+        request = self.context.get('request')
+        return bool(request and request.user.is_authenticated and request.user.pk in obj.disliked_by)
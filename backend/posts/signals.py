@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by Reaction.objects.toggle() inside its transaction, after the counters changed.
+# Arguments: post_id, author_id, user (who reacted), result (new counts and state),
+# terms ((value, reaction time) pairs that stopped (-) or started (+) counting)
+reaction_changed = Signal()
@@ -0,0 +1,84 @@
+from rest_framework.exceptions import ValidationError
+
+# Sparse fieldsets for post responses
+#
+#   ?fields=id,description,likes_count   only these fields of each post
+#   ?expand=user                         the author as a small nested object
+#
+# Without ?fields= every field is returned, with the full author profile nested
+# (as before). With ?fields=, `user` is the author's id unless ?expand=user is
+# given, and ?expand=user always nests only the public author fields below.
+# `id` is always included. The queries load only the columns the requested
+# fields need (see restrict()).
+
+# Model columns each post field is rendered from
+FIELD_COLUMNS = {
+    'id': ('id',),
+    'user': ('user',),
+    'image': ('image',),
+    'image_renditions': ('image', 'image_renditions'),
+    'description': ('description',),
+    'created_at': ('created_at',),
+    'likes_count': ('likes_count',),
+    'dislikes_count': ('dislikes_count',),
+    # Annotated by Post.objects.with_feed_data()
+    'is_liked': (),
+    'is_disliked': (),
+}
+EXPANDABLE = ('user',)
+# Author fields nested by ?expand=user
+AUTHOR_FIELDS = ('id', 'first_name', 'last_name', 'profile_picture', 'profile_picture_renditions', 'stats')
+AUTHOR_COLUMNS = (
+    'first_name', 'last_name', 'profile_picture', 'profile_picture_renditions',
+    'stats__posts_count', 'stats__likes_received', 'stats__dislikes_received',
+)
+# Always loaded: the feed is ordered (and paginated) by them
+ORDERING_COLUMNS = ('id', 'created_at', 'hot_score')
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+# Read ?fields= and ?expand= from the request.
+# Returns (fields, expand): fields is None when all fields were asked for.
+def parse(request):
+    params = getattr(request, 'query_params', request.GET)
+    fields = None
+    if params.get('fields'):
+        fields = set(_split(params['fields'])) | {'id'}
+        unknown = fields - set(FIELD_COLUMNS)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}."})
+    expand = set(_split(params.get('expand', '')))
+    unknown = expand - set(EXPANDABLE)
+    if unknown:
+        raise ValidationError({'expand': f"Unknown expansion(s): {', '.join(sorted(unknown))}."})
+    return fields, expand
+
+
+# Load only the columns the requested fields need
+def restrict(queryset, fields, expand):
+    if fields is None and not expand:
+        return queryset
+    names = FIELD_COLUMNS if fields is None else fields
+    columns = set(ORDERING_COLUMNS)
+    for name in names:
+        columns.update(FIELD_COLUMNS[name])
+    if 'user' in names and 'user' in expand:
+        columns.update(f'user__{column}' for column in AUTHOR_COLUMNS)
+    else:
+        # The author id is on the post row, no join needed
+        queryset = queryset.select_related(None)
+    return queryset.only(*columns)
+
+
+# The sparse version of an already serialized (full) post
+def trim(post, fields, expand):
+    if fields is None and not expand:
+        return post
+    post = {name: value for name, value in post.items() if fields is None or name in fields}
+    if 'user' in post:
+        author = post['user']
+        post['user'] = {name: author[name] for name in AUTHOR_FIELDS} if 'user' in expand else author['id']
+    return post
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from social_network.pubsub import get_broker
+
+# Server-Sent Events stream of post events (see posts/events.py)
+#
+#     const source = new EventSource('/api/posts/events/');
+#     source.onmessage = (e) => { const event = JSON.parse(e.data); ... };
+#
+# The view is async: served by the ASGI application (social_network/asgi.py,
+# e.g. `uvicorn social_network.asgi:application`) every open stream is just a
+# coroutine waiting on its subscription, not a worker thread. It is only routed
+# there (social_network/urls_asgi.py); under WSGI the URL answers 404, since the
+# endless stream would hold a worker forever. The events are
+# public (ids and counters only), so no authentication is needed, which also
+# suits EventSource since it cannot send an Authorization header.
+
+
+async def event_stream():
+    subscription = get_broker().subscribe()
+    try:
+        # Tell the browser how long to wait before reconnecting
+        yield 'retry: 3000\n\n'
+        while True:
+            message = await subscription.get(timeout=settings.EVENTS_HEARTBEAT)
+            if message is None:
+                # Keep-alive comment so proxies don't close an idle connection
+                yield ': keep-alive\n\n'
+            else:
+                yield f'data: {message}\n\n'
+    finally:
+        # Runs when the client disconnects (the generator is closed/cancelled)
+        await subscription.close()
+
+
+@require_GET
+async def post_events(request):
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let nginx buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,13 @@
+from social_network.background import run_in_background
+from social_network.images import generate_renditions
+from . import timeline
+
+
+# Work that follows the creation of a post, done outside the request.
+# Called by every code path that creates posts (API create, finalized uploads).
+def schedule_post_processing(post):
+    # Copy the post into the followers' home timelines
+    run_in_background(timeline.fan_out_post, post.pk)
+    # Resize the image; the response doesn't wait for it
+    if post.image:
+        run_in_background(generate_renditions, 'posts.Post', post.pk, 'image')
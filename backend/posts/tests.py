@@ -1,3 +1,1041 @@
-from django.test import TestCase
+import contextlib
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from social_network.async_api import parallel_queries
+from social_network.compression import CompressionMiddleware
+from social_network.pubsub import publish
+from social_network.renderers import FastJSONRenderer
+from users.models import User, UserStats
+from .events import ReactionCoalescer
+from .models import ArchivedPost, Post, Reaction, TimelineEntry, TrendingState
+from . import sparse, trending
 
-# Create your tests here.
+
+# Tests for the post feed and detail endpoints
+class PostFeedQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author@example.com', email='author@example.com', password='Secret123!')
+        self.viewer = User.objects.create_user(username='viewer@example.com', email='viewer@example.com', password='Secret123!')
+
+    # Create posts with a mix of likes and dislikes
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(user=self.author, description=f'Post {i}')
+            if i % 2:
+                Reaction.objects.create(user=self.viewer, post=post, value=Reaction.LIKE)
+            else:
+                Reaction.objects.create(user=self.author, post=post, value=Reaction.DISLIKE)
+
+    # Count the SQL queries needed to render one feed page
+    def count_feed_queries(self, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(queries)
+
+    def test_feed_query_count_does_not_grow_with_page_size(self):
+        self.create_posts(30)
+        self.client.force_authenticate(self.viewer)
+        self.assertEqual(self.count_feed_queries(5), self.count_feed_queries(30))
+
+    def test_anonymous_feed_query_count_does_not_grow_with_page_size(self):
+        self.create_posts(30)
+        self.assertEqual(self.count_feed_queries(5), self.count_feed_queries(30))
+
+    def test_feed_reports_counts_and_viewer_reaction(self):
+        post = Post.objects.create(user=self.author, description='Hello')
+        other = User.objects.create_user(username='other@example.com', email='other@example.com', password='Secret123!')
+        for user, action in ((self.author, 'like'), (other, 'dislike'), (self.viewer, 'like')):
+            self.client.force_authenticate(user)
+            self.client.post(f'/api/posts/{post.pk}/{action}/')
+
+        data = self.client.get(f'/api/posts/{post.pk}/').data
+        self.assertEqual(data['likes_count'], 2)
+        self.assertEqual(data['dislikes_count'], 1)
+        self.assertTrue(data['is_liked'])
+        self.assertFalse(data['is_disliked'])
+        self.assertEqual(data['user']['id'], self.author.pk)
+
+
+# Tests for keyset pagination of the feed (posts/pagination.py)
+class FeedPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author@example.com', email='author@example.com', password='Secret123!')
+        self.other = User.objects.create_user(username='other@example.com', email='other@example.com', password='Secret123!')
+
+    # Follow the next links from the first page, collecting the post ids
+    def read_feed(self, **params):
+        ids = []
+        response = self.client.get('/api/posts/', params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(post['id'] for post in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_pages_are_newest_first(self):
+        now = timezone.now()
+        posts = [Post.objects.create(user=self.author, description=f'Post {i}') for i in range(5)]
+        for age, post in enumerate(posts):
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(minutes=age))
+        self.assertEqual(self.read_feed(page_size=2), [post.pk for post in posts])
+
+    def test_cursor_breaks_created_at_ties_on_id(self):
+        created_at = timezone.now()
+        posts = [Post.objects.create(user=self.author, description=f'Post {i}') for i in range(7)]
+        Post.objects.update(created_at=created_at)
+        # Every post exactly once, highest id first, even with pages ending inside the tie
+        self.assertEqual(self.read_feed(page_size=3), sorted((post.pk for post in posts), reverse=True))
+
+    def test_user_id_filter_applies_to_every_page(self):
+        mine = [Post.objects.create(user=self.author, description=f'Mine {i}') for i in range(4)]
+        for i in range(4):
+            Post.objects.create(user=self.other, description=f'Theirs {i}')
+        ids = self.read_feed(page_size=3, user_id=self.author.pk)
+        self.assertEqual(ids, sorted((post.pk for post in mine), reverse=True))
+
+    def test_invalid_cursor_returns_404(self):
+        self.assertEqual(self.client.get('/api/posts/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+
+# Tests for the denormalized likes_count/dislikes_count columns
+class ReactionCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.post = Post.objects.create(user=self.user, description='Hello')
+        self.client.force_authenticate(self.user)
+
+    def assertCounts(self, likes, dislikes):
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count), (likes, dislikes))
+
+    def test_like_dislike_toggle_updates_counters(self):
+        self.client.post(f'/api/posts/{self.post.pk}/like/')
+        self.assertCounts(1, 0)
+        # Switching to dislike moves the reaction
+        self.client.post(f'/api/posts/{self.post.pk}/dislike/')
+        self.assertCounts(0, 1)
+        # Disliking again removes it
+        self.client.post(f'/api/posts/{self.post.pk}/dislike/')
+        self.assertCounts(0, 0)
+
+    def test_toggle_returns_new_state(self):
+        response = self.client.post(f'/api/posts/{self.post.pk}/like/')
+        self.assertEqual(response.data, {'likes_count': 1, 'dislikes_count': 0, 'is_liked': True, 'is_disliked': False})
+        response = self.client.post(f'/api/posts/{self.post.pk}/dislike/')
+        self.assertEqual(response.data, {'likes_count': 0, 'dislikes_count': 1, 'is_liked': False, 'is_disliked': True})
+        # Only one reaction row per (user, post)
+        self.assertEqual(Reaction.objects.filter(user=self.user, post=self.post).count(), 1)
+
+    def test_reacting_to_unknown_post_returns_404(self):
+        self.assertEqual(self.client.post('/api/posts/999999/like/').status_code, 404)
+
+    def test_reconcile_command_repairs_drift(self):
+        Reaction.objects.create(user=self.user, post=self.post, value=Reaction.LIKE)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=7, dislikes_count=3)
+        call_command('reconcile_reaction_counts', stdout=StringIO())
+        self.assertCounts(1, 0)
+
+
+# Tests for the read-through feed cache (posts/cache.py)
+@override_settings(EVENTS_COALESCE_WINDOW=0)
+class FeedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author@example.com', email='author@example.com', password='Secret123!')
+        self.viewer = User.objects.create_user(username='viewer@example.com', email='viewer@example.com', password='Secret123!')
+        self.post = Post.objects.create(user=self.author, description='Hello')
+
+    def test_second_anonymous_read_only_loads_the_counters(self):
+        self.client.get('/api/posts/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(response.data['results'][0]['id'], self.post.pk)
+
+    def test_reactions_keep_cached_pages(self):
+        first = self.client.get('/api/posts/')
+        version = cache.get('posts:feed-version:all')
+        self.client.force_authenticate(self.viewer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.pk}/like/')
+        self.assertEqual(cache.get('posts:feed-version:all'), version)
+        # Still served from the cached page, with the live counters overlaid
+        self.client.force_authenticate(None)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['likes_count'], 1)
+
+    def test_reactions_elsewhere_keep_the_page_etag(self):
+        other = Post.objects.create(user=self.viewer, description='Other')
+        etag = self.client.get('/api/posts/', {'user_id': self.author.pk})['ETag']
+        self.client.force_authenticate(self.viewer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{other.pk}/like/')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/posts/', {'user_id': self.author.pk}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_viewer_reaction_is_overlaid_on_shared_page(self):
+        self.client.get('/api/posts/')
+        Reaction.objects.create(user=self.viewer, post=self.post, value=Reaction.LIKE)
+        self.client.force_authenticate(self.viewer)
+        # Only the overlay query runs, the page itself comes from the cache
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/posts/')
+        self.assertTrue(response.data['results'][0]['is_liked'])
+
+    def test_writes_invalidate_cached_pages(self):
+        self.client.get('/api/posts/')
+        self.client.get(f'/api/posts/?user_id={self.author.pk}')
+        self.client.get(f'/api/posts/{self.post.pk}/')
+
+        # A reaction changes the counts everywhere the post is shown
+        self.client.force_authenticate(self.viewer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.pk}/like/')
+        self.assertEqual(self.client.get('/api/posts/').data['results'][0]['likes_count'], 1)
+        self.assertEqual(self.client.get(f'/api/posts/?user_id={self.author.pk}').data['results'][0]['likes_count'], 1)
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.pk}/').data['likes_count'], 1)
+
+        # A new post shows up on the first page
+        with self.captureOnCommitCallbacks(execute=True):
+            new_post = Post.objects.create(user=self.author, description='New')
+        self.assertEqual(self.client.get('/api/posts/').data['results'][0]['id'], new_post.pk)
+
+    def test_only_author_field_saves_invalidate_feeds(self):
+        self.client.get('/api/posts/')
+        version = cache.get('posts:feed-version:all')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.set_password('Other123!')
+            self.author.save(update_fields=['password'])
+        self.assertEqual(cache.get('posts:feed-version:all'), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Ann'
+            self.author.save(update_fields=['first_name'])
+        self.assertNotEqual(cache.get('posts:feed-version:all'), version)
+        self.assertEqual(self.client.get('/api/posts/').data['results'][0]['user']['first_name'], 'Ann')
+
+    def test_user_id_spellings_share_the_author_feed(self):
+        for user_id in (f'0{self.author.pk}', f' {self.author.pk}'):
+            self.client.get('/api/posts/', {'user_id': user_id})
+        with self.captureOnCommitCallbacks(execute=True):
+            new_post = Post.objects.create(user=self.author, description='New')
+        for user_id in (f'0{self.author.pk}', f' {self.author.pk}'):
+            self.assertEqual(self.client.get('/api/posts/', {'user_id': user_id}).data['results'][0]['id'], new_post.pk)
+        self.assertEqual(self.client.get('/api/posts/', {'user_id': 'me'}).status_code, 400)
+        with self.settings(ROOT_URLCONF='social_network.urls_asgi'):
+            self.assertEqual(async_to_sync(AsyncClient().get)('/api/posts/?user_id=me').status_code, 400)
+
+
+# Tests for home timelines (fan-out-on-write, with fan-out-on-read for big accounts)
+@override_settings(BACKGROUND_TASKS_EAGER=True, TIMELINE_FANOUT_LIMIT=1)
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='reader@example.com', email='reader@example.com', password='Secret123!')
+        self.friend = User.objects.create_user(username='friend@example.com', email='friend@example.com', password='Secret123!')
+        self.star = User.objects.create_user(username='star@example.com', email='star@example.com', password='Secret123!')
+        self.stranger = User.objects.create_user(username='stranger@example.com', email='stranger@example.com', password='Secret123!')
+        other_fan = User.objects.create_user(username='fan@example.com', email='fan@example.com', password='Secret123!')
+
+        # 'star' has 2 followers (> TIMELINE_FANOUT_LIMIT), 'friend' only 1
+        for follower, followed in ((self.reader, self.friend), (self.reader, self.star), (other_fan, self.star)):
+            self.client.force_authenticate(follower)
+            self.client.post(f'/api/users/{followed.pk}/follow/')
+
+    def create_post(self, author, description):
+        self.client.force_authenticate(author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/posts/', {'description': description})
+        return response.data['id']
+
+    def test_timeline_merges_fanned_out_and_celebrity_posts(self):
+        friend_post = self.create_post(self.friend, 'from friend')
+        star_post = self.create_post(self.star, 'from star')
+        self.create_post(self.stranger, 'from stranger')
+
+        # Only the small account was fanned out on write
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post_id=friend_post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader, post_id=star_post).exists())
+
+        self.client.force_authenticate(self.reader)
+        response = self.client.get('/api/posts/timeline/', {'page_size': 1})
+        self.assertEqual([post['id'] for post in response.data['results']], [star_post])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([post['id'] for post in response.data['results']], [friend_post])
+        self.assertIsNone(response.data['next'])
+
+    def test_unfollow_removes_posts_from_timeline(self):
+        self.create_post(self.friend, 'from friend')
+        self.client.force_authenticate(self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/users/{self.friend.pk}/follow/')
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader, author=self.friend).exists())
+
+
+# Tests for the background image renditions (social_network/images.py)
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.client.force_authenticate(self.user)
+
+    def make_image(self, size=(1600, 1200)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, 'PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_post_image_renditions_are_generated_after_create(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/posts/', {'description': 'pic', 'image': self.make_image()}, format='multipart')
+            # The create response does not wait for the renditions
+            self.assertIsNone(response.data['image_renditions'])
+
+            post = Post.objects.get(pk=response.data['id'])
+            self.assertEqual(len(post.image_renditions['blurhash']), 28)
+            with post.image.storage.open(post.image_renditions['thumbnail']['jpeg']) as thumbnail:
+                self.assertEqual(max(Image.open(thumbnail).size), 320)
+
+            data = self.client.get(f'/api/posts/{post.pk}/').data
+            self.assertTrue(data['image_renditions']['medium']['jpeg'].startswith('http://testserver/media/'))
+
+
+# Tests for full-text search (FTS5 on SQLite, tsvector + GIN on PostgreSQL)
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+
+    def test_search_ranks_and_paginates_matches(self):
+        weak = Post.objects.create(user=self.user, description='A long story about many different things and one small cat')
+        strong = Post.objects.create(user=self.user, description='Cat cat cat')
+        Post.objects.create(user=self.user, description='Only dogs here')
+
+        response = self.client.get('/api/posts/search/', {'q': 'cat', 'page_size': 1})
+        self.assertEqual([post['id'] for post in response.data['results']], [strong.pk])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([post['id'] for post in response.data['results']], [weak.pk])
+        self.assertIsNone(response.data['next'])
+
+    def test_equal_ranks_page_on_the_id(self):
+        posts = [Post.objects.create(user=self.user, description='cat photo') for _ in range(5)]
+        seen, url, params = [], '/api/posts/search/', {'q': 'cat', 'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            seen += [post['id'] for post in response.data['results']]
+            url, params = response.data['next'], None
+        self.assertEqual(seen, [post.pk for post in reversed(posts)])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(user=self.user, description='hello world')
+        post.description = 'goodbye world'
+        post.save()
+        self.assertEqual(self.client.get('/api/posts/search/', {'q': 'hello'}).data['results'], [])
+        self.assertEqual(len(self.client.get('/api/posts/search/', {'q': 'goodbye'}).data['results']), 1)
+        post.delete()
+        self.assertEqual(self.client.get('/api/posts/search/', {'q': 'world'}).data['results'], [])
+
+    def test_empty_query_returns_nothing(self):
+        Post.objects.create(user=self.user, description='hello')
+        self.assertEqual(self.client.get('/api/posts/search/', {'q': ' '}).data['results'], [])
+
+
+# Tests for the real-time post events (posts/events.py, posts/streams.py)
+@override_settings(EVENTS_COALESCE_WINDOW=0, BACKGROUND_TASKS_EAGER=True)
+class PostEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.client.force_authenticate(self.user)
+
+    def test_create_reaction_and_delete_are_published_after_commit(self):
+        with mock.patch('posts.events.publish') as publish_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                post_id = self.client.post('/api/posts/', {'description': 'hi'}).data['id']
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/api/posts/{post_id}/like/')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(f'/api/posts/{post_id}/')
+
+        self.assertEqual([call.args[0] for call in publish_mock.call_args_list], [
+            {'type': 'post.created', 'id': post_id, 'user_id': self.user.pk},
+            {'type': 'post.reactions', 'id': post_id, 'likes_count': 1, 'dislikes_count': 0},
+            {'type': 'post.deleted', 'id': post_id, 'user_id': self.user.pk},
+        ])
+
+    def test_reaction_bursts_are_coalesced_per_post(self):
+        busy = Post.objects.create(user=self.user, description='busy')
+        quiet = Post.objects.create(user=self.user, description='quiet')
+        published = []
+        coalescer = ReactionCoalescer(window=60, publish_event=published.append)
+
+        for _ in range(3):
+            coalescer.add(busy.pk)
+        coalescer.add(quiet.pk)
+        Post.objects.filter(pk=busy.pk).update(likes_count=7)
+        # Close the window by hand instead of waiting for the timer
+        coalescer.timer.cancel()
+        coalescer.flush()
+
+        self.assertEqual(sorted(published, key=lambda event: event['id']), [
+            {'type': 'post.reactions', 'id': busy.pk, 'likes_count': 7, 'dislikes_count': 0},
+            {'type': 'post.reactions', 'id': quiet.pk, 'likes_count': 0, 'dislikes_count': 0},
+        ])
+
+    @override_settings(ROOT_URLCONF='social_network.urls_asgi')
+    async def test_stream_delivers_published_events(self):
+        response = await AsyncClient().get('/api/posts/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+
+        # Subscribed once the first chunk is out; publish from "another request"
+        publish({'type': 'post.deleted', 'id': 5, 'user_id': 1})
+        chunk = (await anext(stream)).decode()
+        self.assertEqual(json.loads(chunk.removeprefix('data: ')), {'type': 'post.deleted', 'id': 5, 'user_id': 1})
+        await stream.aclose()
+
+    # The WSGI URLs don't route the endless stream, so it can't hold a worker
+    # (checked on the resolver first: a regression would hang the request below)
+    def test_stream_is_not_served_under_wsgi(self):
+        with self.assertRaises(Resolver404):
+            resolve('/api/posts/events/', urlconf='social_network.urls')
+        self.assertEqual(self.client.get('/api/posts/events/').status_code, 404)
+
+
+# Tests for delta sync (posts/changes.py) and conditional GETs
+@override_settings(CHANGES_SETTLE_SECONDS=0, EVENTS_COALESCE_WINDOW=0, BACKGROUND_TASKS_EAGER=True)
+class PostChangesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.client.force_authenticate(self.user)
+
+    def test_changes_since_token(self):
+        kept = Post.objects.create(user=self.user, description='kept')
+        gone = Post.objects.create(user=self.user, description='gone')
+        token = self.client.get('/api/posts/changes/').data['token']
+
+        new = self.client.post('/api/posts/', {'description': 'new'}).data
+        self.client.post(f'/api/posts/{kept.pk}/like/')
+        self.client.post(f'/api/posts/{new["id"]}/dislike/')
+        self.client.delete(f'/api/posts/{gone.pk}/')
+        # Created and deleted in the same window: only the deletion is reported
+        short_lived = self.client.post('/api/posts/', {'description': 'oops'}).data['id']
+        self.client.delete(f'/api/posts/{short_lived}/')
+
+        data = self.client.get('/api/posts/changes/', {'since': token}).data
+        self.assertEqual([post['id'] for post in data['posts']], [new['id']])
+        self.assertEqual(data['posts'][0]['dislikes_count'], 1)
+        self.assertTrue(data['posts'][0]['is_disliked'])
+        self.assertEqual(sorted(data['deleted']), sorted([gone.pk, short_lived]))
+        self.assertEqual(data['reactions'], [{'id': kept.pk, 'likes_count': 1, 'dislikes_count': 0}])
+        self.assertFalse(data['has_more'])
+
+        # Nothing new after the returned token
+        data = self.client.get('/api/posts/changes/', {'since': data['token']}).data
+        self.assertEqual((data['posts'], data['deleted'], data['reactions']), ([], [], []))
+
+    def test_pruned_token_is_gone(self):
+        Post.objects.create(user=self.user, description='one')
+        Post.objects.create(user=self.user, description='two')
+        call_command('prune_changelog', days=-1, stdout=StringIO())
+        Post.objects.create(user=self.user, description='three')
+        self.assertEqual(self.client.get('/api/posts/changes/', {'since': 0}).status_code, 410)
+
+    def test_feed_and_detail_answer_conditional_gets(self):
+        post = Post.objects.create(user=self.user, description='hello')
+        for url in ('/api/posts/', f'/api/posts/{post.pk}/'):
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            # A reaction changes the post, so the old ETag no longer matches
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/api/posts/{post.pk}/like/')
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+
+# Tests for the async read views served under ASGI (posts/async_views.py, users/async_views.py)
+@override_settings(ASYNC_PARALLEL_QUERIES=False, EVENTS_COALESCE_WINDOW=0, BACKGROUND_TASKS_EAGER=True)
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.posts = [Post.objects.create(user=self.user, description=f'Post {i}') for i in range(3)]
+        Reaction.objects.toggle(self.user, self.posts[0].pk, Reaction.LIKE)
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    # The same request through the DRF views and the async views
+    def get_both(self, url, headers):
+        cache.clear()
+        sync_response = APIClient().get(url, headers=headers)
+        cache.clear()
+        with self.settings(ROOT_URLCONF='social_network.urls_asgi'):
+            async_response = async_to_sync(AsyncClient().get)(url, headers=headers)
+        return sync_response, async_response
+
+    def test_async_views_return_the_same_json(self):
+        for url in ('/api/posts/?page_size=2', f'/api/posts/{self.posts[0].pk}/', '/api/profile/'):
+            for headers in ({}, self.auth):
+                sync_response, async_response = self.get_both(url, headers)
+                self.assertEqual(async_response.status_code, sync_response.status_code, url)
+                self.assertEqual(async_response.content, sync_response.content, url)
+
+    def test_async_feed_cursor_and_viewer_flags(self):
+        with self.settings(ROOT_URLCONF='social_network.urls_asgi'):
+            client = AsyncClient()
+            first = async_to_sync(client.get)('/api/posts/?page_size=2', headers=self.auth).json()
+            second = async_to_sync(client.get)(first['next'], headers=self.auth).json()
+            # Served from the cache now: the viewer flags are still per viewer
+            anonymous = async_to_sync(client.get)('/api/posts/?page_size=2').json()
+        self.assertEqual([post['id'] for post in first['results'] + second['results']], [post.pk for post in reversed(self.posts)])
+        self.assertTrue(second['results'][-1]['is_liked'])
+        self.assertFalse(any(post['is_liked'] for post in anonymous['results']))
+
+    def test_async_views_reject_bad_tokens_and_pass_writes_on(self):
+        with self.settings(ROOT_URLCONF='social_network.urls_asgi'):
+            client = AsyncClient()
+            self.assertEqual(async_to_sync(client.get)('/api/posts/', headers={'Authorization': 'Bearer nope'}).status_code, 401)
+            self.assertEqual(async_to_sync(client.get)('/api/profile/').status_code, 401)
+            response = async_to_sync(client.post)('/api/posts/', {'description': 'async'}, headers=self.auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Post.objects.filter(description='async').exists())
+
+    # Without persistent connections each parallel query would open its own
+    @override_settings(ASYNC_PARALLEL_QUERIES=True)
+    def test_parallel_queries_need_persistent_connections(self):
+        self.assertFalse(parallel_queries())
+        with contextlib.ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(mock.patch.dict(connections[alias].settings_dict, {'CONN_MAX_AGE': 60}))
+            self.assertTrue(parallel_queries())
+
+
+# Tests for the request metrics middleware (social_network/metrics.py)
+@override_settings(REQUEST_METRICS_FLUSH_INTERVAL=0, ASYNC_PARALLEL_QUERIES=False, EVENTS_COALESCE_WINDOW=0, BACKGROUND_TASKS_EAGER=True)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        for i in range(3):
+            Post.objects.create(user=self.user, description=f'Post {i}')
+
+    def test_server_timing_header_and_log_line(self):
+        with self.assertLogs('social_network.metrics', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['endpoint'], 'post-list-create')
+        self.assertEqual(line['queries'], len(queries))
+        self.assertGreater(line['serializer_ms'], 0)
+        self.assertEqual(line['over_budget'], [])
+
+    def test_requests_over_budget_are_flagged(self):
+        budgets = {'default': {'queries': 20}, 'post-list-create': {'queries': 0}}
+        with self.settings(REQUEST_BUDGETS=budgets), self.assertLogs('social_network.metrics', 'INFO') as logs:
+            self.client.get('/api/posts/')
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['over_budget'], ['queries'])
+
+    def test_async_views_are_measured(self):
+        with self.settings(ROOT_URLCONF='social_network.urls_asgi'), self.assertLogs('social_network.metrics', 'INFO') as logs:
+            response = async_to_sync(AsyncClient().get)('/api/posts/')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['endpoint'], 'post-list-create')
+        self.assertGreater(line['queries'], 0)
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_histograms_are_admin_only(self):
+        for _ in range(3):
+            self.client.get('/api/posts/')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.user.refresh_from_db()
+        self.client.force_authenticate(self.user)
+        stats = self.client.get('/api/metrics/').json()['post-list-create']
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(sum(bucket['count'] for bucket in stats['total_ms']['buckets']), 3)
+        self.assertIsNotNone(stats['queries']['p95'])
+
+        self.assertEqual(self.client.delete('/api/metrics/').status_code, 204)
+        self.assertNotIn('post-list-create', self.client.get('/api/metrics/').json())
+
+
+# Tests for sparse fieldsets, the JSON renderer and compression of feed responses
+@override_settings(ASYNC_PARALLEL_QUERIES=False, EVENTS_COALESCE_WINDOW=0, BACKGROUND_TASKS_EAGER=True)
+class FeedPayloadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!', first_name='Ann')
+        self.posts = [Post.objects.create(user=self.user, description=f'Post {i}') for i in range(3)]
+        Reaction.objects.toggle(self.user, self.posts[0].pk, Reaction.LIKE)
+
+    def test_fields_limit_the_payload_and_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/?fields=description,likes_count')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'description', 'likes_count'})
+        page_query = next(query['sql'] for query in queries if 'FROM "posts_post"' in query['sql'])
+        self.assertNotIn('image_renditions', page_query)
+        self.assertNotIn('users_user', page_query)
+
+        # The author as an id, or (expanded) without private fields
+        post = self.client.get('/api/posts/?fields=user').data['results'][0]
+        self.assertEqual(post['user'], self.user.pk)
+        post = self.client.get('/api/posts/?fields=user&expand=user').data['results'][0]
+        self.assertEqual(set(post['user']), set(sparse.AUTHOR_FIELDS))
+        self.assertEqual(post['user']['first_name'], 'Ann')
+        # Without ?fields= nothing changes
+        self.assertIn('email', self.client.get('/api/posts/').data['results'][0]['user'])
+
+    def test_viewer_flags_and_detail(self):
+        self.client.force_authenticate(self.user)
+        results = self.client.get('/api/posts/?fields=is_liked').data['results']
+        self.assertEqual([post['is_liked'] for post in results], [False, False, True])
+
+        url = f'/api/posts/{self.posts[0].pk}/'
+        self.assertEqual(self.client.get(url + '?fields=is_liked,user').data, {'id': self.posts[0].pk, 'is_liked': True, 'user': self.user.pk})
+        # The cached copy is still the full post
+        self.assertIn('description', self.client.get(url).data)
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get('/api/posts/?fields=password').status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/?expand=reactions').status_code, 400)
+        with self.settings(ROOT_URLCONF='social_network.urls_asgi'):
+            self.assertEqual(async_to_sync(AsyncClient().get)('/api/posts/?fields=password').status_code, 400)
+
+    def test_async_views_return_the_same_sparse_json(self):
+        for url in ('/api/posts/?fields=description,user&expand=user', f'/api/posts/{self.posts[1].pk}/?fields=user'):
+            cache.clear()
+            sync_response = self.client.get(url)
+            cache.clear()
+            with self.settings(ROOT_URLCONF='social_network.urls_asgi'):
+                async_response = async_to_sync(AsyncClient().get)(url)
+            self.assertEqual(async_response.content, sync_response.content, url)
+
+    def test_fast_renderer_matches_drf(self):
+        data = {'text': 'caf\u00e9 \u2028', 'when': datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc), 'price': Decimal('1.50'), 'items': [1, None, True]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        with self.settings(FAST_JSON_RENDERER=False):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_responses_are_compressed_except_event_streams(self):
+        for i in range(10):
+            Post.objects.create(user=self.user, description=f'Another post {i}')
+        response = self.client.get('/api/posts/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['results'][0]['description'], 'Another post 9')
+
+        request = RequestFactory().get('/api/posts/events/', HTTP_ACCEPT_ENCODING='gzip')
+        stream = StreamingHttpResponse(iter([b'data: {}\n\n'] * 100), content_type='text/event-stream')
+        self.assertFalse(CompressionMiddleware(lambda request: stream)(request).has_header('Content-Encoding'))
+        page = HttpResponse(b'{"results": []}' * 100, content_type='application/json')
+        self.assertEqual(CompressionMiddleware(lambda request: page)(request)['Content-Encoding'], 'gzip')
+
+
+# Tests for reading from a replica (social_network/replicas.py). The 'replica'
+# database lags behind: it only has what replicate() copied to it.
+@override_settings(DATABASE_REPLICAS=['replica'], ASYNC_PARALLEL_QUERIES=False, EVENTS_COALESCE_WINDOW=0, BACKGROUND_TASKS_EAGER=True)
+class ReplicaRoutingTests(TestCase):
+    # The 'replica' database only exists for these tests: a second test
+    # database on the same server, added before the test transactions open
+    @classmethod
+    def setUpClass(cls):
+        default = connections.settings[DEFAULT_DB_ALIAS]
+        connections.settings['replica'] = {**default, 'NAME': f"{default['NAME']}_replica", 'TEST': {**default['TEST'], 'NAME': None}}
+        connections['replica'].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cls.databases = {DEFAULT_DB_ALIAS, 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].creation.destroy_test_db(verbosity=0)
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author@example.com', email='author@example.com', password='Secret123!')
+        self.reader = User.objects.create_user(username='reader@example.com', email='reader@example.com', password='Secret123!')
+        self.post = Post.objects.create(user=self.author, description='Replicated')
+        self.replicate(self.author, self.reader, self.post)
+
+    # The replica catches up with these rows (no signals: nothing is invalidated)
+    def replicate(self, *objects):
+        for obj in objects:
+            type(obj).objects.using('replica').bulk_create([obj])
+
+    def feed_ids(self, user=None):
+        self.client.force_authenticate(user)
+        return [post['id'] for post in self.client.get('/api/posts/').data['results']]
+
+    def test_reads_come_from_the_replica(self):
+        new = Post.objects.create(user=self.author, description='Not replicated yet')
+        self.assertEqual(self.feed_ids(), [self.post.pk])
+        self.assertEqual(self.client.get(f'/api/posts/{new.pk}/').status_code, 404)
+        with self.settings(ROOT_URLCONF='social_network.urls_asgi'):
+            self.assertEqual(async_to_sync(AsyncClient().get)(f'/api/posts/{new.pk}/').status_code, 404)
+
+        # Once replicated (and the short-lived replica page expired) it shows up
+        self.replicate(new)
+        cache.clear()
+        self.assertEqual(self.feed_ids(), [new.pk, self.post.pk])
+        # Without replicas everything is read from the primary
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.client.get(f'/api/posts/{new.pk}/').status_code, 200)
+
+    def test_writers_read_their_own_writes(self):
+        self.client.force_authenticate(self.author)
+        created = self.client.post('/api/posts/', {'description': 'Mine'}).data
+        self.assertFalse(Post.objects.using('replica').filter(pk=created['id']).exists())
+
+        # Another reader fills the shared cache from the lagging replica...
+        self.assertEqual(self.feed_ids(self.reader), [self.post.pk])
+        # ...the author still sees their post, read from the primary
+        self.assertEqual(self.feed_ids(self.author), [created['id'], self.post.pk])
+
+        self.client.force_authenticate(self.author)
+        self.client.post(f'/api/posts/{self.post.pk}/like/')
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.pk}/').data['likes_count'], 0)
+        self.client.force_authenticate(self.author)
+        data = self.client.get(f'/api/posts/{self.post.pk}/').data
+        self.assertEqual(data['likes_count'], 1)
+        self.assertTrue(data['is_liked'])
+
+
+# Tests for the trending feed (posts/trending.py)
+@override_settings(EVENTS_COALESCE_WINDOW=0, BACKGROUND_TASKS_EAGER=True, TRENDING_HALF_LIFE_HOURS=12)
+class TrendingFeedTests(TestCase):
+    def setUp(self):
+        # Scores measured from now (the migration started the epoch earlier)
+        TrendingState.objects.update(epoch=time.time())
+        cache.clear()
+        self.client = APIClient()
+        self.users = [
+            User.objects.create_user(username=f'user{i}@example.com', email=f'user{i}@example.com', password='Secret123!')
+            for i in range(3)
+        ]
+        self.quiet, self.liked, self.popular = [Post.objects.create(user=self.users[0], description=name) for name in ('quiet', 'liked', 'popular')]
+
+    def react(self, user, post, action='like'):
+        self.client.force_authenticate(user)
+        self.client.post(f'/api/posts/{post.pk}/{action}/')
+        self.client.force_authenticate(None)
+
+    def trending_ids(self, url='/api/posts/?sort=trending&page_size=2'):
+        data = self.client.get(url).data
+        return [post['id'] for post in data['results']], data['next']
+
+    def test_reactions_rank_the_feed(self):
+        for user in self.users[:2]:
+            self.react(user, self.popular)
+        self.react(self.users[2], self.liked)
+        # Newest first without a sort; by score with ?sort=trending, one page after the other
+        self.assertEqual(self.trending_ids('/api/posts/?page_size=2')[0], [self.popular.pk, self.liked.pk])
+        first, next_url = self.trending_ids()
+        self.assertEqual(first, [self.popular.pk, self.liked.pk])
+        self.assertEqual(self.trending_ids(next_url), ([self.quiet.pk], None))
+
+        # Taking reactions back, or turning them into dislikes, takes them off the score
+        self.react(self.users[0], self.popular)
+        self.react(self.users[1], self.popular, 'dislike')
+        self.assertEqual(self.trending_ids('/api/posts/?sort=trending')[0], [self.liked.pk, self.quiet.pk, self.popular.pk])
+        scores = dict(Post.objects.values_list('pk', 'hot_score'))
+        self.assertAlmostEqual(scores[self.quiet.pk] - scores[self.popular.pk], 1.0, places=3)
+
+        self.assertEqual(self.client.get('/api/posts/?sort=best').status_code, 400)
+
+    def test_decay_keeps_the_order_and_cursors(self):
+        self.react(self.users[0], self.popular)
+        # Pretend the epoch is a day old: every stored score is 4 times larger
+        TrendingState.objects.update(epoch=F('epoch') - 24 * 3600)
+        Post.objects.update(hot_score=F('hot_score') * 4)
+        cache.clear()
+        before = dict(Post.objects.values_list('pk', 'hot_score'))
+        first, next_url = self.trending_ids()
+
+        call_command('decay_trending_scores', batch_size=2, stdout=StringIO())
+        after = dict(Post.objects.values_list('pk', 'hot_score'))
+        for pk, score in before.items():
+            self.assertAlmostEqual(after[pk], score / 4, places=3)
+        self.assertIsNone(TrendingState.objects.get().rebase_epoch)
+        # The cursor from before the rebase still continues where it was
+        self.assertEqual(first, [self.popular.pk, self.liked.pk])
+        self.assertEqual(self.trending_ids(next_url), ([self.quiet.pk], None))
+
+    def test_reactions_during_a_rebase_use_the_row_epoch(self):
+        TrendingState.objects.update(epoch=F('epoch') - 24 * 3600)
+        Post.objects.update(hot_score=F('hot_score') * 4)
+        # A rebase stopped after the first post: it is measured against the new epoch
+        TrendingState.objects.update(rebase_epoch=time.time(), rebased_id=self.liked.pk)
+        Post.objects.filter(pk=self.quiet.pk).update(hot_score=F('hot_score') / 4)
+        self.react(self.users[0], self.quiet)
+        self.react(self.users[0], self.liked)
+        trending.rebase()
+        scores = dict(Post.objects.values_list('pk', 'hot_score'))
+        # Each like adds 1 at the new epoch, on top of the post's own weight
+        self.assertAlmostEqual(scores[self.quiet.pk], 2.0, places=3)
+        self.assertAlmostEqual(scores[self.liked.pk], 2.0, places=3)
+        self.assertAlmostEqual(scores[self.popular.pk], 1.0, places=3)
+
+    def test_old_reactions_count_less_and_rebuild(self):
+        for user in self.users:
+            self.react(user, self.quiet)
+        self.react(self.users[0], self.liked)
+        # The quiet post and its three likes are two days old (four half lives)
+        two_days_ago = timezone.now() - timedelta(days=2)
+        Post.objects.filter(pk=self.quiet.pk).update(created_at=two_days_ago)
+        Reaction.objects.filter(post=self.quiet).update(created_at=two_days_ago)
+        Post.objects.update(hot_score=0)
+        call_command('decay_trending_scores', rebuild=True, batch_size=2, stdout=StringIO())
+        cache.clear()
+        self.assertEqual(self.trending_ids('/api/posts/?sort=trending')[0], [self.liked.pk, self.popular.pk, self.quiet.pk])
+        self.assertAlmostEqual(Post.objects.get(pk=self.liked.pk).hot_score / Post.objects.get(pk=self.popular.pk).hot_score, 2.0, places=3)
+
+
+# Tests for the NDJSON export and import (posts/transfer.py)
+@override_settings(EVENTS_COALESCE_WINDOW=0, TRENDING_HALF_LIFE_HOURS=12, TRENDING_POST_WEIGHT=1.0)
+class TransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        TrendingState.objects.update(epoch=time.time())
+        self.client = APIClient()
+        self.ann = User.objects.create_user(username='ann@example.com', email='ann@example.com', password='Secret123!')
+        self.bob = User.objects.create_user(username='bob@example.com', email='bob@example.com', password='Secret123!')
+        self.post = Post.objects.create(user=self.ann, description='hello')
+        Post.objects.filter(pk=self.post.pk).update(created_at=timezone.now() - timedelta(days=1, microseconds=123))
+        self.other = Post.objects.create(user=self.bob, description='other')
+        Reaction.objects.toggle(self.bob, self.post.pk, Reaction.LIKE)
+        descriptor, self.path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(descriptor)
+        self.addCleanup(os.remove, self.path)
+
+    def export(self):
+        call_command('export_ndjson', output=self.path, stdout=StringIO())
+        with open(self.path, 'rb') as file:
+            return [json.loads(line) for line in file]
+
+    def test_round_trip(self):
+        records = self.export()
+        self.assertEqual([record['type'] for record in records], ['user', 'user', 'post', 'post', 'reaction'])
+        before = list(Post.objects.order_by('pk').values_list('pk', 'user_id', 'created_at', 'likes_count', 'hot_score'))
+        password = User.objects.get(pk=self.ann.pk).password
+
+        User.objects.all().delete()
+        call_command('import_ndjson', self.path, batch_size=1, stdout=StringIO())
+        after = list(Post.objects.order_by('pk').values_list('pk', 'user_id', 'created_at', 'likes_count', 'hot_score'))
+        self.assertEqual([row[:4] for row in after], [row[:4] for row in before])
+        # Recomputed: the day-old post (a quarter of its weight left) and its like
+        self.assertAlmostEqual(after[0][4], 1.25, places=3)
+        self.assertEqual(User.objects.get(pk=self.ann.pk).password, password)
+        self.assertEqual(User.objects.get(pk=self.ann.pk).stats.likes_received, 1)
+        self.assertTrue(Reaction.objects.filter(user=self.bob.pk, post=self.post.pk, value=Reaction.LIKE).exists())
+
+        # Again: everything already exists
+        call_command('import_ndjson', self.path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        # New rows get new ids
+        self.assertGreater(Post.objects.create(user_id=self.ann.pk).pk, self.other.pk)
+
+    def test_plain_text_passwords_are_refused(self):
+        with open(self.path, 'w') as file:
+            file.write('{"type": "user", "id": 51, "email": "none@example.com", "username": "none"}\n\n')
+            file.write('{"type": "user", "id": 50, "email": "new@example.com", "username": "new", "password": "Secret123!"}\n')
+        with self.assertRaisesMessage(CommandError, 'Line 3: password is not a password hash'):
+            call_command('import_ndjson', self.path, batch_size=1, stdout=StringIO())
+        self.assertFalse(User.objects.filter(pk=50).exists())
+        # Without a password: an unusable one
+        self.assertFalse(User.objects.get(pk=51).has_usable_password())
+
+    def test_invalid_records_are_reported_with_their_line(self):
+        for line, message in (('not json', 'Line 1: invalid JSON'), ('{"type": "comment"}', "Line 1: unknown type 'comment'"),
+                              ('{"type": "post", "id": 9, "colour": "red"}', 'Line 1: unknown field(s) colour'),
+                              ('{"type": "post", "id": "x"}', 'Line 1:'),
+                              ('{"type": "reaction", "id": 9, "user": 1, "post": 1, "value": 5}', 'Line 1: value: Value 5 is not a valid choice'),
+                              ('{"type": "user", "id": 9, "email": "not an email", "username": "x"}', 'Line 1: email: Enter a valid email address')):
+            with open(self.path, 'w') as file:
+                file.write(line + '\n')
+            with self.assertRaisesMessage(CommandError, message):
+                call_command('import_ndjson', self.path, stdout=StringIO())
+        self.assertFalse(Reaction.objects.filter(pk=9).exists())
+
+    def test_import_invalidates_cached_responses(self):
+        self.client.get('/api/posts/')
+        self.client.get(f'/api/posts/{self.other.pk}/')
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.get('/api/profile/').data['stats']['likes_received'], 0)
+        with open(self.path, 'w') as file:
+            file.write(json.dumps({'type': 'post', 'id': 70, 'user': self.ann.pk, 'description': 'imported'}) + '\n')
+            file.write(json.dumps({'type': 'reaction', 'id': 71, 'user': self.ann.pk, 'post': self.other.pk, 'value': 1}) + '\n')
+        call_command('import_ndjson', self.path, stdout=StringIO())
+        self.assertIn(70, [post['id'] for post in self.client.get('/api/posts/').data['results']])
+        self.assertEqual(self.client.get(f'/api/posts/{self.other.pk}/').data['likes_count'], 1)
+        self.assertEqual(self.client.get('/api/profile/').data['stats']['likes_received'], 1)
+
+    def test_export_endpoint_streams_own_posts(self):
+        self.assertEqual(self.client.get('/api/posts/export/').status_code, 401)
+        self.client.force_authenticate(self.ann)
+        response = self.client.get('/api/posts/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(record['id'], record['description']) for record in records], [(self.post.pk, 'hello')])
+        self.assertEqual(datetime.fromisoformat(records[0]['created_at']), Post.objects.get(pk=self.post.pk).created_at)
+
+    def test_export_endpoint_streams_asynchronously_under_asgi(self):
+        async def read(response):
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.ann)}'}
+        response = async_to_sync(AsyncClient().get)('/api/posts/export/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        # An async iterator: Django would otherwise read the whole export into memory
+        self.assertTrue(response.is_async)
+        records = [json.loads(line) for line in async_to_sync(read)(response).splitlines()]
+        self.assertEqual([record['id'] for record in records], [self.post.pk])
+
+
+# Tests for the cold archive of old posts (posts/archive.py)
+@override_settings(ASYNC_PARALLEL_QUERIES=False, EVENTS_COALESCE_WINDOW=0, BACKGROUND_TASKS_EAGER=True, POST_ARCHIVE_AFTER_DAYS=365)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author@example.com', email='author@example.com', password='Secret123!')
+        self.fan = User.objects.create_user(username='fan@example.com', email='fan@example.com', password='Secret123!')
+        self.old = Post.objects.create(user=self.author, description='old')
+        self.recent = Post.objects.create(user=self.author, description='recent')
+        Post.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        Reaction.objects.toggle(self.fan, self.old.pk, Reaction.LIKE)
+
+    def roll(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('roll_post_archive', stdout=StringIO())
+
+    def test_roll_moves_old_posts_and_their_reactions(self):
+        live = self.client.get(f'/api/posts/{self.old.pk}/').data
+        self.client.get('/api/posts/')
+        self.roll()
+
+        self.assertEqual(list(Post.objects.values_list('pk', flat=True)), [self.recent.pk])
+        self.assertFalse(Reaction.objects.exists())
+        archived = ArchivedPost.objects.get()
+        self.assertEqual((archived.pk, archived.likes_count, archived.liked_by, archived.disliked_by), (self.old.pk, 1, [self.fan.pk], []))
+        # Still counted on the profile
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.likes_received), (2, 1))
+        # Gone from the (cached) feed, still served by id, in the same shape
+        self.assertEqual([post['id'] for post in self.client.get('/api/posts/').data['results']], [self.recent.pk])
+        self.assertEqual(self.client.get(f'/api/posts/{self.old.pk}/').data, live)
+
+        self.client.force_authenticate(self.fan)
+        self.assertTrue(self.client.get(f'/api/posts/{self.old.pk}/').data['is_liked'])
+        self.assertEqual(self.client.get(f'/api/posts/{self.old.pk}/?fields=likes_count').data, {'id': self.old.pk, 'likes_count': 1})
+        self.assertEqual(self.client.post(f'/api/posts/{self.old.pk}/like/').status_code, 404)
+        with self.settings(ROOT_URLCONF='social_network.urls_asgi'):
+            response = async_to_sync(AsyncClient().get)(f'/api/posts/{self.old.pk}/')
+        self.assertEqual(response.json()['description'], 'old')
+        self.assertEqual(self.client.get('/api/posts/999999/').status_code, 404)
+
+        # Recomputed statistics include the archive
+        UserStats.objects.filter(user=self.author).update(posts_count=0, likes_received=0)
+        call_command('rebuild_user_stats', stdout=StringIO())
+        stats.refresh_from_db()
+        self.assertEqual((stats.posts_count, stats.likes_received), (2, 1))
+
+    def test_exports_include_the_archive(self):
+        self.roll()
+        self.client.force_authenticate(self.author)
+        response = self.client.get('/api/posts/export/')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(sorted(record['id'] for record in records), [self.old.pk, self.recent.pk])
+
+        # A backup restores the archived post as a live one, with its reaction
+        path = os.path.join(tempfile.mkdtemp(), 'backup.ndjson')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        call_command('export_ndjson', output=path, types='post,reaction', stdout=StringIO())
+        with open(path) as file:
+            reactions = [record for record in map(json.loads, file) if record['type'] == 'reaction']
+        self.assertEqual([(record['user'], record['post'], record['value']) for record in reactions], [(self.fan.pk, self.old.pk, Reaction.LIKE)])
+        ArchivedPost.objects.all().delete()
+        Post.objects.all().delete()
+        call_command('import_ndjson', path, stdout=StringIO())
+        self.assertEqual(Post.objects.get(pk=self.old.pk).likes_count, 1)
+        self.assertTrue(Reaction.objects.filter(user=self.fan, post_id=self.old.pk).exists())
+
+    def test_only_the_author_deletes_an_archived_post(self):
+        self.roll()
+        self.client.force_authenticate(self.fan)
+        self.assertEqual(self.client.delete(f'/api/posts/{self.old.pk}/').status_code, 403)
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/posts/{self.old.pk}/').status_code, 204)
+        self.assertFalse(ArchivedPost.objects.exists())
+        self.assertEqual(self.client.get(f'/api/posts/{self.old.pk}/').status_code, 404)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.likes_received), (1, 0))
+
+    def test_account_deletion_removes_archived_posts(self):
+        self.roll()
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete('/api/profile/').status_code, 202)
+        self.assertFalse(ArchivedPost.objects.exists())
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
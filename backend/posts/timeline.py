@@ -0,0 +1,80 @@
+from itertools import chain
+from django.conf import settings
+from django.db.models import F
+from users.models import Follow, User
+from .models import Post, TimelineEntry
+
+# Home timelines (fan-out-on-write)
+#
+# When someone posts, a TimelineEntry row is written for each of their followers
+# (in the background, in batches). Reading a timeline is then a range scan over
+# the owner's own rows instead of a join across everyone they follow.
+#
+# Authors with more than TIMELINE_FANOUT_LIMIT followers are skipped on write,
+# because one post would mean millions of inserts. Their posts are pulled in at
+# read time instead (fan-out-on-read, see celebrity_ids / TimelineView).
+
+
+# Write the post into the timelines of its author and all their followers
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).values('user_id', 'user__followers_count', 'created_at').first()
+    if post is None:
+        # Deleted before the task ran
+        return
+
+    author_id = post['user_id']
+    owners = [author_id]
+    if post['user__followers_count'] <= settings.TIMELINE_FANOUT_LIMIT:
+        followers = Follow.objects.filter(followed_id=author_id).values_list('follower_id', flat=True)
+        owners = chain(owners, followers.iterator(chunk_size=settings.TIMELINE_FANOUT_BATCH_SIZE))
+
+    batch = []
+    for owner_id in owners:
+        batch.append(TimelineEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, created_at=post['created_at']))
+        if len(batch) >= settings.TIMELINE_FANOUT_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+# After a new follow: copy the author's recent posts into the follower's timeline
+def backfill_follow(follower_id, followed_id):
+    if _is_celebrity(followed_id):
+        # Read at request time instead
+        return
+    recent = (
+        Post.objects.filter(user_id=followed_id)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:settings.TIMELINE_BACKFILL_SIZE]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=follower_id, post_id=post_id, author_id=followed_id, created_at=created_at) for post_id, created_at in recent],
+        ignore_conflicts=True,
+    )
+
+
+# After an unfollow: remove the author's posts from the follower's timeline (one DELETE)
+def remove_follow(follower_id, followed_id):
+    TimelineEntry.objects.filter(owner_id=follower_id, author_id=followed_id).delete()
+
+
+def _is_celebrity(user_id):
+    return User.objects.filter(pk=user_id, followers_count__gt=settings.TIMELINE_FANOUT_LIMIT).exists()
+
+
+# Ids of the followed authors that are NOT fanned out on write
+def celebrity_ids(user):
+    return list(
+        User.objects.filter(follower_links__follower=user, followers_count__gt=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('id', flat=True)
+    )
+
+
+# Rows to paginate for a user's timeline: their own entries, plus (only if needed)
+# the posts of followed celebrities. Both expose created_at and post_id.
+def timeline_sources(user):
+    sources = [TimelineEntry.objects.filter(owner=user).only('post_id', 'created_at')]
+    celebrities = celebrity_ids(user)
+    if celebrities:
+        sources.append(Post.objects.filter(user_id__in=celebrities).annotate(post_id=F('id')).only('id', 'created_at'))
+    return sources
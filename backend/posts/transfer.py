@@ -0,0 +1,188 @@
+from collections import Counter
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from users import cache as user_cache
+from users.models import User
+from . import cache
+from .models import ArchivedPost, Post, Reaction
+
+# Bulk export and import of users, posts and reactions as NDJSON (social_network/ndjson.py)
+#
+# One record per line, tagged with its type, users first, then posts, then
+# reactions, so every record only refers to rows written before it:
+#
+#   {"type": "user", "id": 1, "email": "ann@example.com", "password": "pbkdf2_sha256$...", ...}
+#   {"type": "post", "id": 7, "user": 1, "description": "...", "created_at": "2026-01-02T10:00:00.123456+00:00", ...}
+#   {"type": "reaction", "id": 3, "user": 2, "post": 7, "value": 1, "created_at": "..."}
+#
+# Exports read the tables in primary-key order through iterator() (a server-side
+# cursor on PostgreSQL), so memory stays flat whatever their size. Imports
+# insert BATCH_SIZE rows per statement and transaction, with their ids and
+# timestamps as given, and skip rows that already exist (an interrupted import
+# can simply be run again). Every record is validated like a model form would
+# (choices, lengths, formats); references to other rows are left to the
+# database's foreign keys. Passwords must be hashes: plain text is refused.
+# Archived posts (posts/archive.py) are exported as post records and the
+# reactions folded into them as reaction records, without an id (a new one is
+# generated on import) and dated like their post (their own time is not kept).
+# Nothing derived is exported: the reaction counters, profile statistics and
+# trending scores are recomputed after an import (`manage.py import_ndjson`),
+# then the cached responses showing the imported rows are invalidated,
+# timelines fill up from new posts, and media files are copied separately.
+
+# Exported columns of each type, in file order
+TYPES = {
+    'user': (User, (
+        'id', 'email', 'username', 'password', 'first_name', 'last_name', 'date_of_birth',
+        'profile_picture', 'profile_picture_renditions', 'is_active', 'date_joined',
+    )),
+    'post': (Post, ('id', 'user', 'image', 'image_renditions', 'description', 'created_at')),
+    'reaction': (Reaction, ('id', 'user', 'post', 'value', 'created_at')),
+}
+BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+
+
+# The records of one type, from `queryset`, then for posts and reactions from
+# the archived posts in `archived` (all rows of both by default)
+def export_records(kind, queryset=None, archived=None):
+    model, fields = TYPES[kind]
+    if queryset is None:
+        queryset = model.objects.all()
+        archived = ArchivedPost.objects.all() if archived is None else archived
+    rows = queryset.order_by('pk').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for row in rows:
+        yield {'type': kind, **dict(zip(fields, row))}
+    if archived is None:
+        return
+    if kind == 'post':
+        # Same columns as a live post
+        rows = archived.order_by('pk').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for row in rows:
+            yield {'type': kind, **dict(zip(fields, row))}
+    elif kind == 'reaction':
+        rows = archived.order_by('pk').values_list('pk', 'created_at', 'liked_by', 'disliked_by').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for post_id, created_at, liked_by, disliked_by in rows:
+            for value, user_ids in ((Reaction.LIKE, liked_by), (Reaction.DISLIKE, disliked_by)):
+                for user_id in user_ids:
+                    yield {'type': kind, 'user': user_id, 'post': post_id, 'value': value, 'created_at': created_at}
+
+
+def _password(value):
+    if not value:
+        return make_password(None)
+    if value.startswith(UNUSABLE_PASSWORD_PREFIX):
+        return value
+    try:
+        # A hash (an export of this or another Django site): stored as it is
+        identify_hasher(value)
+        return value
+    except ValueError:
+        # Hashing it properly takes hundreds of milliseconds per user, and a
+        # cheap hash would stay weak for every user who never logs in
+        raise ValueError('password is not a password hash (plain text is not imported)')
+
+
+def _instance(model, fields, record):
+    unknown = set(record) - set(fields) - {'type'}
+    if unknown:
+        raise ValueError(f"unknown field(s) {', '.join(sorted(unknown))}")
+    values = {}
+    for name in fields:
+        if name not in record:
+            continue
+        field = model._meta.get_field(name)
+        value = record[name]
+        if value is not None:
+            value = (field.target_field if field.is_relation else field).to_python(value)
+        values[field.attname] = value
+    if model is User:
+        values['password'] = _password(values.get('password'))
+    # The inserts are raw: fill in the creation times left out, as a save would
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now_add', False) and values.get(field.attname) is None:
+            values[field.attname] = timezone.now()
+    instance = model(**values)
+    # Choices, lengths, formats... Related rows are checked by the foreign keys
+    # on insert (here it would cost a query per row)
+    instance.clean_fields(exclude={field.name for field in model._meta.concrete_fields if field.is_relation})
+    return instance
+
+
+# Insert model instances with all their values as they are: unlike
+# bulk_create(), auto_now_add keeps the given timestamps. Rows that already
+# exist are skipped. Instances without a primary key get a generated one.
+def insert_rows(model, instances):
+    with transaction.atomic():
+        for with_pk in (True, False):
+            group = [instance for instance in instances if (instance.pk is not None) == with_pk]
+            if not group:
+                continue
+            fields = [
+                field for field in model._meta.concrete_fields
+                if not field.generated and (with_pk or not field.primary_key)
+            ]
+            batch_size = connection.ops.bulk_batch_size(fields, group) or len(group)
+            for start in range(0, len(group), batch_size):
+                model.objects._insert(group[start:start + batch_size], fields, raw=True, on_conflict=OnConflict.IGNORE)
+
+
+# Insert (line number, record) pairs, as read by ndjson.read(). Returns the
+# number of records of each type, and the (post id, author id) pairs of the
+# posts imported or reacted to (see invalidate_caches()). Raises ValueError for
+# a record that cannot be imported (the batches before it stay imported).
+def import_records(records, batch_size=BATCH_SIZE):
+    counts = Counter()
+    touched = set()
+    kind, batch = None, []
+    for number, record in records:
+        if record.get('type') not in TYPES:
+            raise ValueError(f"Line {number}: unknown type {record.get('type')!r}.")
+        if batch and (record['type'] != kind or len(batch) >= batch_size):
+            _insert_batch(kind, batch, touched)
+            batch = []
+        kind = record['type']
+        try:
+            batch.append(_instance(*TYPES[kind], record))
+        except (ValidationError, ValueError, TypeError) as error:
+            raise ValueError(f'Line {number}: {_message(error)}.')
+        counts[kind] += 1
+    if batch:
+        _insert_batch(kind, batch, touched)
+
+    # The ids were given: move the PostgreSQL sequences past them
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model for model, _ in TYPES.values()]):
+            cursor.execute(sql)
+    return counts, touched
+
+
+def _message(error):
+    if not isinstance(error, ValidationError):
+        return str(error)
+    if hasattr(error, 'error_dict'):
+        return '; '.join(f'{field}: {message}' for field, messages in error.message_dict.items() for message in messages)
+    return '; '.join(error.messages)
+
+
+def _insert_batch(kind, batch, touched):
+    insert_rows(TYPES[kind][0], batch)
+    if kind == 'post':
+        touched.update((post.pk, post.user_id) for post in batch)
+    elif kind == 'reaction':
+        touched.update(Post.objects.filter(pk__in={reaction.post_id for reaction in batch}).values_list('pk', 'user_id'))
+
+
+# The inserts bypass the signals that keep the caches current: drop the feed
+# pages, post details and profiles (their statistics) that show the imported
+# rows. After the counters are recomputed, or a reader could cache old ones.
+def invalidate_caches(touched):
+    if not touched:
+        return
+    cache.invalidate_posts(list(touched))
+    for author_id in {author_id for _, author_id in touched}:
+        user_cache.invalidate_profile(author_id)
@@ -0,0 +1,162 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Q, Subquery, Value, When
+from django.db.models.functions import Power
+from django.utils import timezone
+from .models import Post, Reaction, TrendingState
+
+# Trending feed (?sort=trending): posts ranked by a time-decayed score
+#
+# Every event on a post counts for its weight, halved every TRENDING_HALF_LIFE_HOURS:
+#   the post itself   TRENDING_POST_WEIGHT (so new posts get a chance)
+#   a like / dislike  +1 / -1 (Reaction.value)
+#
+#   score(now) = sum of weight * 2 ** ((event time - now) / half life)
+#
+# Decaying every row all the time is not needed: all scores shrink by the same
+# factor, so the order only changes when an event happens. Post.hot_score
+# stores the score measured against a fixed moment, the epoch (TrendingState):
+#
+#   hot_score = sum of weight * 2 ** ((event time - epoch) / half life)
+#
+# A new event just adds its term to one row (the reaction_changed and post_save
+# receivers, see posts/receivers.py), and the feed is an index scan on
+# (-hot_score, -id). As the terms grow with time, `manage.py decay_trending_scores`
+# (run it hourly) moves the epoch to now and scales the stored scores down;
+# scores that decayed to nothing become 0 and are left alone from then on.
+#
+# The rescaling runs in post id ranges, one short transaction each, so reaction
+# toggles never wait long behind it. Meanwhile the posts below
+# TrendingState.rebased_id are measured against the new epoch (rebase_epoch) and
+# the others against the old one; writers pick the right one per row. Until the
+# last range is done the posts not rescaled yet rank a little high (by the decay
+# since the previous rebase), and the epoch the feed and its cursors use
+# (get_epoch()) only moves at the end.
+
+# Scores below this (in likes, at the new epoch) are set to 0 by a rebase
+MIN_SCORE = 1e-4
+_EPOCH_CACHE_KEY = 'posts:trending-epoch'
+
+
+def _half_life():
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600
+
+
+# Sum of value * 2 ** ((at - now) / half life) for (value, at) pairs: the terms
+# measured at `now`, each at most |value|
+def decayed(terms, now):
+    return sum(value * 2 ** ((at - now).total_seconds() / _half_life()) for value, at in terms)
+
+
+# SQL expression for the epoch a post's stored score is measured against: the
+# new one once a running rebase has rescaled it (see rebase())
+def _row_epoch():
+    state = TrendingState.objects.filter(pk=TrendingState.SINGLETON)
+    return Case(
+        When(pk__lt=Subquery(state.values('rebased_id')[:1]), then=Subquery(state.values('rebase_epoch')[:1])),
+        default=Subquery(state.values('epoch')[:1]),
+        output_field=FloatField(),
+    )
+
+
+# SQL expression converting an amount measured at `now` to the stored (epoch)
+# scale of the row being updated. The statement reads the state itself: a writer
+# runs it while holding the post's row lock, and a rebase rewrites a range of
+# rows and its progress in one transaction, so both always agree (see rebase()).
+def to_stored_scale(amount, now):
+    return Value(amount, output_field=FloatField()) * Power(2.0, (Value(now.timestamp()) - _row_epoch()) / Value(float(_half_life())))
+
+
+# Add terms measured at `now` to a post's score
+def add_to_score(post_id, amount, now):
+    if amount:
+        Post.objects.filter(pk=post_id).update(hot_score=F('hot_score') + to_stored_scale(amount, now))
+
+
+# A new post starts with its own weight
+def seed_post(post):
+    now = timezone.now()
+    add_to_score(post.pk, decayed([(settings.TRENDING_POST_WEIGHT, post.created_at)], now), now)
+
+
+# The current epoch (Unix time), cached: it only changes once per rebase
+def get_epoch():
+    epoch = cache.get(_EPOCH_CACHE_KEY)
+    if epoch is None:
+        epoch = TrendingState.objects.get(pk=TrendingState.SINGLETON).epoch
+        cache.set(_EPOCH_CACHE_KEY, epoch, None)
+    return epoch
+
+
+# Convert a score stored against another epoch to the current one
+def rescale(score, from_epoch, to_epoch):
+    return score * 2 ** ((from_epoch - to_epoch) / _half_life())
+
+
+# Move the epoch to now and scale every score to it, batch_size posts with a
+# score per transaction, in id order. Writers that hold a post's lock finish
+# first (the UPDATE waits for them, and they read the old progress); writers that
+# come later wait for the batch and read the new one. An interrupted rebase is
+# continued by the next call. Returns the number of rows rescaled.
+def rebase(batch_size=1000):
+    with transaction.atomic():
+        state = TrendingState.objects.select_for_update().get(pk=TrendingState.SINGLETON)
+        if state.rebase_epoch is None:
+            state.rebase_epoch = time.time()
+            state.rebased_id = 0
+            state.save(update_fields=['rebase_epoch', 'rebased_id'])
+    updated = 0
+    while True:
+        with transaction.atomic():
+            state = TrendingState.objects.select_for_update().get(pk=TrendingState.SINGLETON)
+            factor = rescale(1.0, state.epoch, state.rebase_epoch)
+            # Zero rows are not touched: old, quiet posts cost nothing here
+            remaining = Post.objects.filter(pk__gte=state.rebased_id).exclude(hot_score=0)
+            ids = list(remaining.order_by('pk').values_list('pk', flat=True)[:batch_size + 1])
+            last = len(ids) <= batch_size
+            if not last:
+                remaining = remaining.filter(pk__lt=ids[-1])
+            updated += remaining.update(hot_score=Case(
+                When(Q(hot_score__gt=-MIN_SCORE / factor) & Q(hot_score__lt=MIN_SCORE / factor), then=Value(0.0)),
+                default=F('hot_score') * factor,
+                output_field=FloatField(),
+            ))
+            if last:
+                # Every score is measured against the new epoch now
+                state.epoch, state.rebase_epoch, state.rebased_id = state.rebase_epoch, None, 0
+            else:
+                state.rebased_id = ids[-1]
+            state.save(update_fields=['epoch', 'rebase_epoch', 'rebased_id'])
+        if last:
+            break
+    cache.set(_EPOCH_CACHE_KEY, state.epoch, None)
+    return updated
+
+
+# Recompute the scores of the posts with start <= id < end from their reactions
+# (after bulk imports, or a changed half life / post weight). Returns the number of posts.
+def rebuild(start, end):
+    with transaction.atomic():
+        # Locked, so reactions toggled meanwhile wait and are added on top
+        posts = dict(Post.objects.select_for_update().filter(pk__gte=start, pk__lt=end).values_list('pk', 'created_at'))
+        if not posts:
+            return 0
+        terms = {post_id: [(settings.TRENDING_POST_WEIGHT, created_at)] for post_id, created_at in posts.items()}
+        reactions = Reaction.objects.filter(post_id__in=list(posts)).values_list('post_id', 'value', 'created_at')
+        for post_id, value, created_at in reactions.iterator(chunk_size=5000):
+            terms[post_id].append((value, created_at))
+        # Read after the rows are locked, like the writers do
+        state = TrendingState.objects.get(pk=TrendingState.SINGLETON)
+
+        def row_epoch(post_id):
+            epoch = state.rebase_epoch if post_id < state.rebased_id else state.epoch
+            return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+        Post.objects.bulk_update(
+            [Post(pk=post_id, hot_score=decayed(post_terms, row_epoch(post_id))) for post_id, post_terms in terms.items()],
+            ['hot_score'],
+        )
+    return len(posts)
@@ -1,10 +1,25 @@
 from django.urls import path
-from .views import PostListCreateView, PostDetailView, LikePostView, DislikePostView
+from .views import PostListCreateView, PostDetailView, LikePostView, DislikePostView, TimelineView, PostSearchView, PostChangesView, PostExportView
 
 urlpatterns = [
     # Route for Listing all posts AND Creating a new post
     path('', PostListCreateView.as_view(), name='post-list-create'),
     
+    # Route for the logged-in user's Home Timeline (people they follow)
+    path('timeline/', TimelineView.as_view(), name='post-timeline'),
+
+    # Route to Search posts by description (?q=...)
+    path('search/', PostSearchView.as_view(), name='post-search'),
+
+    # Route for Delta Sync: changes since a token (?since=...)
+    path('changes/', PostChangesView.as_view(), name='post-changes'),
+
+    # Route to Download the logged-in user's own posts (NDJSON)
+    path('export/', PostExportView.as_view(), name='post-export'),
+
+    # The real-time stream of post events (Server-Sent Events) is only routed
+    # under ASGI, see social_network/urls_asgi.py
+
     # Route for Retrieving, Updating, or Deleting a SINGLE post by ID (pk)
     path('<int:pk>/', PostDetailView.as_view(), name='post-detail'),
     
@@ -1,77 +1,257 @@
 # Standard imports
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.shortcuts import get_object_or_404
-from .models import Post
-from .serializers import PostSerializer
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from deletions import jobs as deletion_jobs
+from deletions.models import DeletionJob
+from social_network import etags, ndjson, replicas
+from .models import ArchivedPost, Post, Reaction
+from .serializers import ArchivedPostSerializer, PostSerializer
+from .pagination import FeedPagination, SearchPagination, TimelinePagination
+from .search import search_posts
+from .tasks import schedule_post_processing
+from . import archive, cache, changes, sparse, timeline, transfer
+
+# ?fields= / ?expand= for the post list views (see posts/sparse.py)
+class SparseFieldsMixin:
+    def get_sparse_fields(self):
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = sparse.parse(self.request)
+        return self._sparse_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_sparse_fields()
+        return context
+
+    # Load only the columns the requested fields need
+    def restrict_queryset(self, queryset):
+        return sparse.restrict(queryset, *self.get_sparse_fields())
+
+# The ?user_id= feed filter as an int (None without one), the same value for the
+# query and the cache scope (posts/cache.py): "05" or " 5" must not end up cached
+# under a version nothing bumps. Raises ValidationError (400) for anything else.
+def feed_user_id(query_params):
+    user_id = query_params.get('user_id')
+    if not user_id:
+        return None
+    try:
+        return int(user_id)
+    except ValueError:
+        raise ValidationError({'user_id': 'A user id must be an integer.'})
 
 # View to List all posts and Create a new post
 # Inherits from ListCreateAPIView which handles GET (list) and POST (create)
-class PostListCreateView(generics.ListCreateAPIView):
+class PostListCreateView(replicas.ReplicaReadsMixin, SparseFieldsMixin, generics.ListCreateAPIView):
     serializer_class = PostSerializer
     # Allow reading by anyone, but creation only by authenticated users
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    # Return the feed page by page (?cursor=...&page_size=...) instead of every post
+    pagination_class = FeedPagination
+    # ?user_id=, set by list()
+    user_id_filter = None
 
     # Custom queryset logic
     def get_queryset(self):
-        # Start with all posts, newest first
-        queryset = Post.objects.all().order_by('-created_at')
-        # Check if URL has ?user_id=123
-        user_id = self.request.query_params.get('user_id')
-        if user_id:
+        # Start with all posts, newest first (id breaks ties between equal timestamps);
+        # FeedPagination switches to the trending order for ?sort=trending
+        # with_feed_data() loads the authors in the same query. The page is rendered for an
+        # anonymous viewer so it can be cached; list() overlays the viewer's own reactions.
+        queryset = Post.objects.with_feed_data().order_by('-created_at', '-id')
+        # Check if URL has ?user_id=123 (parsed by list())
+        if self.user_id_filter is not None:
             # Filter posts to show only that user's posts
-            queryset = queryset.filter(user__id=user_id)
-        return queryset
+            queryset = queryset.filter(user__id=self.user_id_filter)
+        return self.restrict_queryset(queryset)
+
+    # Serve feed pages through the read-through cache (see posts/cache.py)
+    # A client that already has this page, as it is now for them, gets a 304
+    def list(self, request, *args, **kwargs):
+        # Reject unknown ?fields= before anything is served from the cache
+        self.get_sparse_fields()
+        self.user_id_filter = feed_user_id(request.query_params)
+        key = cache.feed_cache_key(request, self.user_id_filter)
+        # Users who just wrote skip the shared copy, it may come from a lagging replica
+        data = None if replicas.bypass_cache() else cache.get_cached(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set_cached(key, data)
+            results = cache.overlay_viewer_reactions(data['results'], request.user)
+        else:
+            # A cached page keeps the counters it was rendered with: overlay the live ones
+            results = cache.overlay_live_reactions(data['results'], request.user)
+        # Hash of the final page: a reaction elsewhere leaves it unchanged
+        data = {**data, 'results': results}
+        etag = etags.content_etag(data)
+        if etags.etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
 
     # Custom create logic to attach the current user as the author
     def perform_create(self, serializer):
         # serializer.save() accepts kwargs that override the validated data
-        serializer.save(user=self.request.user)
+        # Atomic: the post and what its receivers write (author stats, change log, ...)
+        with transaction.atomic():
+            post = serializer.save(user=self.request.user)
+        # Timeline fan-out and image resizing happen in the background
+        schedule_post_processing(post)
+
+# View for the logged-in user's Home Timeline (posts of the people they follow)
+class TimelineView(SparseFieldsMixin, generics.ListAPIView):
+    serializer_class = PostSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = TimelinePagination
+
+    def list(self, request, *args, **kwargs):
+        # One range scan over the precomputed timeline (+ celebrity posts, if any)
+        rows = self.paginator.paginate_querysets(timeline.timeline_sources(request.user), request)
+        # Then load the posts of this page by primary key
+        posts = self.restrict_queryset(Post.objects.with_feed_data(request.user)).in_bulk([row.post_id for row in rows])
+        page = [posts[row.post_id] for row in rows if row.post_id in posts]
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
+# View for Delta Sync: what changed since the client's token (see posts/changes.py)
+# GET /api/posts/changes/              -> {'token': N}, the token to start from
+# GET /api/posts/changes/?since=N      -> {'token', 'has_more', 'posts', 'deleted', 'reactions'}
+# Optional ?user_id= limits the changes to one author's posts, like the feed filter.
+class PostChangesView(APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'token': changes.current_token()})
+        if not since.isdigit():
+            return Response({'detail': 'since must be a change token.'}, status=status.HTTP_400_BAD_REQUEST)
+        since = int(since)
+        if changes.is_expired(since):
+            # Too old, the log was pruned: reload the feed and start again
+            return Response({'detail': 'Change token expired, reload the feed.'}, status=status.HTTP_410_GONE)
+
+        user_id = request.query_params.get('user_id')
+        changed, token, has_more = changes.get_changes(since, int(user_id) if user_id and user_id.isdigit() else None)
+        posts = Post.objects.with_feed_data(request.user).filter(pk__in=changed['posts']).order_by('-created_at', '-id')
+        return Response({
+            'token': token,
+            'has_more': has_more,
+            'posts': PostSerializer(posts, many=True, context={'request': request}).data,
+            'deleted': changed['deleted'],
+            'reactions': changes.reaction_counts(changed['reactions']),
+        })
+
+# View to Search post descriptions (?q=words), best matches first
+class PostSearchView(SparseFieldsMixin, generics.ListAPIView):
+    serializer_class = PostSerializer
+    permission_classes = (permissions.AllowAny,)
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '')
+        return self.restrict_queryset(search_posts(query).with_feed_data(self.request.user))
 
 # View to Retrieve, Delete (and optionally Update) a single post
-class PostDetailView(generics.RetrieveDestroyAPIView):
-    queryset = Post.objects.all()
+class PostDetailView(replicas.ReplicaReadsMixin, generics.RetrieveDestroyAPIView):
     serializer_class = PostSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
+    # Load the author together with the post (rendered for an anonymous viewer, see retrieve())
+    def get_queryset(self):
+        return Post.objects.with_feed_data()
+
+    # Serve the post through the read-through cache and overlay the viewer's reaction
+    # The full post is cached; ?fields= / ?expand= are applied to it (posts/sparse.py)
+    def retrieve(self, request, *args, **kwargs):
+        fields, expand = sparse.parse(request)
+        key = cache.detail_cache_key(kwargs['pk'])
+        data = None if replicas.bypass_cache() else cache.get_cached(key)
+        if data is None:
+            try:
+                data = super().retrieve(request, *args, **kwargs).data
+            except Http404:
+                data = None
+            else:
+                cache.set_cached(key, data)
+        if data is not None:
+            data = cache.overlay_viewer_reactions([sparse.trim(data, fields, expand)], request.user)[0]
+        else:
+            # Not a live post: maybe an archived one (posts/archive.py). Rarely read,
+            # so not cached, and the viewer's reaction is part of the row.
+            post = archive.get_post(kwargs['pk'])
+            if post is None:
+                raise Http404
+            data = sparse.trim(ArchivedPostSerializer(post, context=self.get_serializer_context()).data, fields, expand)
+        # 304 if the client's copy is still current (saves the transfer, not the lookup)
+        etag = etags.content_etag(data)
+        if etags.etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
+
     # Custom delete logic to enforce ownership
     def delete(self, request, *args, **kwargs):
-        post = self.get_object() # Find the post by ID
+        try:
+            post = self.get_object() # Find the post by ID
+        except Http404:
+            return self.delete_archived(request, kwargs['pk'])
         # Check: Is the person trying to delete the same as the author?
-        if post.user != request.user:
+        if post.user_id != request.user.pk:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        # If yes, delete it in batches, media files included (deletions/jobs.py).
+        # Usually done by now (only the files are left for the background);
+        # a post with many reactions or followers' timeline copies is still being deleted: 202.
+        job = deletion_jobs.delete_post(post)
+        if job.phase in (DeletionJob.FILES, DeletionJob.DONE):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({'job': job.pk, 'phase': job.phase}, status=status.HTTP_202_ACCEPTED)
+
+    # Archived posts (posts/archive.py) can be deleted by their author too
+    def delete_archived(self, request, pk):
+        post = archive.get_post(pk)
+        if post is None:
+            raise Http404
+        if post.user_id != request.user.pk:
             return Response(status=status.HTTP_403_FORBIDDEN)
-        # If yes, delete it
-        return super().delete(request, *args, **kwargs)
+        deletion_jobs.delete_archived_post(post)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-# Custom View for Liking a Post
-class LikePostView(APIView):
+# View to download all of the logged-in user's posts (archived ones included)
+# as NDJSON, one post per line (the format of `manage.py export_ndjson`, see posts/transfer.py). Streamed
+# from a database cursor, so a large account costs no memory.
+class PostExportView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
-    def post(self, request, pk):
-        post = get_object_or_404(Post, pk=pk)
-        # If already liked, unlike it (Toggle)
-        if post.likes.filter(id=request.user.id).exists():
-            post.likes.remove(request.user)
-        else:
-            # Add like
-            post.likes.add(request.user)
-            # Remove dislike if it exists (Cannot like and dislike same time)
-            post.dislikes.remove(request.user) 
-        return Response(status=status.HTTP_200_OK)
-
-# Custom View for Disliking a Post
-class DislikePostView(APIView):
+    def get(self, request):
+        records = transfer.export_records('post', Post.objects.filter(user=request.user.pk), ArchivedPost.objects.filter(user=request.user.pk))
+        # Under ASGI the chunks must come from an async iterator (social_network/ndjson.py)
+        chunks = ndjson.astream(records) if isinstance(request._request, ASGIRequest) else ndjson.stream(records)
+        response = StreamingHttpResponse(chunks, content_type=ndjson.CONTENT_TYPE)
+        response['Content-Disposition'] = 'attachment; filename="posts.ndjson"'
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+# Shared logic for the Like / Dislike endpoints
+# Responds with the post's new counters and the user's reaction state, so the
+# client can update the card in place instead of refetching the whole feed.
+class ReactionView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
+    # Reaction.LIKE or Reaction.DISLIKE, set by the subclasses
+    value = None
 
     def post(self, request, pk):
-        post = get_object_or_404(Post, pk=pk)
-        # If already disliked, undislike it (Toggle)
-        if post.dislikes.filter(id=request.user.id).exists():
-            post.dislikes.remove(request.user)
-        else:
-            # Add dislike
-            post.dislikes.add(request.user)
-            # Remove like if it exists
-            post.likes.remove(request.user) 
-        return Response(status=status.HTTP_200_OK)
+        try:
+            result = Reaction.objects.toggle(request.user, pk, self.value)
+        except Post.DoesNotExist:
+            raise Http404
+        return Response(result, status=status.HTTP_200_OK)
+
+# Custom View for Liking a Post (liking again removes the like)
+class LikePostView(ReactionView):
+    value = Reaction.LIKE
+
+# Custom View for Disliking a Post (disliking again removes the dislike)
+class DislikePostView(ReactionView):
+    value = Reaction.DISLIKE
@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The feed, post detail and profile reads are served by async views here
+(ROOT_URLCONF=social_network.urls_asgi).
+
+Run it with an ASGI server (e.g. ``uvicorn social_network.asgi:application``) to
+serve the real-time event stream (/api/posts/events/, posts/streams.py): each
+open stream is then a cheap coroutine instead of a blocked worker thread.
 """
 
 import os
@@ -12,5 +19,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_network.settings')
+os.environ.setdefault('ROOT_URLCONF', 'social_network.urls_asgi')
 
 application = get_asgi_application()
@@ -0,0 +1,123 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections, connections
+from django.http import HttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from users import cache as user_cache
+from users.authentication import check_user
+from .renderers import FastJSONRenderer
+
+# Helpers for the async (ASGI-native) read views, see social_network/urls_asgi.py
+#
+# DRF views are synchronous, so these views are plain Django async views that
+# produce the same JSON as their DRF counterparts.
+
+
+class AuthenticationError(Exception):
+    def __init__(self, detail, code):
+        self.detail = detail
+        self.code = code
+
+
+# Same rules as users.authentication.CachedJWTAuthentication, with the user
+# loaded through the async cache/ORM. Returns AnonymousUser when no token is sent.
+async def authenticate(request):
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return AnonymousUser()
+    try:
+        # Signature and expiry checks only, no I/O
+        token = authentication.get_validated_token(raw_token)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except InvalidToken as error:
+        raise AuthenticationError(error.detail['detail'], 'token_not_valid')
+    except KeyError:
+        raise AuthenticationError('Token contained no recognizable user identification', 'token_not_valid')
+
+    user = await user_cache.aget_user(user_id)
+    if user is None:
+        user = await get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+        if user is None:
+            raise AuthenticationError('User not found', 'user_not_found')
+        await user_cache.aset_user(user)
+    try:
+        check_user(user, token)
+    except AuthenticationFailed as error:
+        raise AuthenticationError(error.detail, error.detail.code)
+    return user
+
+
+# JSON response rendered exactly like DRF's Response
+def render(data, status=200, headers=None):
+    content = FastJSONRenderer().render(data) if data is not None else b''
+    return HttpResponse(content, status=status, headers=headers, content_type='application/json')
+
+
+def error_response(detail, status, code=None):
+    data = {'detail': detail}
+    if code:
+        data['code'] = code
+    return render(data, status=status)
+
+
+# 401 like DRF's (with the header telling the client to send a Bearer token)
+def unauthorized(detail, code=None):
+    response = error_response(detail, 401, code)
+    response['WWW-Authenticate'] = 'Bearer realm="api"'
+    return response
+
+
+# (user, None), or (None, 401 response) for a bad token
+async def get_user_or_error(request):
+    try:
+        return await authenticate(request), None
+    except AuthenticationError as error:
+        return None, unauthorized(error.detail, error.code)
+
+
+def _in_worker_thread(func):
+    def run():
+        try:
+            return func()
+        finally:
+            # The thread keeps its connection between calls; drop it when it is
+            # broken or past CONN_MAX_AGE, like Django does at the end of a request
+            close_old_connections()
+    return run
+
+
+# Whether gather_queries() runs the queries in parallel: ASYNC_PARALLEL_QUERIES,
+# and only when every database keeps its connections open between queries
+# (CONN_MAX_AGE > 0 or None) or uses a connection pool (OPTIONS['pool']).
+# Otherwise each query would open and close a connection of its own, and the
+# handshakes would cost more than running the queries one after the other.
+def parallel_queries():
+    if not settings.ASYNC_PARALLEL_QUERIES:
+        return False
+    for alias in connections:
+        database = connections[alias].settings_dict
+        if database.get('CONN_MAX_AGE') == 0 and not database.get('OPTIONS', {}).get('pool'):
+            return False
+    return True
+
+
+# Run independent queries concurrently and return their results in order.
+# Each argument is a function running one (sync) query, e.g. lambda: list(queryset).
+#
+# Django's async ORM runs every query on one shared thread, so awaiting several
+# of them with asyncio.gather() still runs them one after the other. Here each
+# query gets its own worker thread and database connection, so the database
+# works on them at the same time. Without parallel_queries() (e.g. in the tests,
+# where everything must see the test's open transaction, or without persistent
+# connections) they run one by one on the shared thread instead.
+async def gather_queries(*funcs):
+    if not parallel_queries():
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(*(sync_to_async(_in_worker_thread(func), thread_sensitive=False)() for func in funcs))
@@ -0,0 +1,41 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Small in-process background worker pool
+# Used for work that must not slow down the request (e.g. timeline fan-out).
+# Tasks are scheduled after the current transaction commits, so they always see
+# the rows the request created. Set BACKGROUND_TASKS_EAGER = True to run them
+# inline instead (useful in tests and management commands).
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix='background')
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(func, '__name__', func))
+    finally:
+        # Worker threads open their own DB connections; don't leak them
+        connections.close_all()
+
+
+# Run func(*args, **kwargs) in the background once the current transaction commits
+def run_in_background(func, *args, **kwargs):
+    def submit():
+        if settings.BACKGROUND_TASKS_EAGER:
+            func(*args, **kwargs)
+        else:
+            _get_executor().submit(_run, func, args, kwargs)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,18 @@
+from django.middleware.gzip import GZipMiddleware
+
+
+# Response compression (gzip, for clients that accept it)
+#
+# Feed pages are repetitive JSON and shrink several times over. Left alone:
+# - event streams: compressing them would make proxies and browsers buffer the
+#   events instead of delivering each one as it comes,
+# - images, audio and video: already compressed,
+# - partial content (206): the byte range refers to the uncompressed file.
+UNCOMPRESSED_TYPES = ('text/event-stream', 'image/', 'audio/', 'video/')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if response.status_code == 206 or response.get('Content-Type', '').startswith(UNCOMPRESSED_TYPES):
+            return response
+        return super().process_response(request, response)
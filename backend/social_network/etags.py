@@ -0,0 +1,24 @@
+import hashlib
+import json
+from django.utils.http import parse_etags
+
+# Conditional GET helpers (ETag / If-None-Match -> 304), shared by the apps
+
+
+# ETag from any value that identifies a version of the response (a cache key, a version number)
+def version_etag(*parts):
+    return 'W/"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+# ETag of a response without a version number: a hash of its final content
+def content_etag(data):
+    return version_etag(json.dumps(data, sort_keys=True, default=str))
+
+
+# Weak comparison, as used for GET requests
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return '*' in tags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in tags}
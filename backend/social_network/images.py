@@ -0,0 +1,203 @@
+import io
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Image renditions for uploads (Post.image, User.profile_picture)
+#
+# The request only stores the original file. A background task then reads it,
+# renders resized WebP + JPEG copies and a blurhash placeholder in a separate
+# process (Pillow work is CPU bound and would block other threads on the GIL),
+# saves them next to the original and records them in the model's
+# <field>_renditions JSON field:
+#
+#     {'blurhash': 'LEHV6nWB2y...', 'thumbnail': {'webp': '...', 'jpeg': '...'}, 'medium': {...}}
+
+_process_pool = None
+
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        # 'spawn' so the workers don't inherit the threads/DB connections of the web process
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _process_pool
+
+
+# ---- Runs inside the worker process: pure image work, no Django/database access ----
+
+def render_image(data, sizes, quality):
+    image = Image.open(io.BytesIO(data))
+    # Respect the camera orientation, then drop alpha/palette for JPEG
+    image = ImageOps.exif_transpose(image).convert('RGB')
+
+    result = {'blurhash': blurhash(image), 'renditions': {}}
+    for name, max_side in sizes.items():
+        resized = image.copy()
+        # Only ever shrink
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+        formats = {'jpeg': ('JPEG', {'progressive': True, 'optimize': True})}
+        if features.check('webp'):
+            formats['webp'] = ('WEBP', {'method': 4})
+        result['renditions'][name] = {}
+        for extension, (image_format, options) in formats.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, quality=quality, **options)
+            result['renditions'][name][extension] = buffer.getvalue()
+    return result
+
+
+_BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+
+def _encode83(value, length):
+    return ''.join(_BASE83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _srgb_to_linear(value):
+    value = value / 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+# Blurhash (https://blurha.sh): a ~30 character string clients decode into a blurry
+# placeholder while the real image loads. Computed on a 32px copy, which is plenty.
+def blurhash(image, x_components=4, y_components=3):
+    small = image.copy()
+    small.thumbnail((32, 32))
+    width, height = small.size
+    pixels = [tuple(_srgb_to_linear(channel) for channel in pixel) for pixel in small.getdata()]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            red = green = blue = 0.0
+            for y in range(height):
+                cos_y = math.cos(math.pi * j * y / height)
+                for x in range(width):
+                    basis = normalisation * math.cos(math.pi * i * x / width) * cos_y
+                    pixel = pixels[y * width + x]
+                    red += basis * pixel[0]
+                    green += basis * pixel[1]
+                    blue += basis * pixel[2]
+            scale = 1 / (width * height)
+            factors.append((red * scale, green * scale, blue * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(channel) for factor in ac for channel in factor)
+        quantised_max = max(0, min(82, int(math.floor(actual_max * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max, maximum = 0, 1
+    result += _encode83(quantised_max, 1)
+
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (max(0, min(18, int(math.floor(_sign_pow(channel / maximum, 0.5) * 9 + 9.5)))) for channel in factor)
+        result += _encode83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+# ---- Runs in the web process (background thread) ----
+
+# Generate the renditions for instance.<field_name> and store them in <field_name>_renditions.
+# model_label is e.g. 'posts.Post'; called through social_network.background.run_in_background.
+def generate_renditions(model_label, pk, field_name):
+    model = apps.get_model(model_label)
+    renditions_field = f'{field_name}_renditions'
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    original = getattr(instance, field_name)
+    if not original:
+        # Cleared: the renditions of the previous picture go too
+        old = getattr(instance, renditions_field)
+        if old:
+            setattr(instance, renditions_field, {})
+            instance.save(update_fields=[renditions_field])
+            delete_renditions(original.storage, old)
+        return
+
+    with original.open('rb') as source:
+        data = source.read()
+    sizes = settings.IMAGE_RENDITION_SIZES
+    quality = settings.IMAGE_RENDITION_QUALITY
+    if settings.BACKGROUND_TASKS_EAGER:
+        rendered = render_image(data, sizes, quality)
+    else:
+        rendered = _get_process_pool().submit(render_image, data, sizes, quality).result()
+
+    # Save the files next to the original: post_images/renditions/<name>_<size>.<ext>
+    storage = original.storage
+    directory, filename = os.path.split(original.name)
+    stem = os.path.splitext(filename)[0]
+    renditions = {'blurhash': rendered['blurhash']}
+    for size, files in rendered['renditions'].items():
+        renditions[size] = {
+            extension: storage.save(f'{directory}/renditions/{stem}_{size}.{extension}', ContentFile(content))
+            for extension, content in files.items()
+        }
+
+    # The picture may have been replaced while we were working
+    instance.refresh_from_db(fields=[field_name, renditions_field])
+    if getattr(instance, field_name).name != original.name:
+        delete_renditions(storage, renditions)
+        return
+    old = getattr(instance, renditions_field)
+    setattr(instance, renditions_field, renditions)
+    # save() (not update()) so post_save receivers refresh the caches
+    instance.save(update_fields=[renditions_field])
+    delete_renditions(storage, old)
+
+
+def delete_renditions(storage, renditions):
+    for name in rendition_names(renditions):
+        storage.delete(name)
+
+
+# Names of the stored files of a renditions dict
+def rendition_names(renditions):
+    for key, files in (renditions or {}).items():
+        if key == 'blurhash':
+            continue
+        yield from files.values()
+
+
+# Absolute URLs for a renditions dict, as exposed by the serializers
+def rendition_urls(renditions, storage, request=None):
+    if not renditions:
+        return None
+    result = {'blurhash': renditions.get('blurhash')}
+    for key, files in renditions.items():
+        if key == 'blurhash':
+            continue
+        result[key] = {}
+        for extension, name in files.items():
+            url = storage.url(name)
+            result[key][extension] = request.build_absolute_uri(url) if request else url
+    return result
@@ -0,0 +1,142 @@
+import mimetypes
+import os
+import posixpath
+import re
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from .storage import BLOB_PREFIX, is_hashed_name
+
+# Media files (MEDIA_URL), served with caching headers
+#
+# - Only the public folders are served: post images and profile pictures
+#   (MEDIA_HASHED_PREFIXES) and blobs (BLOB_PREFIX). Upload chunks (uploads/)
+#   and the temporary files of incoming blobs stay private.
+# - Content-hashed files (social_network/storage.py) never change, so they are
+#   sent with "Cache-Control: public, max-age=<a year>, immutable"; others get
+#   MEDIA_MAX_AGE and are revalidated.
+# - ETag / Last-Modified, and If-None-Match / If-Modified-Since answered with 304.
+# - Single byte ranges (Range: bytes=a-b, If-Range) answered with 206, so
+#   clients can resume and seek.
+# - With MEDIA_ACCEL set, Django only checks the request and writes the headers;
+#   the front proxy sends the bytes (and handles ranges itself):
+#     'nginx':  X-Accel-Redirect: MEDIA_ACCEL_PREFIX + <name>
+#               (an `internal` location aliased to MEDIA_ROOT)
+#     'apache': X-Sendfile: <absolute path> (mod_xsendfile)
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_BLOCK_SIZE = 64 * 1024
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            block = source.read(min(_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+# The (start, end) byte positions (inclusive) asked for, None to send the whole
+# file, or 'unsatisfiable'. Several ranges in one header are answered with the whole file.
+def _parse_range(header, size):
+    match = _RANGE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return 'unsatisfiable'
+    return start, end
+
+
+# Does If-Range (an ETag or a date) still match the file? If not, the whole file is sent.
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and date >= last_modified
+
+
+def serve(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    # Normalised first, so "post_images/../uploads/..." does not get through
+    if not posixpath.normpath(path).startswith((*settings.MEDIA_HASHED_PREFIXES, BLOB_PREFIX)):
+        raise Http404
+    try:
+        full_path = default_storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    if is_hashed_name(path):
+        # The name is the content hash
+        etag = quote_etag(os.path.splitext(os.path.basename(path))[0])
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        etag = quote_etag(f'{last_modified:x}-{size:x}')
+        cache_control = f'public, max-age={settings.MEDIA_MAX_AGE}'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL:
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if settings.MEDIA_ACCEL == 'nginx':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + path
+        else:
+            response['X-Sendfile'] = full_path
+        return response
+
+    byte_range = None
+    if 'Range' in request.headers and _if_range_matches(request, etag, last_modified):
+        byte_range = _parse_range(request.headers['Range'], size)
+    if byte_range == 'unsatisfiable':
+        return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    if byte_range is None:
+        if request.method == 'HEAD':
+            return HttpResponse(content_type=content_type, headers={**headers, 'Content-Length': str(size)})
+        # FileResponse lets the server use sendfile() where it can
+        return FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers.update({'Content-Range': f'bytes {start}-{end}/{size}', 'Content-Length': str(length)})
+    if request.method == 'HEAD':
+        return HttpResponse(status=206, content_type=content_type, headers=headers)
+    return StreamingHttpResponse(_read_range(full_path, start, length), status=206, content_type=content_type, headers=headers)
@@ -0,0 +1,294 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Per-request SQL and timing instrumentation
+#
+# RequestMetricsMiddleware measures, for every request:
+#   queries        number of SQL queries
+#   db_ms          time spent in those queries (summed, so concurrent queries
+#                  of the async views can add up to more than the wall time)
+#   serializer_ms  time spent turning objects into JSON-ready data (includes
+#                  any query a serializer triggers, e.g. an N+1 on a relation)
+#   total_ms       time until the response was returned
+#
+# and reports them per resolved URL name:
+#   - as a Server-Timing header (shown in the browser dev tools),
+#   - as one JSON log line on the `social_network.metrics` logger (INFO, or
+#     WARNING when the request is over one of its REQUEST_BUDGETS),
+#   - in per-endpoint histograms kept in the cache, so every worker adds to the
+#     same numbers (GET /api/metrics/, admins only).
+
+# Histogram bucket upper bounds; one more bucket catches everything above the last
+TIME_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+METRICS = {
+    'queries': QUERY_BUCKETS,
+    'db_ms': TIME_BUCKETS_MS,
+    'serializer_ms': TIME_BUCKETS_MS,
+    'total_ms': TIME_BUCKETS_MS,
+}
+
+_ENDPOINTS_KEY = 'metrics:endpoints'
+
+# Metrics of the request being handled. Context variables follow the request
+# into sync_to_async() threads, so queries run there are counted as well.
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+# Histogram counts not yet added to the cache, per endpoint
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        # True while a top-level serializer runs (nested ones are part of its time)
+        self.serializing = False
+        self.lock = threading.Lock()
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        with metrics.lock:
+            metrics.queries += 1
+            metrics.db_time += elapsed
+
+
+def _install(sender=None, connection=None, **kwargs):
+    # First in the list: execute_wrapper() context managers pop the last wrapper on exit
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+# Every new connection (request threads, sync_to_async() threads, ...) gets the query hook
+connection_created.connect(_install)
+
+
+# Mixed into serializers to measure serializer_ms
+class TimedSerializerMixin:
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+            metrics.serializing = False
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = _start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        batch = _finish(request, response, metrics)
+        if batch:
+            _flush(batch)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token = _start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        batch = _finish(request, response, metrics)
+        if batch:
+            await sync_to_async(_flush)(batch)
+        return response
+
+
+def _start():
+    # Connections opened before this module was loaded didn't get the hook yet
+    for connection in connections.all(initialized_only=True):
+        _install(connection=connection)
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def _budget(endpoint):
+    budgets = settings.REQUEST_BUDGETS
+    return {**budgets.get('default', {}), **budgets.get(endpoint, {})}
+
+
+# Report the finished request. Returns the histogram counts to add to the cache, if due.
+def _finish(request, response, metrics):
+    match = getattr(request, 'resolver_match', None)
+    endpoint = match.view_name if match else 'unresolved'
+    values = {
+        'queries': metrics.queries,
+        'db_ms': round(metrics.db_time * 1000, 3),
+        'serializer_ms': round(metrics.serializer_time * 1000, 3),
+        'total_ms': round((time.perf_counter() - metrics.started) * 1000, 3),
+    }
+    over_budget = sorted(name for name, limit in _budget(endpoint).items() if values[name] > limit)
+
+    if settings.REQUEST_METRICS_SERVER_TIMING:
+        response['Server-Timing'] = (
+            f'db;dur={values["db_ms"]};desc="{values["queries"]} queries", '
+            f'serializer;dur={values["serializer_ms"]}, '
+            f'total;dur={values["total_ms"]}'
+        )
+
+    line = {
+        'endpoint': endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        **values,
+        'over_budget': over_budget,
+    }
+    logger.log(logging.WARNING if over_budget else logging.INFO, json.dumps(line), extra={'metrics': line})
+    return _add_to_histograms(endpoint, values)
+
+
+def _empty_histogram():
+    histogram = {'count': 0}
+    for name, bounds in METRICS.items():
+        histogram[name] = [0] * (len(bounds) + 1)
+        histogram[f'{name}_sum'] = 0.0
+    return histogram
+
+
+def _add_to_histograms(endpoint, values):
+    global _pending, _last_flush
+    with _pending_lock:
+        histogram = _pending.setdefault(endpoint, _empty_histogram())
+        histogram['count'] += 1
+        for name, bounds in METRICS.items():
+            histogram[name][bisect_left(bounds, values[name])] += 1
+            histogram[f'{name}_sum'] += values[name]
+        if time.monotonic() - _last_flush < settings.REQUEST_METRICS_FLUSH_INTERVAL:
+            return None
+        batch, _pending, _last_flush = _pending, {}, time.monotonic()
+    return batch
+
+
+def _histogram_key(endpoint, field):
+    return f'metrics:{endpoint}:{field}'
+
+
+# Every cache key of one endpoint's histograms
+def _histogram_keys(endpoint):
+    keys = [_histogram_key(endpoint, 'count')]
+    for name, bounds in METRICS.items():
+        keys += [_histogram_key(endpoint, f'{name}:{index}') for index in range(len(bounds) + 1)]
+        keys.append(_histogram_key(endpoint, f'{name}:sum'))
+    return keys
+
+
+def _incr(key, delta):
+    if not cache.add(key, delta, None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, None)
+
+
+# Add locally collected counts to the shared histograms in the cache. Counters
+# only, so workers flushing at the same time don't overwrite each other.
+def _flush(batch):
+    try:
+        endpoints = cache.get(_ENDPOINTS_KEY) or set()
+        if not set(batch) <= endpoints:
+            cache.set(_ENDPOINTS_KEY, endpoints | set(batch), None)
+        for endpoint, histogram in batch.items():
+            _incr(_histogram_key(endpoint, 'count'), histogram['count'])
+            for name in METRICS:
+                for index, count in enumerate(histogram[name]):
+                    if count:
+                        _incr(_histogram_key(endpoint, f'{name}:{index}'), count)
+                # Sums kept in thousandths: cache counters are integers
+                _incr(_histogram_key(endpoint, f'{name}:sum'), round(histogram[f'{name}_sum'] * 1000))
+    except Exception:
+        logger.exception('Could not store request metrics')
+
+
+def _estimate_percentile(bounds, counts, fraction):
+    target = fraction * sum(counts)
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if count and seen >= target:
+            # Upper bound of the bucket (None: above the last bound)
+            return bounds[index] if index < len(bounds) else None
+    return None
+
+
+# Per-endpoint histograms of every worker, e.g.
+# {'post-list-create': {'count': 120, 'total_ms': {'mean': .., 'p50': .., 'p95': .., 'p99': .., 'buckets': [...]}, ...}}
+# Percentiles are the upper bound of the bucket they fall in.
+def get_histograms():
+    global _pending, _last_flush
+    # Include what this worker hasn't flushed yet
+    with _pending_lock:
+        batch, _pending, _last_flush = _pending, {}, time.monotonic()
+    if batch:
+        _flush(batch)
+
+    result = {}
+    for endpoint in sorted(cache.get(_ENDPOINTS_KEY) or ()):
+        stored = cache.get_many(_histogram_keys(endpoint))
+        count = stored.get(_histogram_key(endpoint, 'count'), 0)
+        if not count:
+            continue
+        stats = {'count': count}
+        for name, bounds in METRICS.items():
+            counts = [stored.get(_histogram_key(endpoint, f'{name}:{index}'), 0) for index in range(len(bounds) + 1)]
+            stats[name] = {
+                'mean': round(stored.get(_histogram_key(endpoint, f'{name}:sum'), 0) / 1000 / count, 3),
+                'p50': _estimate_percentile(bounds, counts, 0.50),
+                'p95': _estimate_percentile(bounds, counts, 0.95),
+                'p99': _estimate_percentile(bounds, counts, 0.99),
+                'buckets': [{'le': bound, 'count': counts[index]} for index, bound in enumerate(bounds)]
+                + [{'le': None, 'count': counts[-1]}],
+            }
+        result[endpoint] = stats
+    return result
+
+
+def reset_histograms():
+    global _pending
+    with _pending_lock:
+        _pending = {}
+    keys = [_ENDPOINTS_KEY]
+    for endpoint in cache.get(_ENDPOINTS_KEY) or ():
+        keys += _histogram_keys(endpoint)
+    cache.delete_many(keys)
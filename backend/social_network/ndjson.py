@@ -0,0 +1,76 @@
+import datetime
+import json
+from asgiref.sync import sync_to_async
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Newline-delimited JSON (NDJSON): one JSON object per line
+#
+# Used for exports and imports (posts/transfer.py): a file of any size can be
+# written and read a line at a time, so neither side holds it in memory.
+# Dates and times keep their microseconds (the API rounds them to milliseconds),
+# so exported rows are imported unchanged.
+
+CONTENT_TYPE = 'application/x-ndjson'
+# Lines are sent in chunks of about this many bytes
+CHUNK_SIZE = 64 * 1024
+
+_encoder = JSONEncoder()
+
+
+def _default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    # Decimals, UUIDs, lazy strings, ...
+    return _encoder.default(value)
+
+
+# One record as a line of bytes (with its newline)
+def encode(record):
+    if orjson is not None:
+        return orjson.dumps(record, default=_default, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, default=_default, ensure_ascii=False, separators=(',', ':')) + '\n').encode()
+
+
+# The records as chunks of lines, for a StreamingHttpResponse or a file
+def stream(records, chunk_size=CHUNK_SIZE):
+    lines, size = [], 0
+    for record in records:
+        line = encode(record)
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield b''.join(lines)
+
+
+# The same chunks as an async iterator, for a StreamingHttpResponse served
+# through ASGI: Django reads a sync iterator there whole, into memory, before
+# sending it. Each chunk is built on the thread the sync views run on
+# (thread_sensitive), where the records' database cursor lives.
+async def astream(records, chunk_size=CHUNK_SIZE):
+    chunks = stream(records, chunk_size)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+# (line number, record) for each non-blank line of a text or binary file.
+# Raises ValueError for a line that is not a JSON object.
+def read(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise ValueError(f'Line {number}: invalid JSON ({error}).')
+        if not isinstance(record, dict):
+            raise ValueError(f'Line {number}: expected a JSON object.')
+        yield number, record
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Publish/subscribe for server-sent events
+#
+# Web code publishes JSON events from ordinary (sync) code with publish(); the
+# streaming views (running on the ASGI event loop) read them from a subscription:
+#
+#     subscription = get_broker().subscribe()
+#     try:
+#         message = await subscription.get(timeout=15)   # JSON string, or None on timeout
+#     finally:
+#         await subscription.close()
+#
+# EVENTS_BACKEND picks the broker: InProcessBroker only reaches subscribers of the
+# same process (tests, single node), RedisBroker goes through a Redis channel so
+# every node sees every event.
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.EVENTS_BACKEND)()
+    return _broker
+
+
+def publish(event):
+    try:
+        get_broker().publish(json.dumps(event))
+    except Exception:
+        # Real-time updates are best effort; never fail the request because of them
+        logger.exception('Could not publish event %s', event.get('type'))
+
+
+# ---- In-process broker ----
+
+class InProcessSubscription:
+    def __init__(self, broker, max_pending):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    # Called on the subscriber's event loop
+    def put(self, message):
+        if self.queue.full():
+            # Slow client: drop its oldest event rather than grow without bound
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    # Must be called from a running event loop
+    def subscribe(self):
+        subscription = InProcessSubscription(self, settings.EVENTS_MAX_PENDING)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    # Safe to call from any thread
+    def publish(self, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # Its loop is closed; the subscription is dead
+                self.unsubscribe(subscription)
+
+
+# ---- Redis broker (needs the `redis` package, already required by the Redis cache) ----
+
+class RedisSubscription:
+    def __init__(self, client, channel):
+        self.client = client
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.channel = channel
+        self.subscribed = False
+
+    async def get(self, timeout=None):
+        if not self.subscribed:
+            await self.pubsub.subscribe(self.channel)
+            self.subscribed = True
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        data = message['data']
+        return data.decode('utf-8') if isinstance(data, bytes) else data
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+class RedisBroker:
+    def __init__(self):
+        import redis
+
+        self.url = settings.EVENTS_REDIS_URL
+        self.channel = settings.EVENTS_REDIS_CHANNEL
+        self.client = redis.Redis.from_url(self.url)
+
+    def subscribe(self):
+        import redis.asyncio
+
+        # One connection per stream; Redis fans the messages out to all of them
+        return RedisSubscription(redis.asyncio.Redis.from_url(self.url), self.channel)
+
+    def publish(self, message):
+        self.client.publish(self.channel, message)
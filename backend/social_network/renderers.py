@@ -0,0 +1,30 @@
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON renderer for the API
+#
+# Renders with orjson when it is installed (several times faster than the
+# standard library encoder on feed pages) and FAST_JSON_RENDERER is on, and
+# falls back to DRF's JSONRenderer otherwise. The output is the same: compact,
+# UTF-8, and values orjson doesn't know (dates, decimals, lazy strings) are
+# converted by DRF's encoder.
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not settings.FAST_JSON_RENDERER:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+        content = orjson.dumps(data, default=self.encoder_class().default, option=option)
+        # Like DRF: escape the two characters that are valid JSON but not valid JavaScript
+        return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,146 @@
+import contextvars
+import random
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# Read replicas with read-your-writes
+#
+# Writes always go to the primary ('default'). The read-only requests of the
+# feed, post detail and profile views (ReplicaReadsMixin, and the async views)
+# read from one of DATABASE_REPLICAS, picked per request, everything else reads
+# from the primary as before.
+#
+# Replicas lag behind. So that users always see their own changes:
+#   - a request that wrote anything reads from the primary from then on,
+#   - a user whose request wrote (a post, a reaction, a profile update, ...) is
+#     pinned to the primary for REPLICA_PIN_SECONDS (a cache key, shared by all
+#     workers) and bypasses the shared response caches meanwhile, which other
+#     users may have just filled from a lagging replica,
+#   - responses built from a replica are cached for REPLICA_PIN_SECONDS at most
+#     (posts/cache.py), so they don't outlive the lag.
+#
+# Without DATABASE_REPLICAS nothing changes.
+
+# Routing state of the request being handled (set by ReplicaMiddleware). Context
+# variables follow the request into sync_to_async() threads.
+_current = contextvars.ContextVar('replica_routing', default=None)
+
+
+class RequestRouting:
+    def __init__(self):
+        # Alias of the replica this request reads from, if any
+        self.replica = None
+        # The user wrote recently: primary only, no shared caches
+        self.pinned = False
+        # This request wrote something
+        self.wrote = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        if routing is None or routing.wrote:
+            return None
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is None:
+            # Outside requests (migrations, commands, background tasks): Django's default choice
+            return None
+        routing.wrote = True
+        # Explicitly: instances read from a replica are saved to the primary too
+        return DEFAULT_DB_ALIAS
+
+    # The replicas hold the same rows as the primary
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def _pin_key(user_id):
+    return f'replicas:pinned:{user_id}'
+
+
+# Keep the user's reads on the primary for REPLICA_PIN_SECONDS
+def pin(user):
+    cache.set(_pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(cache.get(_pin_key(user.pk)))
+
+
+# Let the current (read-only) request read from a replica, unless the user wrote recently
+def read_from_replica(request, user):
+    routing = _current.get()
+    if routing is None or not settings.DATABASE_REPLICAS or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return
+    if is_pinned(user):
+        routing.pinned = True
+    else:
+        routing.replica = random.choice(settings.DATABASE_REPLICAS)
+
+
+# Are the current request's reads served by a replica?
+def using_replica():
+    routing = _current.get()
+    return routing is not None and routing.replica is not None and not routing.wrote
+
+
+# Should the current request skip the shared response caches (its user wrote recently)?
+def bypass_cache():
+    routing = _current.get()
+    return routing is not None and routing.pinned
+
+
+# For the DRF read views: decided after authentication, so the user is known
+# (and was itself loaded from the primary or the user cache)
+class ReplicaReadsMixin:
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        read_from_replica(request, request.user)
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting()
+        token = _current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if _should_pin(request, routing):
+            pin(request.user)
+        return response
+
+    async def __acall__(self, request):
+        routing = RequestRouting()
+        token = _current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        if _should_pin(request, routing):
+            await sync_to_async(pin)(request.user)
+        return response
+
+
+def _should_pin(request, routing):
+    # request.user is the one DRF authenticated (it sets it on the Django request too)
+    user = getattr(request, 'user', None)
+    return routing.wrote and bool(settings.DATABASE_REPLICAS) and user is not None and user.is_authenticated
@@ -47,9 +47,18 @@ INSTALLED_APPS = [
     'corsheaders',
     'users',
     'posts',
+    'uploads',
+    'deletions',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the whole chain (social_network/metrics.py)
+    'social_network.metrics.RequestMetricsMiddleware',
+    # gzip for clients that accept it, except event streams (social_network/compression.py)
+    'social_network.compression.CompressionMiddleware',
+    # Read replica routing and read-your-writes pinning (social_network/replicas.py)
+    'social_network.replicas.ReplicaMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -60,7 +69,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'social_network.urls'
+# asgi.py switches to social_network.urls_asgi (async read views)
+ROOT_URLCONF = os.getenv('ROOT_URLCONF', 'social_network.urls')
 
 TEMPLATES = [
     {
@@ -91,9 +101,152 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # Seconds a connection is kept open for the next request (0 = closed after each one)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
     }
 }
 
+# DB_ENGINE=sqlite runs everything (including the tests) without a PostgreSQL server
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
+    }
+
+# Read replicas of the primary (DB_REPLICA_HOSTS=host1,host2), same database and
+# credentials. Read-only feed, post and profile requests read from them, see
+# social_network/replicas.py.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    alias = f'replica{number}'
+    # In tests a replica is the test database itself
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['social_network.replicas.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they wrote something; keep it
+# above the replicas' usual lag. Also the longest a response read from a replica is cached.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Uses Redis when REDIS_URL is set (e.g. redis://127.0.0.1:6379/1), otherwise
+# a per-process in-memory cache (fine for development and tests).
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached feed page / post stays valid. Writes invalidate the cache
+# explicitly (posts/receivers.py); this is only an upper bound.
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', 300))
+
+
+# Seconds an authenticated user row / profile response stays cached (users/cache.py).
+# Saves invalidate them explicitly; this bounds staleness from QuerySet.update().
+USER_CACHE_TIMEOUT = int(os.getenv('USER_CACHE_TIMEOUT', 60))
+
+# Background tasks (social_network/background.py)
+# Number of worker threads, and whether to run tasks inline instead
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 4))
+BACKGROUND_TASKS_EAGER = os.getenv('BACKGROUND_TASKS_EAGER') == 'True'
+
+# Image renditions (social_network/images.py)
+# Longest side in pixels of each generated size, and the encoder quality
+IMAGE_RENDITION_SIZES = {'thumbnail': 320, 'medium': 1080}
+IMAGE_RENDITION_QUALITY = 80
+# Number of worker processes rendering images
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Chunked uploads (uploads app)
+# Largest chunk accepted by one PUT, and largest total upload
+UPLOAD_CHUNK_MAX_BYTES = 5 * 1024 * 1024
+UPLOAD_MAX_BYTES = 50 * 1024 * 1024
+
+# Home timelines (posts/timeline.py)
+# Authors with more followers than this are not fanned out on write; their posts
+# are merged into their followers' timelines at read time instead.
+TIMELINE_FANOUT_LIMIT = int(os.getenv('TIMELINE_FANOUT_LIMIT', 10000))
+# Number of timeline rows inserted per statement during fan-out
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+# Number of recent posts copied into a timeline when following someone
+TIMELINE_BACKFILL_SIZE = 50
+
+# Trending feed, ?sort=trending (posts/trending.py)
+# Hours after which a reaction (or the post itself) counts half as much.
+# Changing this or the post weight needs `manage.py decay_trending_scores --rebuild`.
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 12))
+# What a post itself counts for, in likes
+TRENDING_POST_WEIGHT = 1.0
+
+# Async read views (social_network/async_api.py)
+# Run the independent queries of a request on separate connections at the same time.
+# Needs persistent connections (DB_CONN_MAX_AGE > 0) or a connection pool, it is
+# ignored otherwise: every query would open a connection of its own.
+ASYNC_PARALLEL_QUERIES = os.getenv('ASYNC_PARALLEL_QUERIES', 'True') == 'True'
+
+# Account and post deletion (deletions/jobs.py)
+# Rows deleted per statement / transaction by a deletion job
+DELETION_BATCH_SIZE = int(os.getenv('DELETION_BATCH_SIZE', 1000))
+
+# Cold archive of old posts (posts/archive.py)
+# Posts older than this are moved to the archive by `manage.py roll_post_archive`
+POST_ARCHIVE_AFTER_DAYS = int(os.getenv('POST_ARCHIVE_AFTER_DAYS', 365))
+# Posts moved per transaction
+POST_ARCHIVE_BATCH_SIZE = int(os.getenv('POST_ARCHIVE_BATCH_SIZE', 1000))
+
+# Delta sync (posts/changes.py)
+# Change log rows returned per /api/posts/changes/ response
+CHANGES_PAGE_SIZE = 500
+# The sync token only moves past changes at least this old (longer than any write transaction)
+CHANGES_SETTLE_SECONDS = 2
+# Change log rows older than this are removed by `manage.py prune_changelog`
+CHANGES_RETENTION_DAYS = 7
+
+# Real-time events (social_network/pubsub.py, posts/streams.py)
+# In-process delivery by default; through a Redis channel when REDIS_URL is set,
+# so every node's streams see the events of every other node.
+if os.getenv('REDIS_URL'):
+    EVENTS_BACKEND = 'social_network.pubsub.RedisBroker'
+else:
+    EVENTS_BACKEND = 'social_network.pubsub.InProcessBroker'
+EVENTS_REDIS_URL = os.getenv('REDIS_URL')
+EVENTS_REDIS_CHANNEL = 'social_network:events'
+# At most one reaction-count event per post per this many seconds (0 = no coalescing)
+EVENTS_COALESCE_WINDOW = float(os.getenv('EVENTS_COALESCE_WINDOW', 1.0))
+# Seconds between keep-alive comments on an idle stream
+EVENTS_HEARTBEAT = 15
+# Events buffered per slow client before the oldest are dropped
+EVENTS_MAX_PENDING = 100
+
+# Request metrics (social_network/metrics.py)
+# Send the Server-Timing header with every response
+REQUEST_METRICS_SERVER_TIMING = os.getenv('REQUEST_METRICS_SERVER_TIMING', 'True') == 'True'
+# Seconds between adding a worker's counts to the shared histograms in the cache
+REQUEST_METRICS_FLUSH_INTERVAL = 10
+# Requests above any of these limits are logged as warnings. 'default' applies
+# to every endpoint; entries under a URL name override it for that endpoint.
+REQUEST_BUDGETS = {
+    'default': {'queries': 20, 'total_ms': 500},
+    # Password hashing alone takes a few hundred milliseconds
+    'signup': {'total_ms': 2000},
+    'token_obtain_pair': {'total_ms': 2000},
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -135,6 +288,21 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media files are stored as deduplicated, content-addressed blobs (social_network/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'social_network.storage.BlobFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# Folders whose files are stored as blobs (and are then cached as immutable)
+MEDIA_HASHED_PREFIXES = ('post_images/', 'profile_pics/')
+# Browser cache lifetime (seconds) of media files without a hashed name
+MEDIA_MAX_AGE = 60 * 60
+# Let the front proxy send media files (social_network/media.py):
+# '' (Django streams them), 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile)
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL', '')
+# nginx `internal` location that maps to MEDIA_ROOT
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -142,12 +310,30 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
+# Password checks run on the bounded hashing pool (users/hashing.py, users/backends.py)
+AUTHENTICATION_BACKENDS = ['users.backends.PooledModelBackend']
+
+# Threads hashing passwords, and how many hashes may be running or waiting before
+# signup/login answer 503 right away. Keep the workers below the CPU count so
+# hashing never takes every core from the other requests.
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASHING_QUEUE = int(os.getenv('PASSWORD_HASHING_QUEUE', 16))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        # JWTAuthentication with the user row cached (users/authentication.py)
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # DRF's JSON output, rendered with orjson when installed (social_network/renderers.py)
+        'social_network.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# Render API responses with orjson (when installed) instead of the standard library
+FAST_JSON_RENDERER = os.getenv('FAST_JSON_RENDERER', 'True') == 'True'
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+# Media storage with content-addressed, deduplicated files
+#
+# Files saved under one of MEDIA_HASHED_PREFIXES (post images, profile pictures)
+# or BLOB_PREFIX (their renditions) are stored as blobs named after the SHA-256
+# of their content, e.g. blobs/3f/3f9a0c...e1.jpg, computed while the upload is
+# streamed in. Identical content is stored once: a post image reposted, or the
+# same picture used as a post and a profile picture, gets the name (and the
+# cached URL) of the existing blob. uploads/blobs.py counts the references to
+# each blob: delete() only drops one, and `manage.py collect_blobs` removes the
+# files nobody refers to any more.
+#
+# A name is never reused for other bytes, so the media view
+# (social_network/media.py) lets browsers and CDNs cache them forever
+# ("immutable"). Files stored under content-hashed names of their own before
+# the blobs (post_images/<32 hex>.jpg) are still served that way, and deleted
+# as plain files.
+#
+# Other files (e.g. upload chunks) are stored under their usual names.
+
+BLOB_PREFIX = 'blobs/'
+# Temporary files of uploads being hashed (on the same file system, so a new
+# blob is moved into place without copying)
+INCOMING_DIR = 'incoming'
+HASH_LENGTH = 32
+_HASHED_NAME = re.compile(rf'^[0-9a-f]{{{HASH_LENGTH}}}(_[A-Za-z0-9]{{7}})?(\.\w+)?$')
+_BLOB_NAME = re.compile(r'^[0-9a-f]{64}(\.\w+)?$')
+
+
+def is_blob_name(name):
+    return name.startswith(BLOB_PREFIX) and bool(_BLOB_NAME.match(posixpath.basename(name)))
+
+
+def is_hashed_name(name):
+    if is_blob_name(name):
+        return True
+    return name.startswith(tuple(settings.MEDIA_HASHED_PREFIXES)) and bool(_HASHED_NAME.match(posixpath.basename(name)))
+
+
+def blob_name(digest, extension):
+    return f'{BLOB_PREFIX}{digest[:2]}/{digest}{extension.lower()}'
+
+
+class BlobFileSystemStorage(FileSystemStorage):
+    def _save(self, name, content):
+        if not name.startswith((*settings.MEDIA_HASHED_PREFIXES, BLOB_PREFIX)):
+            return super()._save(name, content)
+        from uploads import blobs
+
+        # Written to a temporary file while hashing (the content may be a stream
+        # that can only be read once)
+        incoming = self.path(INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=incoming)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(handle, 'wb') as output:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+                    size += len(chunk)
+            name = blob_name(digest.hexdigest(), os.path.splitext(name)[1])
+            path = self.path(name)
+            with transaction.atomic():
+                # A file missing from an existing blob (its save was rolled back) is written again
+                if blobs.add_reference(name, size) or not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(temporary, self.file_permissions_mode)
+                    os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return name
+
+    # Drop a reference (blobs) or delete the file
+    def delete(self, name):
+        if is_blob_name(name):
+            from uploads import blobs
+            blobs.release(name)
+        else:
+            super().delete(name)
+
+    # Remove the file of a blob (uploads/blobs.py collect())
+    def delete_blob(self, name):
+        super().delete(name)
@@ -17,10 +17,17 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from . import media
+from .views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('users.urls')),
     path('api/posts/', include('posts.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('api/uploads/', include('uploads.urls')),
+    # Per-endpoint request metrics (admins only)
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
+    # Uploaded media, with caching headers and byte ranges (social_network/media.py).
+    # In production the front proxy serves the bytes (MEDIA_ACCEL).
+    path(settings.MEDIA_URL.lstrip('/') + '<path:path>', media.serve, name='media'),
+]
@@ -0,0 +1,22 @@
+"""
+URL configuration used when serving through ASGI (see asgi.py).
+
+The hot read endpoints are answered by async views; everything else, and every
+write, falls through to the regular URL configuration.
+
+The event stream is only routed here: under WSGI a streaming response holds its
+worker until it ends, and this one never ends.
+"""
+from django.urls import include, path
+from posts import async_views as posts_async_views
+from posts.streams import post_events
+from users import async_views as users_async_views
+
+urlpatterns = [
+    path('api/posts/', posts_async_views.post_list, name='post-list-create'),
+    path('api/posts/<int:pk>/', posts_async_views.post_detail, name='post-detail'),
+    path('api/profile/', users_async_views.profile, name='profile'),
+    # Real-time stream of post events (Server-Sent Events, posts/streams.py)
+    path('api/posts/events/', post_events, name='post-events'),
+    path('', include('social_network.urls')),
+]
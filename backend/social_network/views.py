@@ -0,0 +1,17 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from . import metrics
+
+
+# GET: per-endpoint histograms of query count, DB, serializer and total time
+# DELETE: start over (e.g. before a benchmark run)
+class MetricsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(metrics.get_histograms())
+
+    def delete(self, request):
+        metrics.reset_histograms()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,109 @@
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from deletions.models import DeletionFile
+from posts.models import ArchivedPost, Post
+from social_network.images import rendition_names
+from users.models import User
+from .models import Blob
+
+# Reference counts of the shared media files (social_network/storage.py)
+#
+# Identical images (the same picture posted again, or used as a post and as a
+# profile picture) are stored once, as a blob. Every save of the content adds a
+# reference to its blob and every delete of the returned name drops one, so
+# refs is the number of image fields and renditions pointing at it:
+#
+#   save  -> refs + 1 (the file is written only for a new blob)
+#   post deleted (deletions/jobs.py), picture replaced (users/receivers.py)
+#         -> refs - 1
+#
+# A blob whose refs reached 0 keeps its file until `manage.py collect_blobs`
+# (run it daily) removes it, after a grace period: a blob dropped by mistake or
+# still in a page somebody is loading can be brought back by the next save.
+# Rows written without going through the storage (NDJSON imports, restored
+# backups) are not counted; `collect_blobs --recount` recounts from the rows.
+
+BATCH_SIZE = 1000
+
+
+# Add a reference to the blob, creating it when its content is new. Returns
+# True if the blob was created (its file must be written).
+def add_reference(name, size):
+    now = timezone.now()
+    with transaction.atomic():
+        if Blob.objects.filter(name=name).update(refs=F('refs') + 1, updated_at=now):
+            return False
+        try:
+            with transaction.atomic():
+                Blob.objects.create(name=name, size=size, refs=1)
+            return True
+        except IntegrityError:
+            # Created meanwhile by another save of the same content
+            Blob.objects.filter(name=name).update(refs=F('refs') + 1, updated_at=now)
+            return False
+
+
+# Drop a reference to the blob (its file stays until collect_blobs)
+def release(name):
+    Blob.objects.filter(name=name, refs__gt=0).update(refs=F('refs') - 1, updated_at=timezone.now())
+
+
+# Number of references to every stored media name: post images (live and
+# archived), profile pictures, their renditions, and the files of unfinished
+# deletion jobs (released when the job reaches them)
+def referenced_names():
+    names = Counter()
+    sources = (
+        Post.objects.exclude(image='').values_list('image', 'image_renditions'),
+        ArchivedPost.objects.exclude(image='').values_list('image', 'image_renditions'),
+        User.objects.exclude(profile_picture='').values_list('profile_picture', 'profile_picture_renditions'),
+    )
+    for rows in sources:
+        for original, renditions in rows.iterator(chunk_size=2000):
+            if original:
+                names[original] += 1
+                names.update(rendition_names(renditions))
+    names.update(DeletionFile.objects.values_list('name', flat=True).iterator(chunk_size=2000))
+    return names
+
+
+# Set the refs of the blobs unchanged since the cutoff to the number of rows
+# pointing at them. Returns the number of blobs corrected.
+def recount(cutoff):
+    counts = referenced_names()
+    fixed = 0
+    blobs = Blob.objects.filter(updated_at__lt=cutoff).values_list('name', 'refs')
+    for name, refs in blobs.iterator(chunk_size=2000):
+        if refs != counts[name]:
+            # Skipped if a save or delete touched the blob in the meantime
+            fixed += Blob.objects.filter(name=name, updated_at__lt=cutoff).update(refs=counts[name])
+    return fixed
+
+
+# Delete the unreferenced blobs unchanged since the cutoff, files first, in
+# batches. Returns the number of blobs and bytes reclaimed.
+def collect(storage, cutoff, batch_size=BATCH_SIZE, dry_run=False):
+    count = size = 0
+    last = ''
+    while True:
+        with transaction.atomic():
+            # Locked: a save of the same content waits, then finds the blob gone
+            # and writes its file again. Blobs locked by a save are skipped.
+            batch = list(
+                Blob.objects.select_for_update(skip_locked=True)
+                .filter(refs=0, updated_at__lt=cutoff, name__gt=last)
+                .order_by('name')
+                .values_list('name', 'size')[:batch_size]
+            )
+            if not batch:
+                return count, size
+            last = batch[-1][0]
+            names = [name for name, _ in batch]
+            if not dry_run:
+                for name in names:
+                    storage.delete_blob(name)
+                Blob.objects.filter(name__in=names).delete()
+        count += len(batch)
+        size += sum(blob_size for _, blob_size in batch)
@@ -0,0 +1,28 @@
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from uploads import blobs
+
+# Management command: python manage.py collect_blobs [--grace-hours 24] [--recount] [--dry-run]
+# Removes the media blobs no post or user refers to any more (uploads/blobs.py),
+# once they have been unreferenced for --grace-hours. --recount first repairs
+# the reference counts from the rows (e.g. after an NDJSON import).
+class Command(BaseCommand):
+    help = 'Delete stored media blobs that nothing refers to any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24, help='Keep blobs whose references changed more recently than this.')
+        parser.add_argument('--recount', action='store_true', help='Recount the references from the posts and users first.')
+        parser.add_argument('--batch-size', type=int, default=blobs.BATCH_SIZE, help='Blobs deleted per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the blobs that would be deleted.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        if options['recount'] and not options['dry_run']:
+            fixed = blobs.recount(cutoff)
+            self.stdout.write(f'Recounted the references of {fixed} blob(s).')
+
+        count, size = blobs.collect(default_storage, cutoff, options['batch_size'], options['dry_run'])
+        action = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{action} {count} unreferenced blob(s), {size} byte(s).'))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from uploads.models import ChunkedUpload
+from uploads.views import delete_chunks
+
+# Management command: python manage.py purge_stale_uploads --hours 24
+# Removes uploads that were started but never completed, together with their chunk files.
+class Command(BaseCommand):
+    help = 'Delete abandoned chunked uploads and their chunk files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Age (since the last chunk) after which an upload is abandoned.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = ChunkedUpload.objects.filter(status=ChunkedUpload.STATUS_ACTIVE, updated_at__lt=cutoff)
+        count = 0
+        for upload in stale.iterator():
+            delete_chunks(upload)
+            upload.delete()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Purged {count} stale upload(s).'))
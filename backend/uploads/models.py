@@ -0,0 +1,70 @@
+import uuid
+from django.db import models
+from django.conf import settings
+
+# Chunked Upload: a large file sent in several requests (initiate -> PUT chunks -> complete)
+# A dropped connection only loses the chunk in flight; the client asks for
+# `offset` and resumes from there.
+class ChunkedUpload(models.Model):
+    STATUS_ACTIVE = 'active'
+    STATUS_COMPLETE = 'complete'
+    STATUS_CHOICES = (
+        (STATUS_ACTIVE, 'Active'),
+        (STATUS_COMPLETE, 'Complete'),
+    )
+
+    # Random id so upload URLs can't be guessed
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    # Total size in bytes and SHA-256 (hex) announced by the client
+    size = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64)
+    # Number of bytes received so far (= where the next chunk must start)
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+# One received piece of an upload, stored as its own file until the upload is completed
+class UploadChunk(models.Model):
+    upload = models.ForeignKey(ChunkedUpload, on_delete=models.CASCADE, related_name='chunks')
+    # Byte position of the chunk inside the final file
+    offset = models.PositiveBigIntegerField()
+    size = models.PositiveBigIntegerField()
+    # Name of the chunk file in the default storage
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['upload', 'offset'], name='unique_upload_chunk'),
+        ]
+
+    def __str__(self):
+        return f"{self.upload_id} @ {self.offset}"
+
+
+# Blob: one stored media file, shared by every post image, profile picture and
+# rendition with the same content (social_network/storage.py, uploads/blobs.py)
+class Blob(models.Model):
+    # Storage name, after the SHA-256 of the content: blobs/3f/3f9a...e1.jpg
+    name = models.CharField(max_length=100, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    # Number of stored names (image fields, renditions) pointing at the blob
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last change of refs: `manage.py collect_blobs` leaves recently used blobs alone
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The blobs collect_blobs looks for
+            models.Index(fields=['updated_at'], condition=models.Q(refs=0), name='blob_unreferenced_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refs})"
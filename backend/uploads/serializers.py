@@ -0,0 +1,36 @@
+import re
+from django.conf import settings
+from rest_framework import serializers
+from .models import ChunkedUpload
+from social_network.metrics import TimedSerializerMixin
+
+# Serializer to initiate an upload and report its progress
+class ChunkedUploadSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ChunkedUpload
+        fields = ('id', 'filename', 'size', 'checksum', 'offset', 'status', 'created_at')
+        read_only_fields = ('offset', 'status', 'created_at')
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be greater than zero.")
+        if value > settings.UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(f"Uploads are limited to {settings.UPLOAD_MAX_BYTES} bytes.")
+        return value
+
+    # SHA-256 of the whole file, as 64 hex characters
+    def validate_checksum(self, value):
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError("Checksum must be a hex encoded SHA-256 digest.")
+        return value
+
+
+# Serializer for the "complete" step: what to attach the finished file to
+class CompleteUploadSerializer(serializers.Serializer):
+    ATTACH_POST = 'post'
+    ATTACH_PROFILE_PICTURE = 'profile_picture'
+
+    attach_to = serializers.ChoiceField(choices=(ATTACH_POST, ATTACH_PROFILE_PICTURE))
+    # Text of the new post (attach_to=post only)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
@@ -0,0 +1,234 @@
+import hashlib
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from posts.models import Post
+from social_network.images import rendition_names
+from users.models import User
+from .models import Blob, ChunkedUpload
+
+
+# Tests for the chunked upload API
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, UPLOAD_CHUNK_MAX_BYTES=1024)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.client.force_authenticate(self.user)
+
+        buffer = io.BytesIO()
+        Image.effect_noise((64, 64), 50).convert('RGB').save(buffer, 'PNG')
+        self.data = buffer.getvalue()
+
+    def start(self, checksum=None):
+        response = self.client.post('/api/uploads/', {
+            'filename': 'photo.png',
+            'size': len(self.data),
+            'checksum': checksum or hashlib.sha256(self.data).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def send_all(self, upload_id):
+        for offset in range(0, len(self.data), 1024):
+            response = self.client.put(f'/api/uploads/{upload_id}/?offset={offset}', self.data[offset:offset + 1024], content_type='application/octet-stream')
+            self.assertEqual(response.status_code, 200)
+
+    def test_upload_in_chunks_and_attach_to_new_post(self):
+        upload_id = self.start()
+        self.send_all(upload_id)
+        response = self.client.post(f'/api/uploads/{upload_id}/complete/', {'attach_to': 'post', 'description': 'Big one'})
+        self.assertEqual(response.status_code, 201)
+
+        post = Post.objects.get(pk=response.data['id'])
+        with post.image.open('rb') as image_file:
+            self.assertEqual(image_file.read(), self.data)
+        self.assertEqual(ChunkedUpload.objects.get(pk=upload_id).status, ChunkedUpload.STATUS_COMPLETE)
+
+    def test_resume_rejects_wrong_offset(self):
+        upload_id = self.start()
+        self.client.put(f'/api/uploads/{upload_id}/?offset=0', self.data[:1024], content_type='application/octet-stream')
+        # Sending the first chunk again is refused and the client learns where to resume
+        response = self.client.put(f'/api/uploads/{upload_id}/', self.data[:1024], content_type='application/octet-stream', HTTP_CONTENT_RANGE=f'bytes 0-1023/{len(self.data)}')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 1024)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['offset'], 1024)
+
+    def test_malformed_content_length_is_rejected(self):
+        upload_id = self.start()
+        response = self.client.put(f'/api/uploads/{upload_id}/?offset=0', self.data[:1024], content_type='application/octet-stream', CONTENT_LENGTH='1k')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['offset'], 0)
+
+    def test_checksum_mismatch_is_rejected(self):
+        upload_id = self.start(checksum='0' * 64)
+        self.send_all(upload_id)
+        response = self.client.post(f'/api/uploads/{upload_id}/complete/', {'attach_to': 'profile_picture'})
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_picture)
+
+
+# Tests for content-addressed media names and the media view (social_network/storage.py, social_network/media.py)
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.data = bytes(range(256)) * 4
+        self.name = default_storage.save('post_images/photo.jpg', ContentFile(self.data))
+
+    def test_identical_content_is_stored_once(self):
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(self.name, f'blobs/{digest[:2]}/{digest}.jpg')
+        # Same bytes again: the same blob, one more reference
+        self.assertEqual(default_storage.save('profile_pics/other.JPG', ContentFile(self.data)), self.name)
+        self.assertEqual(Blob.objects.get(name=self.name).refs, 2)
+        self.assertFalse(default_storage.exists('post_images/photo.jpg'))
+        # Deleting drops a reference, the file stays for the other one
+        default_storage.delete(self.name)
+        self.assertEqual(Blob.objects.get(name=self.name).refs, 1)
+        self.assertTrue(default_storage.exists(self.name))
+        # Outside the blob folders names stay as they are
+        self.assertEqual(default_storage.save('uploads/x/0.part', ContentFile(b'chunk')), 'uploads/x/0.part')
+
+    def test_immutable_caching_and_conditional_requests(self):
+        response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        # A file saved before names were hashed
+        plain = FileSystemStorage().save('post_images/readme.txt', ContentFile(b'hello'))
+        self.assertNotIn('immutable', self.client.get(f'/media/{plain}')['Cache-Control'])
+        self.assertEqual(self.client.get('/media/post_images/missing.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+
+    def test_private_files_are_not_served(self):
+        chunk = default_storage.save('uploads/42/000000000000.part', ContentFile(b'chunk'))
+        incoming = FileSystemStorage().save('incoming/tmp123', ContentFile(b'chunk'))
+        for name in (chunk, incoming, f'post_images/../{chunk}'):
+            self.assertEqual(self.client.get(f'/media/{name}').status_code, 404, name)
+
+    def test_range_requests(self):
+        url = f'/media/{self.name}'
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-5:])
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(self.data)}-').status_code, 416)
+        # A stale If-Range gets the whole (new) file
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"old"').status_code, 200)
+
+    def test_proxy_sends_the_file(self):
+        with self.settings(MEDIA_ACCEL='nginx'):
+            response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_ACCEL='apache'):
+            response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(response['X-Sendfile'], default_storage.path(self.name))
+
+
+# Tests for the reference counts and collection of media blobs (uploads/blobs.py)
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class BlobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.client.force_authenticate(self.user)
+
+    def make_image(self, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (32, 32), color).save(buffer, 'PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def refs(self, name):
+        return Blob.objects.get(name=name).refs
+
+    def test_post_and_profile_picture_share_a_blob(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/posts/', {'description': 'pic', 'image': self.make_image('red')}, format='multipart')
+        post = Post.objects.get(pk=response.data['id'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/profile/', {'profile_picture': self.make_image('red')}, format='multipart')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture.name, post.image.name)
+        self.assertEqual(self.user.profile_picture_renditions, post.image_renditions)
+        self.assertEqual(self.refs(post.image.name), 2)
+
+        # A new picture drops the old one (and its renditions)
+        renditions = rendition_names(self.user.profile_picture_renditions)
+        shared = {name: self.refs(name) for name in renditions}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/profile/', {'profile_picture': self.make_image('blue')}, format='multipart')
+        self.assertEqual(self.refs(post.image.name), 1)
+        self.assertTrue(all(self.refs(name) == shared[name] // 2 for name in renditions))
+
+        # Deleting the post leaves them unreferenced, collected after the grace period
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/posts/{post.pk}/')
+        self.assertEqual(self.refs(post.image.name), 0)
+        call_command('collect_blobs', stdout=StringIO())
+        self.assertTrue(default_storage.exists(post.image.name))
+        call_command('collect_blobs', grace_hours=0, stdout=StringIO())
+        self.assertFalse(Blob.objects.filter(name__in=[post.image.name, *renditions]).exists())
+        self.assertFalse(any(default_storage.exists(name) for name in [post.image.name, *renditions]))
+        self.user.refresh_from_db()
+        self.assertTrue(default_storage.exists(self.user.profile_picture.name))
+
+    def test_clearing_the_profile_picture_releases_its_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/profile/', {'profile_picture': self.make_image('red')}, format='multipart')
+        self.user.refresh_from_db()
+        picture, renditions = self.user.profile_picture.name, list(rendition_names(self.user.profile_picture_renditions))
+        self.assertTrue(renditions)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/profile/', {'profile_picture': None}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture_renditions, {})
+        self.assertEqual(self.refs(picture), 0)
+        self.assertTrue(all(self.refs(name) == 0 for name in renditions))
+
+    def test_recount(self):
+        name = default_storage.save('post_images/photo.png', self.make_image('green'))
+        # Saved without going through the storage (e.g. imported): not counted
+        Post.objects.create(user=self.user, image=name, description='Imported')
+        Post.objects.create(user=self.user, image=name, description='Imported')
+        Blob.objects.filter(name=name).update(refs=0, updated_at=timezone.now() - timedelta(days=2))
+        call_command('collect_blobs', recount=True, stdout=StringIO())
+        self.assertEqual(self.refs(name), 2)
+        self.assertTrue(default_storage.exists(name))
@@ -0,0 +1,13 @@
+from django.urls import path
+from .views import UploadCreateView, UploadDetailView, UploadCompleteView
+
+urlpatterns = [
+    # Route to Start a chunked upload
+    path('', UploadCreateView.as_view(), name='upload-create'),
+
+    # Route to Check progress (GET), send a chunk (PUT) or cancel (DELETE)
+    path('<uuid:pk>/', UploadDetailView.as_view(), name='upload-detail'),
+
+    # Route to Finish the upload and attach it to a post or the profile picture
+    path('<uuid:pk>/complete/', UploadCompleteView.as_view(), name='upload-complete'),
+]
@@ -0,0 +1,214 @@
+import hashlib
+import io
+import re
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from PIL import Image
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from posts.models import Post
+from posts.serializers import PostSerializer
+from posts.tasks import schedule_post_processing
+from users.models import User
+from users.serializers import UserProfileSerializer
+from users.tasks import schedule_profile_picture_processing
+from .models import ChunkedUpload, UploadChunk
+from .serializers import ChunkedUploadSerializer, CompleteUploadSerializer
+
+
+# File-like object reading the chunk files of an upload one after another,
+# hashing the bytes as they go by. Only one read buffer is held in memory.
+class ChunksReader(io.RawIOBase):
+    def __init__(self, storage, names):
+        self.storage = storage
+        self.names = iter(names)
+        self.current = None
+        self.sha256 = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self.current is None:
+                name = next(self.names, None)
+                if name is None:
+                    return 0
+                self.current = self.storage.open(name, 'rb')
+            data = self.current.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                self.sha256.update(data)
+                return len(data)
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        super().close()
+
+
+# Delete the chunk files and rows of an upload
+def delete_chunks(upload):
+    for name in upload.chunks.values_list('name', flat=True):
+        default_storage.delete(name)
+    upload.chunks.all().delete()
+
+
+# View to Start an upload (POST) - returns the upload id and offset 0
+class UploadCreateView(generics.CreateAPIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    serializer_class = ChunkedUploadSerializer
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+
+# View to Check progress (GET), send a chunk (PUT) or cancel (DELETE) an upload
+class UploadDetailView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_upload(self, request, pk):
+        return get_object_or_404(ChunkedUpload, pk=pk, owner=request.user)
+
+    # Resume support: the client asks where to continue from
+    def get(self, request, pk):
+        return Response(ChunkedUploadSerializer(self.get_upload(request, pk)).data)
+
+    # Receive one chunk. The raw request body is the chunk; its position is given by
+    # ?offset=N or a "Content-Range: bytes start-end/total" header and must equal
+    # the current upload offset.
+    def put(self, request, pk):
+        upload = self.get_upload(request, pk)
+        if upload.status != ChunkedUpload.STATUS_ACTIVE:
+            return Response({'detail': 'Upload is already complete.'}, status=status.HTTP_409_CONFLICT)
+
+        offset = self.get_offset(request)
+        if offset is None:
+            return Response({'detail': 'Missing or invalid chunk offset.'}, status=status.HTTP_400_BAD_REQUEST)
+        if offset != upload.offset:
+            # Out of order or duplicate chunk: tell the client where to resume
+            return Response({'detail': 'Unexpected offset.', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({'detail': 'Missing or invalid chunk length.'}, status=status.HTTP_400_BAD_REQUEST)
+        if length <= 0:
+            return Response({'detail': 'Empty chunk.'}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.UPLOAD_CHUNK_MAX_BYTES:
+            return Response({'detail': f'Chunks are limited to {settings.UPLOAD_CHUNK_MAX_BYTES} bytes.'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if offset + length > upload.size:
+            return Response({'detail': 'Chunk goes past the announced size.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Stream the body straight into storage (read in small blocks, never buffered whole)
+        content = File(request.stream, name='chunk')
+        content.size = length
+        name = default_storage.save(f'uploads/{upload.pk}/{offset:012d}.part', content)
+        if default_storage.size(name) != length:
+            default_storage.delete(name)
+            return Response({'detail': 'Chunk was truncated.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # Conditional update: if a concurrent request stored this offset first, we lose
+            moved = ChunkedUpload.objects.filter(pk=upload.pk, offset=offset, status=ChunkedUpload.STATUS_ACTIVE).update(offset=offset + length)
+            if moved:
+                UploadChunk.objects.create(upload=upload, offset=offset, size=length, name=name)
+        if not moved:
+            default_storage.delete(name)
+            upload.refresh_from_db(fields=['offset'])
+            return Response({'detail': 'Unexpected offset.', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+
+        return Response({'id': upload.pk, 'offset': offset + length, 'size': upload.size})
+
+    # Cancel the upload and free its storage
+    def delete(self, request, pk):
+        upload = self.get_upload(request, pk)
+        delete_chunks(upload)
+        upload.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def get_offset(self, request):
+        if 'offset' in request.query_params:
+            value = request.query_params['offset']
+            return int(value) if value.isdigit() else None
+        match = re.fullmatch(r'bytes (\d+)-\d+/\d+', request.META.get('HTTP_CONTENT_RANGE', ''))
+        return int(match.group(1)) if match else None
+
+
+# View to Finish an upload (POST): assemble the chunks, verify the checksum and
+# attach the file to a new Post or to the user's profile picture
+class UploadCompleteView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, pk):
+        upload = get_object_or_404(ChunkedUpload, pk=pk, owner=request.user)
+        serializer = CompleteUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        attach_to = serializer.validated_data['attach_to']
+
+        if upload.status != ChunkedUpload.STATUS_ACTIVE:
+            return Response({'detail': 'Upload is already complete.'}, status=status.HTTP_409_CONFLICT)
+        if upload.offset != upload.size:
+            return Response({'detail': 'Upload is not finished.', 'offset': upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+
+        if attach_to == CompleteUploadSerializer.ATTACH_POST:
+            instance = Post(user=request.user, description=serializer.validated_data['description'])
+            field = Post._meta.get_field('image')
+        else:
+            instance = request.user
+            field = User._meta.get_field('profile_picture')
+
+        # Copy the chunks into the final file (streamed) while computing its SHA-256
+        reader = ChunksReader(default_storage, upload.chunks.order_by('offset').values_list('name', flat=True))
+        content = File(reader, name=upload.filename)
+        content.size = upload.size
+        stored = field.storage.save(field.generate_filename(instance, upload.filename), content)
+        reader.close()
+
+        error = None
+        if reader.sha256.hexdigest() != upload.checksum:
+            error = 'Checksum mismatch.'
+        elif not self.is_image(field.storage, stored):
+            error = 'Upload a valid image.'
+        if error:
+            field.storage.delete(stored)
+            return Response({'detail': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            completed = ChunkedUpload.objects.filter(pk=upload.pk, status=ChunkedUpload.STATUS_ACTIVE).update(status=ChunkedUpload.STATUS_COMPLETE)
+            if completed:
+                setattr(instance, field.name, stored)
+                if attach_to == CompleteUploadSerializer.ATTACH_POST:
+                    instance.save()
+                    schedule_post_processing(instance)
+                else:
+                    instance.save(update_fields=[field.name])
+                    schedule_profile_picture_processing(instance)
+        if not completed:
+            # A concurrent request finished it first
+            field.storage.delete(stored)
+            return Response({'detail': 'Upload is already complete.'}, status=status.HTTP_409_CONFLICT)
+
+        # The chunks are no longer needed
+        delete_chunks(upload)
+
+        context = {'request': request}
+        if attach_to == CompleteUploadSerializer.ATTACH_POST:
+            return Response(PostSerializer(instance, context=context).data, status=status.HTTP_201_CREATED)
+        return Response(UserProfileSerializer(instance, context=context).data, status=status.HTTP_200_OK)
+
+    # Pillow checks the header without decoding the whole image
+    def is_image(self, storage, name):
+        try:
+            with storage.open(name, 'rb') as image_file:
+                Image.open(image_file).verify()
+        except Exception:
+            return False
+        return True
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from .models import User, Follow
 
 admin.site.register(User, UserAdmin)
+admin.site.register(Follow)
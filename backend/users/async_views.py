@@ -0,0 +1,38 @@
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.request import Request
+from social_network import etags
+from social_network.async_api import get_user_or_error, render, unauthorized
+from .models import UserStats
+from .serializers import UserProfileSerializer
+from .views import ProfileView
+from . import cache
+
+# Async version of the profile read (served by social_network/urls_asgi.py).
+# The user comes from the cache (see authenticate()); updates go to the DRF view.
+
+_sync_profile = ProfileView.as_view()
+
+
+# GET /api/profile/ (same as ProfileView)
+@csrf_exempt
+async def profile(request):
+    if request.method != 'GET':
+        return await sync_to_async(_sync_profile)(request)
+    user, error = await get_user_or_error(request)
+    if error:
+        return error
+    if not user.is_authenticated:
+        return unauthorized('Authentication credentials were not provided.')
+
+    # Same versioned ETag as ProfileView.retrieve()
+    version = await sync_to_async(cache.get_profile_version)(user.pk)
+    etag = etags.version_etag('profile', user.pk, version)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etags.etag_matches(request, etag):
+        return render(None, status=304, headers=headers)
+    # Fresh stats (the user may be a cached copy), cached on the user (a missing
+    # row too) so the serializer doesn't query from async code
+    stats = await UserStats.objects.filter(user_id=user.pk).afirst()
+    type(user).stats.related.set_cached_value(user, stats)
+    return render(UserProfileSerializer(user, context={'request': Request(request)}).data, headers=headers)
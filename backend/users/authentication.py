@@ -0,0 +1,34 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from . import cache
+
+
+# JWT authentication that reads the user from the cache (users/cache.py)
+# instead of doing a primary-key lookup on every request. Same checks as
+# JWTAuthentication: the user must exist, be active, and (when enabled) the
+# token must not predate a password change.
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        user = cache.get_user(user_id)
+        if user is None:
+            # Not cached: the normal lookup (raises for unknown users), then remember it
+            user = super().get_user(validated_token)
+            cache.set_user(user)
+            return user
+
+        check_user(user, validated_token)
+        return user
+
+
+# The checks JWTAuthentication.get_user() makes after loading the user
+def check_user(user, validated_token):
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != cache.password_stamp(user):
+        raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
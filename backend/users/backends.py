@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from . import hashing
+
+UserModel = get_user_model()
+
+
+# ModelBackend with the password work done on the hashing pool (users/hashing.py).
+# Used by login (TokenObtainPairView) and the admin. When the stored hash is
+# outdated (older algorithm or fewer iterations than the current default) it is
+# replaced on a successful login, like Django does, with the new hash also
+# computed on the pool.
+class PooledModelBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash once anyway, so unknown emails take as long as wrong passwords
+            hashing.make_password(password)
+            return None
+
+        correct, new_hash = hashing.check_password(password, user.password)
+        if not correct or not self.user_can_authenticate(user):
+            return None
+        if new_hash:
+            user.password = new_hash
+            user.save(update_fields=['password'])
+        return user
@@ -0,0 +1,111 @@
+import hashlib
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Cache of authenticated users and of their profile response
+#
+# Every JWT-authenticated request needs the User row (users/authentication.py).
+# It is kept in the cache for USER_CACHE_TIMEOUT seconds instead of being read
+# from the database each time. The profile response (GET /api/profile/) is cached
+# per profile version and served with an ETag.
+#
+# The cache is shared (Redis), so the row is stored as a dict of its fields
+# without the password hash. The token revocation check gets the digest of the
+# hash that simplejwt also puts in the tokens; the rebuilt user loads the hash
+# itself from the database only if something reads user.password.
+#
+# Saving or deleting a user (profile edit, password change, new picture
+# renditions, ...) drops the cached row and bumps the profile version
+# (users/receivers.py). Changes made with QuerySet.update() bypass this and
+# show up after at most USER_CACHE_TIMEOUT seconds; only counters are written
+# that way, and the profile doesn't show them (its stats, users/stats.py, bump
+# the profile version themselves).
+
+
+def user_cache_key(user_id):
+    return f'users:user:{user_id}'
+
+
+def _profile_version_key(user_id):
+    return f'users:profile-version:{user_id}'
+
+
+def _user_to_dict(user):
+    data = {field.attname: getattr(user, field.attname) for field in user._meta.concrete_fields if field.attname != 'password'}
+    data['password_stamp'] = get_md5_hash_password(user.password)
+    return data
+
+
+def _user_from_dict(data):
+    if data is None:
+        return None
+    data = dict(data)
+    stamp = data.pop('password_stamp')
+    # Missing fields (the password) are deferred, and saving the user leaves them alone
+    user = get_user_model().from_db(DEFAULT_DB_ALIAS, list(data), list(data.values()))
+    user._password_stamp = stamp
+    return user
+
+
+# What a token's revocation claim must match (users/authentication.py)
+def password_stamp(user):
+    if hasattr(user, '_password_stamp'):
+        return user._password_stamp
+    return get_md5_hash_password(user.password)
+
+
+def get_user(user_id):
+    return _user_from_dict(cache.get(user_cache_key(user_id)))
+
+
+def set_user(user):
+    cache.set(user_cache_key(user.pk), _user_to_dict(user), settings.USER_CACHE_TIMEOUT)
+
+
+async def aget_user(user_id):
+    return _user_from_dict(await cache.aget(user_cache_key(user_id)))
+
+
+async def aset_user(user):
+    await cache.aset(user_cache_key(user.pk), _user_to_dict(user), settings.USER_CACHE_TIMEOUT)
+
+
+def get_profile_version(user_id):
+    version = cache.get(_profile_version_key(user_id))
+    if version is None:
+        # Time based, so a lost (evicted) version never repeats an older one
+        cache.add(_profile_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_profile_version_key(user_id))
+    return version
+
+
+# Key of the cached profile response. The host is part of it because the
+# response contains absolute picture URLs.
+def profile_cache_key(request, user_id, version):
+    host = hashlib.md5(request.build_absolute_uri('/').encode('utf-8')).hexdigest()
+    return f'users:profile:{user_id}:{version}:{host}'
+
+
+def get_profile(key):
+    return cache.get(key)
+
+
+def set_profile(key, data):
+    cache.set(key, data, settings.USER_CACHE_TIMEOUT)
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+    invalidate_profile(user_id)
+
+
+# New profile version only (the user row itself didn't change, e.g. the stats did)
+def invalidate_profile(user_id):
+    try:
+        cache.incr(_profile_version_key(user_id))
+    except ValueError:
+        cache.set(_profile_version_key(user_id), time.time_ns(), None)
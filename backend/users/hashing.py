@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Password hashing on a small, bounded pool
+#
+# Hashing a password (PBKDF2 with Django's default ~1M iterations) costs
+# hundreds of milliseconds of CPU. Done on the request thread, a burst of
+# logins occupies every worker and the cheap feed reads queue up behind them.
+#
+# Here hashing runs on PASSWORD_HASHING_WORKERS dedicated threads (hashlib and
+# the other hashers release the GIL while they work, so these threads really
+# run on their own cores while the rest of the process keeps serving). At most
+# PASSWORD_HASHING_QUEUE hashes may be running or waiting; beyond that the
+# request is refused at once with a 503 + Retry-After instead of piling up.
+
+_executor = None
+_lock = threading.Lock()
+# Hashes running or waiting on the pool
+_in_flight = 0
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy, please try again in a moment.'
+    default_code = 'hashing_busy'
+    # DRF turns this into a Retry-After header (seconds)
+    wait = 1
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='hashing')
+    return _executor
+
+
+# Run func(*args) on the hashing pool and wait for the result.
+# Raises HashingUnavailable when the queue is full.
+def run_hashing(func, *args):
+    global _in_flight
+    with _lock:
+        if _in_flight >= settings.PASSWORD_HASHING_QUEUE:
+            raise HashingUnavailable()
+        _in_flight += 1
+        executor = _get_executor()
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        with _lock:
+            _in_flight -= 1
+
+
+def make_password(password):
+    return run_hashing(hashers.make_password, password)
+
+
+# Check the password against the stored hash.
+# Returns (is_correct, new_hash): new_hash is set when the stored hash uses an
+# outdated algorithm or too few iterations, and should be saved in its place.
+def check_password(password, encoded):
+    def check():
+        upgraded = []
+        # Django calls the setter only for a correct password with an outdated hash
+        correct = hashers.check_password(password, encoded, setter=lambda raw: upgraded.append(hashers.make_password(raw)))
+        return correct, upgraded[0] if upgraded else None
+    return run_hashing(check)
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from posts.models import ArchivedPost, Post
+from users.models import User, UserStats
+
+# Management command: python manage.py rebuild_user_stats
+# Recomputes UserStats (posts_count, likes_received, dislikes_received) from the
+# posts (live and archived) and their denormalized reaction counters, creating missing rows
+# (e.g. users created in bulk). Works in user-id ranges, one INSERT and one
+# set-based UPDATE per range, and only rewrites rows that drifted.
+
+
+# The aggregate over the user's live and archived posts
+def _total(aggregate):
+    live, archived = (
+        Coalesce(Subquery(
+            model.objects.filter(user=OuterRef('user_id')).order_by().values('user').annotate(total=aggregate).values('total'),
+            output_field=IntegerField(),
+        ), Value(0))
+        for model in (Post, ArchivedPost)
+    )
+    return live + archived
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user profile statistics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of user ids per UPDATE.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = User.objects.aggregate(last=Max('id'))['last'] or 0
+        created = fixed = 0
+
+        for start in range(1, last_id + 1, batch_size):
+            users = User.objects.filter(id__gte=start, id__lt=start + batch_size)
+            with transaction.atomic():
+                missing = users.filter(stats__isnull=True).values_list('id', flat=True)
+                created += len(UserStats.objects.bulk_create([UserStats(user_id=user_id) for user_id in missing], ignore_conflicts=True))
+
+                actual = {
+                    'posts_count': _total(Count('*')),
+                    'likes_received': _total(Sum('likes_count')),
+                    'dislikes_received': _total(Sum('dislikes_count')),
+                }
+                drifted = UserStats.objects.filter(user_id__gte=start, user_id__lt=start + batch_size).annotate(
+                    **{f'actual_{field}': expression for field, expression in actual.items()}
+                ).filter(
+                    ~Q(posts_count=F('actual_posts_count'))
+                    | ~Q(likes_received=F('actual_likes_received'))
+                    | ~Q(dislikes_received=F('actual_dislikes_received'))
+                )
+                fixed += UserStats.objects.filter(user_id__in=drifted.values('user_id')).update(**actual)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt user stats: {created} row(s) created, {fixed} fixed.'))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+# One row per existing user, filled from the posts table (set-based, like
+# `manage.py rebuild_user_stats`)
+def populate_stats(apps, schema_editor):
+    db = schema_editor.connection.alias
+    User = apps.get_model('users', 'User')
+    UserStats = apps.get_model('users', 'UserStats')
+    Post = apps.get_model('posts', 'Post')
+
+    user_ids = User.objects.using(db).values_list('pk', flat=True).iterator(chunk_size=5000)
+    UserStats.objects.using(db).bulk_create((UserStats(user_id=user_id) for user_id in user_ids), batch_size=5000)
+
+    def total(aggregate):
+        totals = Post.objects.filter(user=OuterRef('user_id')).order_by().values('user').annotate(total=aggregate).values('total')
+        return Coalesce(Subquery(totals, output_field=IntegerField()), Value(0))
+
+    UserStats.objects.using(db).update(
+        posts_count=total(Count('*')),
+        likes_received=total(Sum('likes_count')),
+        dislikes_received=total(Sum('dislikes_count')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_profile_picture_renditions'),
+        ('posts', '0009_post_hot_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('likes_received', models.PositiveIntegerField(default=0)),
+                ('dislikes_received', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
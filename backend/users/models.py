@@ -11,6 +11,10 @@ class User(AbstractUser):
     date_of_birth = models.DateField(null=True, blank=True)
     # Optional field for profile picture (requires Pillow library)
     profile_picture = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
+    # Resized copies + blurhash of the picture, filled in the background (social_network/images.py)
+    profile_picture_renditions = models.JSONField(default=dict, blank=True)
+    # Denormalized number of followers, kept in sync by FollowUserView
+    followers_count = models.PositiveIntegerField(default=0)
 
     # Tell Django to use 'email' as the unique identifier for login instead of 'username'
     USERNAME_FIELD = 'email'
@@ -20,3 +24,36 @@ class User(AbstractUser):
     # String representation of the user (e.g. when printing the object)
     def __str__(self):
         return self.email
+
+
+# Follow Model: 'follower' follows 'followed' (one row per pair)
+class Follow(models.Model):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following_links')
+    followed = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follower_links')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followed'], name='unique_follow'),
+        ]
+        indexes = [
+            # Fan-out reads "all followers of X"; the unique constraint covers the other direction
+            models.Index(fields=['followed', 'follower'], name='follow_followed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} -> {self.followed_id}"
+
+
+# User Stats: counters shown on the user's profile, one row per user.
+# Kept up to date by every write that changes them (users/stats.py), so reading
+# a profile or a post's author never counts posts or reactions.
+class UserStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    posts_count = models.PositiveIntegerField(default=0)
+    # Sum of likes_count / dislikes_count over the user's posts
+    likes_received = models.PositiveIntegerField(default=0)
+    dislikes_received = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats of {self.user_id}"
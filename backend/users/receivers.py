@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from . import cache
+from .models import UserStats
+
+
+# Drop the cached user and profile whenever the row changes (profile edit,
+# password change, ...). Once right away and once more after the commit, so a
+# request that read the old row in between can't leave it in the cache.
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_cache(sender, instance, **kwargs):
+    user_id = instance.pk
+    cache.invalidate_user(user_id)
+    transaction.on_commit(lambda: cache.invalidate_user(user_id))
+
+
+# Every new user gets their (empty) stats row (users/stats.py)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+# A replaced (or removed) profile picture drops its reference to the stored file
+# (social_network/storage.py); its renditions are dropped when the new ones are
+# saved (social_network/images.py). The stored name is read from the database:
+# the instance may be a cached copy.
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_profile_picture(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None or (update_fields is not None and 'profile_picture' not in update_fields):
+        return
+    instance._stored_profile_picture = sender.objects.filter(pk=instance.pk).values_list('profile_picture', flat=True).first()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def release_replaced_profile_picture(sender, instance, **kwargs):
+    stored = instance.__dict__.pop('_stored_profile_picture', None)
+    if stored and stored != instance.profile_picture.name:
+        instance.profile_picture.storage.delete(stored)
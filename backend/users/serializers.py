@@ -1,10 +1,13 @@
 # Import serializers from DRF
 from rest_framework import serializers
-from .models import User
+from .models import User, UserStats
+from . import hashing
+from social_network.images import rendition_urls
+from social_network.metrics import TimedSerializerMixin
 import re
 
 # Serializer for creating new users (Signup)
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # Make password write-only so it is NEVER sent back in the API response
     password = serializers.CharField(write_only=True)
 
@@ -13,16 +16,19 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'email', 'first_name', 'last_name', 'date_of_birth', 'profile_picture', 'password')
 
     # Custom create method to hash the password
+    # The hash is computed on the hashing pool (users/hashing.py), which answers
+    # 503 when it is saturated, instead of on the request thread
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['email'], # Use email as username
-            email=validated_data['email'],
-            password=validated_data['password'], # This will be hashed automatically by create_user
+        user = User(
+            username=User.normalize_username(validated_data['email']), # Use email as username
+            email=User.objects.normalize_email(validated_data['email']),
+            password=hashing.make_password(validated_data['password']),
             first_name=validated_data.get('first_name', ''),
             last_name=validated_data.get('last_name', ''),
             date_of_birth=validated_data.get('date_of_birth'),
             profile_picture=validated_data.get('profile_picture')
         )
+        user.save()
         return user
 
     # Custom validation for password complexity
@@ -39,10 +45,25 @@ class UserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Password must contain at least one special character (!@#$%^&*).")
         return value
 
+# Stored profile statistics (users/stats.py)
+class UserStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserStats
+        fields = ('posts_count', 'likes_received', 'dislikes_received')
+
 # Serializer for viewing User Profiles
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Resized copies + blurhash of the profile picture (null until processed)
+    profile_picture_renditions = serializers.SerializerMethodField()
+    # null for a user created in bulk, until `manage.py rebuild_user_stats` runs
+    stats = UserStatsSerializer(read_only=True, allow_null=True)
+
     class Meta:
         model = User
         # Exclude password from fields
-        fields = ('id', 'email', 'first_name', 'last_name', 'date_of_birth', 'profile_picture')
+        fields = ('id', 'email', 'first_name', 'last_name', 'date_of_birth', 'profile_picture', 'profile_picture_renditions', 'stats')
         read_only_fields = ('email',)
+
+    # URLs of the generated renditions
+    def get_profile_picture_renditions(self, obj):
+        return rendition_urls(obj.profile_picture_renditions, obj.profile_picture.storage, self.context.get('request'))
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from . import cache
+from .models import UserStats
+
+# Per-user profile statistics (UserStats)
+#
+# posts_count, likes_received and dislikes_received are shown on profiles and
+# on every post's author, so they are stored instead of counted: each write
+# that changes them adds its difference in the same transaction:
+#   - post created / deleted      (posts/receivers.py)
+#   - reaction toggled            (Reaction.objects.toggle())
+#   - account deletion removing the user's reactions (deletions/jobs.py)
+# `manage.py rebuild_user_stats` recomputes them from the posts table.
+
+
+# Add to a user's counters, e.g. add(author_id, likes=1, dislikes=-1)
+def add(user_id, posts=0, likes=0, dislikes=0):
+    deltas = {'posts_count': posts, 'likes_received': likes, 'dislikes_received': dislikes}
+    # Greatest(): a drifted counter stops at 0 instead of failing the write
+    changes = {field: Greatest(F(field) + delta, Value(0)) for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    # Users created in bulk have no row until `rebuild_user_stats` runs
+    UserStats.objects.filter(user_id=user_id).update(**changes)
+    # The profile response shows them
+    transaction.on_commit(lambda: cache.invalidate_profile(user_id))
@@ -0,0 +1,9 @@
+from social_network.background import run_in_background
+from social_network.images import generate_renditions
+
+
+# Resize a newly stored profile picture in the background (or, once it is
+# cleared, drop the renditions of the old one)
+def schedule_profile_picture_processing(user):
+    if user.profile_picture or user.profile_picture_renditions:
+        run_in_background(generate_renditions, 'users.User', user.pk, 'profile_picture')
@@ -1,3 +1,189 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from . import cache as user_cache
+from posts.models import Post
+from .models import User, Follow, UserStats
 
-# Create your tests here.
+
+# Tests for the follow / unfollow endpoint
+class FollowTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.other = User.objects.create_user(username='other@example.com', email='other@example.com', password='Secret123!')
+        self.client.force_authenticate(self.user)
+
+    def test_follow_toggle_updates_counter(self):
+        response = self.client.post(f'/api/users/{self.other.pk}/follow/')
+        self.assertEqual(response.data, {'following': True, 'followers_count': 1})
+        self.assertTrue(Follow.objects.filter(follower=self.user, followed=self.other).exists())
+
+        response = self.client.post(f'/api/users/{self.other.pk}/follow/')
+        self.assertEqual(response.data, {'following': False, 'followers_count': 0})
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.followers_count, 0)
+
+    def test_follow_returns_the_current_count(self):
+        # Followed by others since the view read the target
+        stale = User.objects.get(pk=self.other.pk)
+        User.objects.filter(pk=self.other.pk).update(followers_count=3)
+        with mock.patch('users.views.get_object_or_404', return_value=stale):
+            response = self.client.post(f'/api/users/{self.other.pk}/follow/')
+        self.assertEqual(response.data, {'following': True, 'followers_count': 4})
+
+    def test_cannot_follow_yourself(self):
+        self.assertEqual(self.client.post(f'/api/users/{self.user.pk}/follow/').status_code, 400)
+
+
+# Tests for the cached JWT user lookup and the versioned profile response
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def user_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query for query in queries if 'FROM "users_user"' in query['sql']]
+
+    def test_user_is_loaded_once_then_cached(self):
+        response, queries = self.user_queries('/api/posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        response, queries = self.user_queries('/api/posts/')
+        self.assertEqual(len(queries), 0)
+
+    def test_cached_user_has_no_password_hash(self):
+        self.client.get('/api/posts/')
+        cached = cache.get(user_cache.user_cache_key(self.user.pk))
+        self.assertNotIn('password', cached)
+        self.assertNotIn(self.user.password, repr(cached))
+        # The rebuilt user loads the hash only when asked, and saving it keeps the hash
+        user = user_cache.get_user(self.user.pk)
+        self.assertEqual(user.email, self.user.email)
+        user.first_name = 'Cached'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('Secret123!'))
+
+    def test_profile_is_versioned_and_invalidated_on_save(self):
+        first = self.client.get('/api/profile/')
+        self.assertEqual(self.client.get('/api/profile/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        response = self.client.patch('/api/profile/', {'first_name': 'Renamed'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/profile/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'Renamed')
+
+    def test_password_change_and_deactivation_drop_the_cached_user(self):
+        self.client.get('/api/profile/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/profile/').status_code, 401)
+
+        self.user.is_active = True
+        self.user.set_password('Changed123!')
+        self.user.save()
+        self.assertIsNone(user_cache.get_user(self.user.pk))
+
+
+# Tests for password hashing on the bounded pool (users/hashing.py)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_signup_then_login(self):
+        response = self.client.post('/api/signup/', {'email': 'new@example.com', 'password': 'Secret123!', 'first_name': 'New'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get(email='new@example.com').check_password('Secret123!'))
+
+        response = self.client.post('/api/login/', {'email': 'new@example.com', 'password': 'Secret123!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        response = self.client.post('/api/login/', {'email': 'new@example.com', 'password': 'Wrong123!'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_saturated_pool_answers_503(self):
+        User.objects.create_user(username='user@example.com', email='user@example.com', password='Secret123!')
+        with self.settings(PASSWORD_HASHING_QUEUE=0):
+            response = self.client.post('/api/login/', {'email': 'user@example.com', 'password': 'Secret123!'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_login_upgrades_an_outdated_hash(self):
+        old_hash = PBKDF2PasswordHasher().encode('Secret123!', 'somesalt', iterations=1000)
+        user = User.objects.create(username='old@example.com', email='old@example.com', password=old_hash)
+
+        response = self.client.post('/api/login/', {'email': 'old@example.com', 'password': 'Secret123!'})
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertNotEqual(user.password, old_hash)
+        self.assertEqual(PBKDF2PasswordHasher().decode(user.password)['iterations'], PBKDF2PasswordHasher.iterations)
+        self.assertTrue(user.check_password('Secret123!'))
+
+
+# Tests for the stored profile statistics (users/stats.py)
+@override_settings(BACKGROUND_TASKS_EAGER=True, EVENTS_COALESCE_WINDOW=0)
+class UserStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author, self.fan, self.critic = [
+            User.objects.create_user(username=f'{name}@example.com', email=f'{name}@example.com', password='Secret123!')
+            for name in ('author', 'fan', 'critic')
+        ]
+
+    def as_user(self, user):
+        self.client.force_authenticate(user)
+        return self.client
+
+    def profile_stats(self):
+        return self.as_user(self.author).get('/api/profile/').data['stats']
+
+    def test_writes_keep_the_stats_current(self):
+        self.assertEqual(self.profile_stats(), {'posts_count': 0, 'likes_received': 0, 'dislikes_received': 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.as_user(self.author).post('/api/posts/', {'description': 'first'}).data['id']
+            second = self.as_user(self.author).post('/api/posts/', {'description': 'second'}).data['id']
+            self.as_user(self.fan).post(f'/api/posts/{first}/like/')
+            self.as_user(self.critic).post(f'/api/posts/{second}/dislike/')
+            self.as_user(self.critic).post(f'/api/posts/{first}/like/')
+        # The cached profile was replaced
+        self.assertEqual(self.profile_stats(), {'posts_count': 2, 'likes_received': 2, 'dislikes_received': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # A like turned into a dislike, then a deleted post takes its reactions along
+            self.as_user(self.fan).post(f'/api/posts/{first}/dislike/')
+            self.assertEqual(self.as_user(self.author).delete(f'/api/posts/{second}/').status_code, 204)
+        self.assertEqual(self.profile_stats(), {'posts_count': 1, 'likes_received': 1, 'dislikes_received': 1})
+
+        # The post's author carries them too, without extra queries
+        author = self.as_user(self.fan).get('/api/posts/?expand=user&fields=user').data['results'][0]['user']
+        self.assertEqual(author['stats'], {'posts_count': 1, 'likes_received': 1, 'dislikes_received': 1})
+
+        # A deleted account's reactions are taken off
+        with self.captureOnCommitCallbacks(execute=True):
+            self.as_user(self.fan).delete('/api/profile/')
+        self.assertEqual(self.profile_stats(), {'posts_count': 1, 'likes_received': 1, 'dislikes_received': 0})
+
+    def test_rebuild_creates_and_fixes_rows(self):
+        [bulk] = User.objects.bulk_create([User(username='bulk@example.com', email='bulk@example.com')])
+        Post.objects.bulk_create([Post(user=bulk, likes_count=3), Post(user=bulk, dislikes_count=2), Post(user=self.author, likes_count=1)])
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+
+        call_command('rebuild_user_stats', batch_size=2, stdout=StringIO())
+        stats = {row.user_id: (row.posts_count, row.likes_received, row.dislikes_received) for row in UserStats.objects.all()}
+        self.assertEqual(stats[bulk.pk], (2, 3, 2))
+        self.assertEqual(stats[self.author.pk], (1, 1, 0))
+        self.assertEqual(stats[self.fan.pk], (0, 0, 0))
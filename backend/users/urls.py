@@ -6,7 +6,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 # Import our custom views
-from .views import SignupView, ProfileView
+from .views import SignupView, ProfileView, FollowUserView
 
 urlpatterns = [
     # Route for User Signup
@@ -20,4 +20,7 @@ urlpatterns = [
     
     # Route to retrieve or update User Profile
     path('profile/', ProfileView.as_view(), name='profile'),
+
+    # Route to Follow / Unfollow a user
+    path('users/<int:pk>/follow/', FollowUserView.as_view(), name='follow-user'),
 ]
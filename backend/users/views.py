@@ -2,9 +2,16 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.db import transaction
+from django.db.models import F
+from django.shortcuts import get_object_or_404
 # Import our custom serializers and models
 from .serializers import UserSerializer, UserProfileSerializer
-from .models import User
+from .models import User, Follow, UserStats
+from .tasks import schedule_profile_picture_processing
+from deletions import jobs as deletion_jobs
+from social_network import etags, replicas
+from . import cache
 
 # View for User Signup
 # Inherits from CreateAPIView which handles POST requests automatically
@@ -16,9 +23,14 @@ class SignupView(generics.CreateAPIView):
     # Use UserSerializer to validate and save the data
     serializer_class = UserSerializer
 
-# View for User Profile (Retrieve and Update)
-# Inherits from RetrieveUpdateAPIView (handles GET and PUT/PATCH)
-class ProfileView(generics.RetrieveUpdateAPIView):
+    # Resize the uploaded profile picture in the background
+    def perform_create(self, serializer):
+        user = serializer.save()
+        schedule_profile_picture_processing(user)
+
+# View for User Profile (Retrieve, Update and Delete the account)
+# Inherits from RetrieveUpdateDestroyAPIView (handles GET, PUT/PATCH and DELETE)
+class ProfileView(replicas.ReplicaReadsMixin, generics.RetrieveUpdateDestroyAPIView):
     # Only allow Logged In users to access this view
     permission_classes = (permissions.IsAuthenticated,)
     # Use UserProfileSerializer to format the data (hides password)
@@ -27,4 +39,68 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     # Override get_object to return the CURRENT user
     # Instead of looking for an ID in the URL, we get the request.user
     def get_object(self):
+        # request.user may come from the cache (users/authentication.py); updates
+        # save the whole row, so they start from a fresh copy (counters may have moved)
+        if self.request.method in ('PUT', 'PATCH'):
+            return User.objects.get(pk=self.request.user.pk)
         return self.request.user
+
+    # Serve the profile from the cache, versioned: a client that sends the ETag
+    # of the current version gets a 304 (AuthContext asks for it on every page load)
+    def retrieve(self, request, *args, **kwargs):
+        user = self.get_object()
+        version = cache.get_profile_version(user.pk)
+        etag = etags.version_etag('profile', user.pk, version)
+        # "private, no-cache": browsers may keep it, but must revalidate every time
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etags.etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        key = cache.profile_cache_key(request, user.pk, version)
+        data = cache.get_profile(key)
+        if data is None:
+            # Fresh stats: request.user may be a cached copy carrying old ones
+            type(user).stats.related.set_cached_value(user, UserStats.objects.filter(user_id=user.pk).first())
+            data = self.get_serializer(user).data
+            cache.set_profile(key, data)
+        return Response(data, headers=headers)
+
+    # Resize a newly uploaded profile picture in the background
+    def perform_update(self, serializer):
+        user = serializer.save()
+        if 'profile_picture' in serializer.validated_data:
+            schedule_profile_picture_processing(user)
+
+    # Delete the account: deactivated right away (logins and tokens stop working),
+    # then removed with its posts and files in the background (deletions/jobs.py)
+    def destroy(self, request, *args, **kwargs):
+        job = deletion_jobs.delete_account(User.objects.get(pk=request.user.pk))
+        return Response({'job': job.pk, 'phase': job.phase}, status=status.HTTP_202_ACCEPTED)
+
+# View to Follow / Unfollow another user (Toggle)
+class FollowUserView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, pk):
+        target = get_object_or_404(User, pk=pk)
+        # Following yourself makes no sense
+        if target.pk == request.user.pk:
+            return Response({'detail': 'You cannot follow yourself.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # If already following, unfollow
+            deleted, _ = Follow.objects.filter(follower=request.user, followed=target).delete()
+            if deleted:
+                following, delta = False, -1
+            else:
+                _, created = Follow.objects.get_or_create(follower=request.user, followed=target)
+                following, delta = True, int(created)
+            # Keep the followers counter in sync (F() avoids lost updates)
+            User.objects.filter(pk=target.pk).update(followers_count=F('followers_count') + delta)
+            # Read back under the row lock the update holds: `target` was read
+            # before, and concurrent follows may have changed the count since
+            followers_count = User.objects.filter(pk=target.pk).values_list('followers_count', flat=True).get()
+
+        return Response({
+            'following': following,
+            'followers_count': followers_count,
+        }, status=status.HTTP_200_OK)
@@ -2,7 +2,7 @@ import React, { useState } from 'react';
 import api from '../api';
 
 // Functional Component to Create a New Post
-// Props: 'onPostCreated' - callback function to refresh the feed after posting
+// Props: 'onPostCreated' - callback receiving the new post, to add it to the feed
 const PostCreate = ({ onPostCreated }) => {
     // State for Text Content
     const [description, setDescription] = useState('');
@@ -34,7 +34,7 @@ const PostCreate = ({ onPostCreated }) => {
 
         try {
             // Send POST request to '/posts/'
-            await api.post('posts/', formData, {
+            const response = await api.post('posts/', formData, {
                 headers: {
                     'Content-Type': 'multipart/form-data',
                 },
@@ -45,8 +45,8 @@ const PostCreate = ({ onPostCreated }) => {
             setImage(null);
             setImagePreview(null);
             
-            // Trigger the parent component to reload posts
-            onPostCreated();
+            // Hand the new post to the parent component
+            onPostCreated(response.data);
         } catch (error) {
             console.error("Failed to create post", error);
         }
@@ -12,6 +12,8 @@ const Profile = () => {
     // Local State for Posts List and Loading Status
     const [posts, setPosts] = useState([]);
     const [loading, setLoading] = useState(true);
+    // URL of the next feed page (null when there are no more posts)
+    const [nextPage, setNextPage] = useState(null);
     
     // State to toggle Edit Mode for Name and Date of Birth
     const [editMode, setEditMode] = useState({ name: false, dob: false });
@@ -60,6 +62,30 @@ const Profile = () => {
         }
     }, [user, filter]); // Re-run when User changes or Filter changes
 
+    // Effect: Live updates pushed by the server (Server-Sent Events)
+    // Other people's new posts, deletions and reaction counts arrive here,
+    // so the list never has to be refetched to stay current.
+    useEffect(() => {
+        if (!user) return;
+        const source = new EventSource(`${import.meta.env.VITE_API_URL}posts/events/`);
+        source.onmessage = (message) => {
+            const event = JSON.parse(message.data);
+            if (event.type === 'post.reactions') {
+                // Only the counts: is_liked / is_disliked are ours and come from our own taps
+                applyReaction(event.id, { likes_count: event.likes_count, dislikes_count: event.dislikes_count });
+            } else if (event.type === 'post.deleted') {
+                removePost(event.id);
+            } else if (event.type === 'post.created' && (filter !== 'my' || event.user_id === user.id)) {
+                api.get(`posts/${event.id}/`)
+                    .then(response => addPost(response.data))
+                    .catch(error => console.error("Failed to load new post", error));
+            }
+        };
+        // EventSource reconnects by itself after network errors. The stream is only
+        // served under ASGI; a WSGI backend answers 404 and EventSource gives up.
+        return () => source.close();
+    }, [user, filter]);
+
     // Function to Fetch Posts from API
     const fetchPosts = async () => {
         try {
@@ -70,7 +96,9 @@ const Profile = () => {
                 url += `?user_id=${user.id}`;
             }
             const response = await api.get(url);
-            setPosts(response.data);
+            // The feed is paginated: { next, results }
+            setPosts(response.data.results);
+            setNextPage(response.data.next);
         } catch (error) {
             console.error("Failed to fetch posts", error);
         } finally {
@@ -78,6 +106,27 @@ const Profile = () => {
         }
     };
 
+    // Put a new post at the top of the list (once, it may also arrive as a live event)
+    const addPost = (post) => {
+        setPosts(prev => (prev.some(existing => existing.id === post.id) ? prev : [post, ...prev]));
+    };
+
+    const removePost = (postId) => {
+        setPosts(prev => prev.filter(post => post.id !== postId));
+    };
+
+    // Function to Append the Next Page of Posts
+    const loadMorePosts = async () => {
+        if (!nextPage) return;
+        try {
+            const response = await api.get(nextPage);
+            setPosts(prev => [...prev, ...response.data.results]);
+            setNextPage(response.data.next);
+        } catch (error) {
+            console.error("Failed to load more posts", error);
+        }
+    };
+
     const handleUpdateProfile = async (field, value) => {
         console.log(`Updating ${field} with value:`, value || formData[field]);
         try {
@@ -122,17 +171,23 @@ const Profile = () => {
         if (window.confirm("Are you sure you want to delete this post?")) {
             try {
                 await api.delete(`posts/${postId}/`);
-                fetchPosts();
+                removePost(postId);
             } catch (error) {
                 console.error("Failed to delete post", error);
             }
         }
     };
 
+    // Merge the reaction result ({ likes_count, dislikes_count, is_liked, is_disliked })
+    // into the matching post, so a tap doesn't reload the whole feed
+    const applyReaction = (postId, reaction) => {
+        setPosts(prev => prev.map(post => (post.id === postId ? { ...post, ...reaction } : post)));
+    };
+
     const handleLike = async (postId) => {
         try {
-            await api.post(`posts/${postId}/like/`);
-            fetchPosts();
+            const response = await api.post(`posts/${postId}/like/`);
+            applyReaction(postId, response.data);
         } catch (error) {
             console.error("Failed to like post", error);
         }
@@ -140,8 +195,8 @@ const Profile = () => {
 
     const handleDislike = async (postId) => {
         try {
-            await api.post(`posts/${postId}/dislike/`);
-            fetchPosts();
+            const response = await api.post(`posts/${postId}/dislike/`);
+            applyReaction(postId, response.data);
         } catch (error) {
             console.error("Failed to dislike post", error);
         }
@@ -220,6 +275,16 @@ const Profile = () => {
             boxShadow: '0 4px 6px -1px rgba(0, 0, 0, 0.1)',
             boxSizing: 'border-box',
         },
+        loadMoreButton: {
+            alignSelf: 'center',
+            padding: '0.5rem 1.5rem',
+            borderRadius: '9999px',
+            border: '1px solid #D1D5DB',
+            backgroundColor: 'white',
+            color: '#374151',
+            cursor: 'pointer',
+            fontWeight: '500',
+        },
         feed: {
             flex: '1',
             width: '100%',
@@ -388,7 +453,7 @@ const Profile = () => {
 
                 {/* Feed */}
                 <div style={styles.feed}>
-                    <PostCreate onPostCreated={fetchPosts} />
+                    <PostCreate onPostCreated={addPost} />
                     {posts.map(post => (
                         <PostCard
                             key={post.id}
@@ -398,6 +463,11 @@ const Profile = () => {
                             onDislike={handleDislike}
                         />
                     ))}
+                    {nextPage && (
+                        <button onClick={loadMorePosts} style={styles.loadMoreButton}>
+                            Load more
+                        </button>
+                    )}
                 </div>
             </div>
         </div>